@@ -0,0 +1,325 @@
+"""Replay a recorded event trace against a fresh FileWatcher and a stub Plex server.
+
+    python benchmarks/replay.py data/events.jsonl.gz --speed 10 --output replay-results.json
+
+Record a trace in production by setting ``record_events_path`` in the file
+monitor settings. The replay rebuilds the recorded libraries on tmpfs
+(/dev/shm when it exists), creates the files that were already there before
+the first event, applies every recorded create, delete and move to that tree
+at the recorded pace divided by ``--speed`` (0 replays as fast as possible)
+and hands the same events to ``FileWatcher.Handler``. Refreshes go through a
+real ``PlexUpdater`` to a local HTTP server that only counts them.
+
+The report covers event to symlink and event to Plex latency percentiles,
+the Plex requests issued and whether the final symlink tree matches the
+final source tree.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import watchdog.events
+from loguru import logger
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "teemo"))
+
+from libraries.plex import PlexUpdater  # noqa: E402
+from settings.models import FileMonitorSettings, PlexLibraryModel  # noqa: E402
+from utils.filewatcher import FileWatcher  # noqa: E402
+from utils.metrics import EVENT_TO_PLEX_SECONDS, EVENT_TO_SYMLINK_SECONDS  # noqa: E402
+from utils.recorder import read_trace  # noqa: E402
+
+EVENT_CLASSES = {
+    ("created", False): watchdog.events.FileCreatedEvent,
+    ("created", True): watchdog.events.DirCreatedEvent,
+    ("deleted", False): watchdog.events.FileDeletedEvent,
+    ("deleted", True): watchdog.events.DirDeletedEvent,
+    ("moved", False): watchdog.events.FileMovedEvent,
+    ("moved", True): watchdog.events.DirMovedEvent,
+}
+
+
+class StubPlex(BaseHTTPRequestHandler):
+    """Just enough of the Plex API for ``PlexUpdater``: the server identity, sections and refreshes."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, payload: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), self.command, url.path, parse_qs(url.query)))
+        if url.path == "/":
+            self.reply(b'<MediaContainer friendlyName="teemo-replay" machineIdentifier="teemo-replay" '
+                       b'version="1.40.0.0"/>', "application/xml")
+        elif url.path == "/library/sections":
+            self.reply(json.dumps({"MediaContainer": {"Directory": self.server.sections}}).encode(),
+                       "application/json")
+        else:
+            self.reply(json.dumps({"MediaContainer": {}}).encode(), "application/json")
+
+
+@contextlib.contextmanager
+def stub_plex(symlink_path, library_paths):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPlex)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.sections = [
+        {"key": str(number), "title": lib, "type": "movie",
+         "Location": [{"path": os.path.join(symlink_path, lib)}]}
+        for number, lib in enumerate(library_paths, 1)
+    ]
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextlib.contextmanager
+def collect(histogram):
+    """Keep every value observed by ``histogram`` so exact percentiles can be reported."""
+    samples = []
+    observe = histogram.observe
+
+    def record(value, **labels):
+        samples.append(value)
+        observe(value, **labels)
+
+    histogram.observe = record
+    try:
+        yield samples
+    finally:
+        del histogram.observe
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {"count": len(ordered), "p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99),
+            "max": round(ordered[-1], 4)}
+
+
+def rebase(path, old_root, new_root):
+    return os.path.join(new_root, os.path.relpath(path, old_root)) if path else ""
+
+
+def preexisting(events):
+    """Files and directories that an event removes or moves before any event creates them."""
+    seen, existing = set(), {}
+    for event in events:
+        if event.src not in seen and event.event_type in ("deleted", "moved"):
+            existing[event.src] = event.is_directory
+        seen.add(event.src)
+        seen.add(event.dest)
+    return existing
+
+
+def apply(event):
+    """Make the recorded change to the replay tree; changes already implied by an earlier event are skipped."""
+    try:
+        if event.event_type == "created":
+            if event.is_directory:
+                os.makedirs(event.src, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(event.src), exist_ok=True)
+                open(event.src, "a").close()
+        elif event.event_type == "deleted":
+            if event.is_directory:
+                shutil.rmtree(event.src)
+            else:
+                os.remove(event.src)
+        elif event.event_type == "moved":
+            os.makedirs(os.path.dirname(event.dest), exist_ok=True)
+            os.replace(event.src, event.dest)
+    except OSError:
+        pass
+
+
+def symlink_tree(symlink_path):
+    links = {}
+    for dirpath, _, filenames in os.walk(symlink_path):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path):
+                links[path] = os.readlink(path)
+    return links
+
+
+def check_tree(watcher, settings):
+    """Compare the symlinks on disk with the ones the final source tree calls for."""
+    expected = {}
+    for lib in settings.library_paths:
+        for dirpath, _, filenames in os.walk(os.path.join(settings.rclone_path, lib)):
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                _, symlink_path = watcher.symlink_for(src)
+                if symlink_path and watcher.matcher.matches(src):
+                    expected[symlink_path] = os.path.abspath(src)
+    actual = symlink_tree(settings.symlink_path)
+    missing = sorted(set(expected) - set(actual))
+    extra = sorted(set(actual) - set(expected))
+    wrong = sorted(path for path in set(expected) & set(actual) if expected[path] != actual[path])
+    return {
+        "expected": len(expected),
+        "actual": len(actual),
+        "missing": len(missing),
+        "extra": len(extra),
+        "wrong_target": len(wrong),
+        "correct": not (missing or extra or wrong),
+        "examples": (missing + extra + wrong)[:10],
+    }
+
+
+def settled(watcher, plex):
+    with watcher.lock:
+        pending = len(watcher.changes)
+    return not (pending or watcher.queue.depth() or watcher.queue.busy or plex.pending_refreshes)
+
+
+def wait_settled(watcher, plex, timeout):
+    """Wait for the pipeline to be idle twice in a row, so a batch between two stages is not missed."""
+    deadline = time.monotonic() + timeout
+    idle = 0
+    while idle < 2 and time.monotonic() < deadline:
+        time.sleep(0.2)
+        idle = idle + 1 if settled(watcher, plex) else 0
+    return idle >= 2
+
+
+def replay(trace, args):
+    header, events = read_trace(trace)
+    if header is None:
+        raise SystemExit(f"{trace} holds no recorded session")
+    root = Path(tempfile.mkdtemp(prefix="teemo-replay-", dir=args.root))
+    try:
+        settings = FileMonitorSettings(
+            library_paths=header["library_paths"],
+            rclone_path=str(root / "rclone"),
+            symlink_path=str(root / "links"),
+            poll_interval_seconds=args.poll_interval,
+            change_batch_ms=args.batch_ms,
+            persistent_index=False,
+            journal_enabled=False,
+            watch_symlinks=False,
+        )
+        events = [event._replace(src=rebase(event.src, header["root"], settings.rclone_path),
+                                 dest=rebase(event.dest, header["root"], settings.rclone_path))
+                  for event in events]
+        for lib in settings.library_paths:
+            os.makedirs(os.path.join(settings.rclone_path, lib), exist_ok=True)
+            os.makedirs(os.path.join(settings.symlink_path, lib), exist_ok=True)
+        for path, is_directory in preexisting(events).items():
+            os.makedirs(path if is_directory else os.path.dirname(path), exist_ok=True)
+            if not is_directory:
+                open(path, "a").close()
+
+        with stub_plex(settings.symlink_path, settings.library_paths) as server, \
+                collect(EVENT_TO_SYMLINK_SECONDS) as symlink_latency, collect(EVENT_TO_PLEX_SECONDS) as plex_latency:
+            plex = PlexUpdater(
+                PlexLibraryModel(url=f"http://127.0.0.1:{server.server_port}", token="replay",
+                                 refresh_quiet_seconds=args.refresh_quiet, refresh_max_delay_seconds=args.refresh_max),
+                settings,
+            )
+            if not plex.initialized:
+                raise SystemExit("The Plex updater could not talk to the stub server")
+            watcher = FileWatcher(settings, plex, root / "state")
+            watcher.start_reconciliation()
+            watcher.ready.wait()
+            startup_requests = len(server.requests)
+            handler = FileWatcher.Handler(watcher)
+
+            print(f"Replaying {len(events)} events at {args.speed or 'full'}x speed...", flush=True)
+            started = time.monotonic()
+            for event in events:
+                if args.speed:
+                    delay = started + event.time / args.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                apply(event)
+                cls = EVENT_CLASSES[event.event_type, event.is_directory]
+                handler.dispatch(cls(event.src, event.dest) if event.event_type == "moved" else cls(event.src))
+            replayed = time.monotonic() - started
+
+            drained_cleanly = wait_settled(watcher, plex, args.settle)
+            drained = time.monotonic() - started
+            watcher.scheduler.stop()
+            watcher.queue.stop()
+            plex.stop()
+            watcher.index.close()
+
+            requests = server.requests[startup_requests:]
+            refreshes = [query for _, _, path, query in requests if path.endswith("/refresh")]
+            return {
+                "events": len(events),
+                "recorded_seconds": round(events[-1].time, 3) if events else 0,
+                "replay_seconds": round(replayed, 3),
+                "drain_seconds": round(drained, 3),
+                "settled": drained_cleanly,
+                "event_to_symlink_seconds": percentiles(symlink_latency),
+                "event_to_plex_seconds": percentiles(plex_latency),
+                "plex_requests": {
+                    "total": len(requests),
+                    "refreshes": len(refreshes),
+                    "partial_refreshes": sum(1 for query in refreshes if "path" in query),
+                },
+                "symlink_tree": check_tree(watcher, settings),
+            }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="trace file written by the event recorder")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor, 0 for no delays at all")
+    parser.add_argument("--poll-interval", type=int, default=1, help="poll_interval_seconds of the watcher")
+    parser.add_argument("--batch-ms", type=int, default=500, help="change_batch_ms of the watcher")
+    parser.add_argument("--refresh-quiet", type=int, default=2, help="refresh_quiet_seconds of the Plex updater")
+    parser.add_argument("--refresh-max", type=int, default=10, help="refresh_max_delay_seconds of the Plex updater")
+    parser.add_argument("--settle", type=float, default=60, help="seconds to wait for the pipeline to drain")
+    parser.add_argument("--root", default="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    report = replay(args.trace, args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if not report["symlink_tree"]["correct"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
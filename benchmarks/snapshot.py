@@ -0,0 +1,76 @@
+"""Compare watchdog's DirectorySnapshot against teemo's CompactSnapshot.
+
+    python benchmarks/snapshot.py --files 100000 --per-dir 20
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "teemo"))
+
+from watchdog.utils.dirsnapshot import DirectorySnapshot, DirectorySnapshotDiff  # noqa: E402
+
+from utils.snapshot import CompactSnapshot  # noqa: E402
+
+
+def make_tree(root, files, per_dir):
+    for i in range(files):
+        directory = os.path.join(root, "movies", f"Movie {i // per_dir:06d}")
+        if i % per_dir == 0:
+            os.makedirs(directory)
+        with open(os.path.join(directory, f"movie.{i}.mkv"), "w"):
+            pass
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--per-dir", type=int, default=20)
+    parser.add_argument("--polls", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, args.files, args.per_dir)
+
+        stock, stock_build, stock_memory = measure(lambda: DirectorySnapshot(root, recursive=True))
+        started = time.perf_counter()
+        for _ in range(args.polls):
+            DirectorySnapshotDiff(stock, DirectorySnapshot(root, recursive=True))
+        stock_poll = (time.perf_counter() - started) / args.polls
+        del stock
+
+        def build_compact():
+            snapshot = CompactSnapshot(root)
+            snapshot.build()
+            return snapshot
+
+        compact, compact_build, compact_memory = measure(build_compact)
+        started = time.perf_counter()
+        for _ in range(args.polls):
+            compact.poll()
+        compact_poll = (time.perf_counter() - started) / args.polls
+
+    print(f"{args.files} files in {args.files // args.per_dir} directories")
+    print(f"{'':<20}{'build (s)':>12}{'poll (s)':>12}{'memory (MB)':>14}")
+    print(f"{'DirectorySnapshot':<20}{stock_build:>12.3f}{stock_poll:>12.3f}{stock_memory / 2 ** 20:>14.1f}")
+    print(f"{'CompactSnapshot':<20}{compact_build:>12.3f}{compact_poll:>12.3f}{compact_memory / 2 ** 20:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
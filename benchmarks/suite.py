@@ -0,0 +1,221 @@
+"""Benchmark reconciliation, snapshot polling and event handling on synthetic media trees.
+
+    python benchmarks/suite.py --sizes 10000,100000 --depth 2 --latency-ms 0.2 \\
+        --output results.json --baseline baseline.json
+
+Trees are generated under /dev/shm when it exists (tmpfs), otherwise in the
+system temp directory. ``--latency-ms`` adds a sleep to every stat, lstat,
+scandir and readlink call to approximate a FUSE mount such as rclone. Results
+are written as JSON; with ``--baseline`` every timing is also compared against
+an earlier run.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from loguru import logger
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "teemo"))
+
+from settings.models import FileMonitorSettings  # noqa: E402
+from utils.filewatcher import FileWatcher  # noqa: E402
+from utils.index import FileIndex  # noqa: E402
+from utils.reconciler import Reconciler  # noqa: E402
+from utils.snapshot import CompactSnapshot  # noqa: E402
+
+LIBRARIES = ["movies", "shows"]
+PATCHED_CALLS = ["stat", "lstat", "scandir", "readlink"]
+
+
+class NoPlex:
+    initialized = False
+
+    def stop(self):
+        pass
+
+
+def make_tree(rclone_path, files, depth, per_dir):
+    """Spread ``files`` media files over the libraries, ``per_dir`` to a leaf ``depth`` levels down."""
+    sources = []
+    for number in range(files):
+        lib = LIBRARIES[number % len(LIBRARIES)]
+        leaf = number // len(LIBRARIES) // per_dir
+        parts = [f"d{(leaf // 10 ** level) % 10}" for level in range(depth - 1, 0, -1)] + [f"Title {leaf:07d}"]
+        directory = os.path.join(rclone_path, lib, *parts)
+        if number // len(LIBRARIES) % per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"file.{number}.mkv")
+        with open(path, "w"):
+            pass
+        sources.append(path)
+    return sources
+
+
+@contextlib.contextmanager
+def syscall_latency(milliseconds):
+    """Make every patched ``os`` call sleep first, like a round trip to a remote mount would."""
+    if not milliseconds:
+        yield
+        return
+    delay = milliseconds / 1000
+    originals = {name: getattr(os, name) for name in PATCHED_CALLS}
+
+    def slow(function):
+        def call(*args, **kwargs):
+            time.sleep(delay)
+            return function(*args, **kwargs)
+        return call
+
+    for name, function in originals.items():
+        setattr(os, name, slow(function))
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(os, name, function)
+
+
+def measure(function, latency_ms):
+    """Run ``function`` and return its timing and traced memory high-water mark."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with syscall_latency(latency_ms):
+        extra = function() or {}
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "peak_bytes": peak, **extra}
+
+
+def settings_for(root):
+    return FileMonitorSettings(
+        library_paths=LIBRARIES,
+        rclone_path=str(root / "rclone"),
+        symlink_path=str(root / "links"),
+        persistent_index=False,
+        journal_enabled=False,
+        watch_symlinks=False,
+    )
+
+
+def run_size(base, files, args):
+    root = Path(tempfile.mkdtemp(prefix="teemo-bench-", dir=base))
+    results = {}
+    try:
+        settings = settings_for(root)
+        started = time.perf_counter()
+        sources = make_tree(settings.rclone_path, files, args.depth, args.per_dir)
+        results["generate"] = {"seconds": round(time.perf_counter() - started, 4)}
+
+        index = FileIndex(":memory:")
+        reconciler = Reconciler(settings, index)
+        results["check_symlinks_cold"] = measure(
+            lambda: {"created": sum(len(r.to_create) for r in reconciler.run())}, args.latency_ms)
+        results["check_symlinks_warm"] = measure(
+            lambda: {"created": sum(len(r.to_create) for r in reconciler.run())}, args.latency_ms)
+
+        snapshot = CompactSnapshot(settings.rclone_path)
+
+        def build():
+            snapshot.build()
+            return {"files": len(snapshot)}
+
+        results["snapshot_build"] = measure(build, args.latency_ms)
+        results["snapshot_build_from_index"] = measure(
+            lambda: CompactSnapshot(settings.rclone_path).build(index), args.latency_ms)
+
+        def poll():
+            snapshot.poll()
+            return {"checked": snapshot.checked, "listed": snapshot.listed}
+
+        results["snapshot_poll"] = measure(poll, args.latency_ms)
+        index.close()
+
+        shutil.rmtree(settings.symlink_path)
+        watcher = FileWatcher(settings, NoPlex(), root)
+        batch = sources[:args.events]
+
+        def toss():
+            for src in batch:
+                watcher.mushroom_tosser(src, etype="created")
+            return {"events": len(batch)}
+
+        results["mushroom_tosser"] = measure(toss, args.latency_ms)
+        tossed = results["mushroom_tosser"]
+        tossed["events_per_second"] = round(len(batch) / tossed["seconds"], 1) if tossed["seconds"] else None
+        watcher.scheduler.stop()
+        watcher.queue.stop()
+        watcher.index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline):
+    print(f"{'size':>9} {'benchmark':<28}{'seconds':>10}{'baseline':>10}{'change':>9}")
+    for size, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            before = baseline.get(size, {}).get(name, {}).get("seconds")
+            change = f"{(result['seconds'] - before) / before:+.0%}" if before else ""
+            before = f"{before:.3f}" if before is not None else "-"
+            print(f"{size:>9} {name:<28}{result['seconds']:>10.3f}{before:>10}{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated file counts, e.g. 10000,1000000")
+    parser.add_argument("--depth", type=int, default=2, help="directory levels below each library")
+    parser.add_argument("--per-dir", type=int, default=10, help="files per leaf directory")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to every stat/scandir call")
+    parser.add_argument("--events", type=int, default=5000, help="events fed through mushroom_tosser")
+    parser.add_argument("--root", default="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--log-level", default="WARNING", help="teemo's own logging would otherwise skew the timings")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = {}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        print(f"Running {size} files...", flush=True)
+        results[str(size)] = run_size(args.root, size, args)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "root": args.root or tempfile.gettempdir(),
+            "depth": args.depth,
+            "per_dir": args.per_dir,
+            "latency_ms": args.latency_ms,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+    compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
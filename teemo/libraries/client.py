@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from loguru import logger
+from utils.metrics import PLEX_ERRORS, PLEX_REQUEST_SECONDS
+
+
+class Section(NamedTuple):
+    key: str
+    title: str
+    type: str
+    locations: tuple
+
+
+class PlexClient:
+    """Thin Plex HTTP client sharing one pooled session.
+
+    Section lookups are served from a title -> section cache that is reloaded
+    after ``section_cache_seconds`` or whenever a title is not found in it.
+    """
+
+    def __init__(self, url: str, token: str, section_cache_seconds: int = 300, timeout: int = 60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.section_cache_seconds = section_cache_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8,
+                              max_retries=Retry(total=3, backoff_factor=0.5, allowed_methods=None,
+                                                status_forcelist=[502, 503, 504]))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.token = token
+        self._sections: Dict[str, Section] = {}
+        self._sections_loaded: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def request(self, method: str, endpoint: str, params: Optional[dict] = None) -> requests.Response:
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, f"{self.url}{endpoint}", params=params, timeout=self.timeout,
+                                            headers={"Accept": "application/json", "X-Plex-Token": self.token})
+        except requests.RequestException:
+            PLEX_ERRORS.inc(kind="request")
+            raise
+        finally:
+            PLEX_REQUEST_SECONDS.observe(time.monotonic() - started, method=method)
+        if response.status_code >= 400:
+            PLEX_ERRORS.inc(kind=f"http_{response.status_code}")
+        return response
+
+    def _container(self, endpoint: str) -> dict:
+        response = self.request("GET", endpoint)
+        response.raise_for_status()
+        return response.json().get("MediaContainer", {})
+
+    def sections(self, refresh: bool = False) -> Dict[str, Section]:
+        """Return all sections keyed by lower cased title, reloading the cache when stale."""
+        with self._lock:
+            if (refresh or self._sections_loaded is None
+                    or time.monotonic() - self._sections_loaded > self.section_cache_seconds):
+                self._sections = {
+                    directory["title"].lower(): Section(
+                        str(directory["key"]),
+                        directory["title"],
+                        directory.get("type", ""),
+                        tuple(location["path"] for location in directory.get("Location", [])),
+                    )
+                    for directory in self._container("/library/sections").get("Directory", [])
+                }
+                self._sections_loaded = time.monotonic()
+                logger.debug(f"Loaded {len(self._sections)} Plex sections")
+            return self._sections
+
+    def section(self, title: str) -> Optional[Section]:
+        section = self.sections().get(title.lower())
+        if section is None:
+            section = self.sections(refresh=True).get(title.lower())
+        return section
+
+    def activities(self) -> List[dict]:
+        return self._container("/activities").get("Activity", [])
+
+    def is_scanning(self, section_key: str) -> bool:
+        """Whether Plex is currently running a scan of the given section."""
+        for activity in self.activities():
+            if not activity.get("type", "").startswith("library.update.section"):
+                continue
+            if str(activity.get("Context", {}).get("librarySectionID")) == str(section_key):
+                return True
+        return False
+
+    def refresh_section(self, section_key: str, path: Optional[str] = None) -> bool:
+        params = {"path": path} if path else None
+        return self.request("GET", f"/library/sections/{section_key}/refresh", params).status_code == 200
+
+    def cancel_refresh(self, section_key: str) -> bool:
+        return self.request("DELETE", f"/library/sections/{section_key}/refresh").status_code == 200
+
+    def close(self):
+        self.session.close()
@@ -1,26 +1,51 @@
 import os
-from typing import Dict, List
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
-import requests
 from plexapi.server import PlexServer
-from plexapi.library import LibrarySection
 from plexapi.exceptions import BadRequest, Unauthorized
 from requests.exceptions import ConnectionError as RequestsConnectionError
 from urllib3.exceptions import MaxRetryError, NewConnectionError, RequestError
 from loguru import logger
+from libraries.client import PlexClient, Section
 from settings.manager import settings_manager
+from utils.metrics import EVENT_TO_PLEX_SECONDS, PLEX_ERRORS, PLEX_REFRESHES, Trace
+from utils.router import RCLONE, SYMLINK, PathRouter, path_router
+from utils.scheduler import Scheduler
 
 
 class PlexUpdater:
-    def __init__(self):
-        self.settings = settings_manager.settings.plex
-        self.library_path = settings_manager.settings.file_monitor.symlink_path
+    def __init__(self, settings=None, file_monitor_settings=None, scheduler: Optional[Scheduler] = None):
+        """By default use the global settings; a replay or test passes its own.
+
+        Refreshes are timed on ``scheduler``, the watcher's event loop, or on
+        one of our own when there is none to share.
+        """
+        self.settings = settings or settings_manager.settings.plex
+        self.router = PathRouter(file_monitor_settings) if file_monitor_settings else path_router
+        file_monitor_settings = file_monitor_settings or settings_manager.settings.file_monitor
+        self.library_path = file_monitor_settings.symlink_path
+        self.rclone_path = file_monitor_settings.rclone_path
         self.plex: PlexServer = None
-        self.sections: Dict[LibrarySection, List[str]] = {}
+        self.client: Optional[PlexClient] = None
+        self.sections: Dict[Section, List[str]] = {}
+        self.deferred: Dict[str, float] = {}
+        self.pending_refreshes: Dict[str, Tuple[float, float]] = {}
+        self.pending_paths: Dict[str, Optional[Set[str]]] = {}
+        self.pending_traces: Dict[str, List[Trace]] = {}
+        self.refresh_lock = threading.Lock()
+        self.scheduler: Optional[Scheduler] = None
+        self.owns_scheduler = False
+        self.stopped = False
         self.initialized = self.validate()
         if not self.initialized:
             logger.error("Plex Updater failed to initialize. Changes will not be reflected in Plex.")
             return
+        self.scheduler = scheduler
+        if self.scheduler is None:
+            self.scheduler, self.owns_scheduler = Scheduler(name="plex-refresh"), True
+            self.scheduler.start()
         logger.success("Plex Updater initialized!")
 
     def validate(self) -> bool:
@@ -41,7 +66,8 @@ class PlexUpdater:
             return False
 
         try:
-            self.plex = PlexServer(self.settings.url, self.settings.token, timeout=60)
+            self.client = PlexClient(self.settings.url, self.settings.token, self.settings.section_cache_seconds)
+            self.plex = PlexServer(self.settings.url, self.settings.token, session=self.client.session, timeout=60)
             self.sections = self.map_sections_with_paths()
             return True
         except Unauthorized:
@@ -62,28 +88,193 @@ class PlexUpdater:
             logger.error(f"Plex exception thrown: {e}")
         return False
 
+    def schedule_refresh(self, library_title: str, path: Optional[str] = None, trace: Optional[Trace] = None):
+        """Mark a library as dirty instead of refreshing it straight away.
+
+        A dirty library is refreshed once no new work arrived for
+        ``refresh_quiet_seconds``, or at the latest ``refresh_max_delay_seconds``
+        after it first became dirty, so a steady trickle of files still gets scanned.
+        Passing the changed path allows the refresh to be narrowed down to its folder,
+        passing its trace records how long the file took to reach Plex.
+        """
+        now = time.monotonic()
+        with self.refresh_lock:
+            first, _ = self.pending_refreshes.get(library_title, (now, now))
+            self.pending_refreshes[library_title] = (first, now)
+            if path is None:
+                self.pending_paths[library_title] = None
+            else:
+                paths = self.pending_paths.setdefault(library_title, set())
+                if paths is not None:
+                    paths.add(path)
+            if trace is not None:
+                self.pending_traces.setdefault(library_title, []).append(trace)
+            self._arm()
+        logger.debug("Library '{}' scheduled for refresh", library_title)
+
+    def _refresh_deadline(self, first: float, last: float) -> float:
+        return min(last + self.settings.refresh_quiet_seconds, first + self.settings.refresh_max_delay_seconds)
+
+    def _seconds_until_due(self) -> Optional[float]:
+        if not self.pending_refreshes:
+            return None
+        deadline = min(self._refresh_deadline(*times) for times in self.pending_refreshes.values())
+        return deadline - time.monotonic()
+
+    def flush_refreshes(self, force: bool = False) -> List[str]:
+        """Refresh every library whose deadline has passed, or all dirty libraries when forced."""
+        now = time.monotonic()
+        with self.refresh_lock:
+            due = [
+                title for title, times in self.pending_refreshes.items()
+                if force or self._refresh_deadline(*times) <= now
+            ]
+            batches = [
+                (title, self.pending_paths.pop(title, None), self.pending_traces.pop(title, []))
+                for title in due
+            ]
+            for title in due:
+                del self.pending_refreshes[title]
+        for title, paths, traces in batches:
+            try:
+                refreshed = self.refresh_paths(title, paths)
+            except Exception as e:
+                PLEX_ERRORS.inc(kind="refresh")
+                logger.error(f"Plex refresh of '{title}' failed: {e}")
+                continue
+            with self.refresh_lock:
+                if traces and title in self.pending_paths and self.pending_paths[title] is None:
+                    # Deferred behind a running scan: the files reach Plex with the next refresh
+                    self.pending_traces.setdefault(title, []).extend(traces)
+                    continue
+            if refreshed and traces:
+                now = time.monotonic()
+                for trace in traces:
+                    EVENT_TO_PLEX_SECONDS.observe(now - trace.started)
+                logger.debug(f"Refresh of '{title}' covers traces {', '.join(trace.trace_id for trace in traces)}")
+        return due
+
+    def _arm(self):
+        """Set the refresh timer for the earliest deadline. Call with ``refresh_lock`` held."""
+        seconds = self._seconds_until_due()
+        if self.scheduler is None or self.stopped or seconds is None:
+            return
+        self.scheduler.schedule("plex-refresh", seconds, self._refresh_due, offload=True)
+
+    def _refresh_due(self):
+        """Runs on the scheduler's executor, so Plex requests never hold up its timers."""
+        self.flush_refreshes()
+        with self.refresh_lock:
+            self._arm()
+
+    def stop(self):
+        """Stop scheduling refreshes, refreshing anything still pending."""
+        with self.refresh_lock:
+            self.stopped = True
+        if self.scheduler:
+            self.scheduler.cancel("plex-refresh")
+            if self.owns_scheduler:
+                self.scheduler.stop(run_pending=False)
+            self.flush_refreshes(force=True)
+        if self.client:
+            self.client.close()
+
+    def to_plex_path(self, path: str) -> str:
+        """Translate a path as teemo sees it into the path Plex sees for the same file."""
+        route = self.router.route(path)
+        if route is None:
+            return path
+        plex_root = {SYMLINK: self.settings.symlink_path_in_plex, RCLONE: self.settings.rclone_path_in_plex}[route.kind]
+        if not plex_root:
+            return path
+        relative = os.path.relpath(path, route.root)
+        return plex_root if relative == "." else os.path.join(plex_root, relative)
+
+    def section_for_path(self, plex_path: str) -> Optional[Section]:
+        """Find the section with the most specific location containing a Plex path, among the last mapped sections."""
+        best, best_length = None, -1
+        for section, locations in self.sections.items():
+            for location in locations:
+                if plex_path.startswith(os.path.join(location, "")) and len(location) > best_length:
+                    best, best_length = section, len(location)
+        return best
+
+    def refresh_paths(self, library_title: str, paths: Optional[Set[str]]) -> bool:
+        """Scan only the folders holding the given paths, or the whole library when that is cheaper."""
+        if not paths:
+            return self.refresh_library(library_title)
+
+        if self.client:
+            # Once per flush rather than per path, from the client's cached section list
+            self.sections = self.map_sections_with_paths()
+        folders: Dict[Section, Set[str]] = {}
+        for path in paths:
+            plex_path = self.to_plex_path(path)
+            section = self.section_for_path(plex_path)
+            if section is None:
+                logger.debug(f"No Plex section contains {plex_path}, refreshing '{library_title}' in full")
+                return self.refresh_library(library_title)
+            folders.setdefault(section, set()).add(os.path.dirname(plex_path))
+
+        for section, section_folders in folders.items():
+            # A scan of a folder covers everything below it
+            folders[section] = {
+                folder for folder in section_folders
+                if not any(folder.startswith(os.path.join(other, "")) for other in section_folders)
+            }
+        if sum(len(section_folders) for section_folders in folders.values()) > self.settings.partial_scan_max_folders:
+            return self.refresh_library(library_title)
+
+        refreshed = True
+        for section, section_folders in folders.items():
+            for folder in sorted(section_folders):
+                refreshed = self.refresh_folder(section, folder) and refreshed
+        return refreshed
+
+    def refresh_folder(self, section: Section, folder: str) -> bool:
+        PLEX_REFRESHES.inc(library=section.title, scope="folder")
+        if not self.client.refresh_section(section.key, folder):
+            PLEX_ERRORS.inc(kind="refresh")
+            logger.error(f"Failed to refresh {folder} in '{section.title}'")
+            return False
+        logger.success(f"Partial refresh of {folder} in '{section.title}' initiated successfully")
+        return True
+
     def refresh_library(self, library_title: str) -> bool:
-        try:
-            library = next(lib for lib in self.plex.library.sections() if lib.title.lower() == library_title.lower())
-            refresh_endpoint = f"{self.settings.url}/library/sections/{library.key}/refresh?X-Plex-Token={self.settings.token}"
+        """Refresh a whole section, without interrupting a scan Plex is already running.
 
-            cancel_refresh_response = requests.delete(refresh_endpoint, headers={'Accept': 'application/json'})
-            if cancel_refresh_response.status_code != 200:
-                logger.error("Failed to cancel the refresh request")
-                return False
+        While the section is being scanned the refresh is put back on the
+        schedule so it folds into one scan after the current one. Only when the
+        section has kept scanning for longer than ``refresh_max_delay_seconds``
+        is the running scan cancelled and restarted.
+        """
+        section = self.client.section(library_title)
+        if section is None:
+            logger.error(f"Library '{library_title}' not found")
+            return False
 
-            refresh_response = requests.get(refresh_endpoint, headers={'Accept': 'application/json'})
-            if refresh_response.status_code != 200:
-                logger.error("Failed to refresh the library")
+        if self.client.is_scanning(section.key):
+            deferred_since = self.deferred.setdefault(library_title, time.monotonic())
+            if time.monotonic() - deferred_since < self.settings.refresh_max_delay_seconds:
+                logger.info(f"Library '{library_title}' is already being scanned, deferring refresh")
+                self.schedule_refresh(library_title)
+                return True
+            logger.info(f"Library '{library_title}' has been scanning for too long, restarting the scan")
+            if not self.client.cancel_refresh(section.key):
+                logger.error("Failed to cancel the refresh request")
                 return False
+        self.deferred.pop(library_title, None)
 
-            logger.success(f"Library '{library_title}' refresh initiated successfully")
-            return True
-        except StopIteration:
-            logger.error(f"Library '{library_title}' not found")
+        PLEX_REFRESHES.inc(library=library_title, scope="library")
+        if not self.client.refresh_section(section.key):
+            PLEX_ERRORS.inc(kind="refresh")
+            logger.error("Failed to refresh the library")
             return False
 
-    def map_sections_with_paths(self) -> Dict[LibrarySection, List[str]]:
-        sections = [section for section in self.plex.library.sections() if
+        logger.success(f"Library '{library_title}' refresh initiated successfully")
+        return True
+
+    def map_sections_with_paths(self) -> Dict[Section, List[str]]:
+        sections = [section for section in self.client.sections().values() if
                     section.type in ["show", "movie"] and section.locations]
-        return {section: section.locations for section in sections}
\ No newline at end of file
+        return {section: list(section.locations) for section in sections}
@@ -2,9 +2,48 @@ import time
 
 from utils.logger import logger
 from utils.filewatcher import FileWatcher
+from utils.ingest import IngestServer
+from utils.metrics import MetricsServer
 from settings.manager import settings_manager
 
 
+def start_metrics(file_monitor_settings):
+    """Serve the metrics of this process; with shards, those of every shard are merged in."""
+    if not file_monitor_settings.metrics_enabled:
+        return None
+    metrics_server = MetricsServer(file_monitor_settings.metrics_host, file_monitor_settings.metrics_port)
+    metrics_server.start()
+    return metrics_server
+
+
+def run_supervisor(file_monitor_settings):
+    from libraries.plex import PlexUpdater
+    from utils.supervisor import ShardSupervisor
+
+    if file_monitor_settings.ingest_enabled:
+        logger.warning("The ingest endpoint is not available with shards, changes are only picked up by polling")
+    settings_manager.register_observer(
+        lambda changed: logger.warning("File monitor settings changed, shards pick them up after a restart"),
+        keys=("file_monitor",),
+    )
+    plex = PlexUpdater()
+    metrics_server = start_metrics(file_monitor_settings)
+    supervisor = ShardSupervisor(file_monitor_settings, plex, file_monitor_settings.shards)
+    supervisor.start()
+    try:
+        while True:
+            time.sleep(1)
+            supervisor.check()
+    except KeyboardInterrupt:
+        logger.info("Teemo Exiting...")
+    finally:
+        supervisor.stop()
+        plex.stop()
+        if metrics_server:
+            metrics_server.stop()
+        logger.info("Teemo Exited")
+
+
 def main():
     if not settings_manager.settings_file.exists():
         logger.log("INFO", "Settings file not found, creating default settings")
@@ -14,18 +53,36 @@ def main():
         f"{settings_manager.settings.file_monitor.rclone_path} "
         f"and getting ready to stack mushrooms on "
         f"{','.join(settings_manager.settings.file_monitor.library_paths)}")
+    file_monitor_settings = settings_manager.settings.file_monitor
+    settings_observer = settings_manager.watch()
+    if file_monitor_settings.shards > 1:
+        try:
+            run_supervisor(file_monitor_settings)
+        finally:
+            settings_observer.stop()
+        return
+
+    metrics_server = start_metrics(file_monitor_settings)
     file_watcher = FileWatcher()
     observer = file_watcher.start_monitoring()
+    ingest_server = None
+    if file_monitor_settings.ingest_enabled:
+        ingest_server = IngestServer(file_watcher, file_monitor_settings.ingest_host, file_monitor_settings.ingest_port)
+        ingest_server.start()
     try:
         while True:
             time.sleep(1)
-            file_watcher.process_changes()
     except KeyboardInterrupt:
         logger.info("Teemo Exiting...")
     finally:
-        file_watcher.stop_monitoring(observer)
+        if ingest_server:
+            ingest_server.stop()
+        file_watcher.shutdown(observer)
+        settings_observer.stop()
+        if metrics_server:
+            metrics_server.stop()
         logger.info("Teemo Exited")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,11 @@
 import json
 import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+import watchdog.events
+import watchdog.observers
 from pydantic import ValidationError
 
 from settings.models import Observable, TeemoModel
@@ -8,31 +13,115 @@ from utils import data_dir_path
 from loguru import logger
 
 
+def flatten(settings: dict, prefix: str = "") -> Dict[str, object]:
+    """Turn nested settings into ``{"file_monitor.poll_interval_seconds": 5, ...}``."""
+    flat = {}
+    for key, value in settings.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
 class SettingsManager:
-    """Class that handles settings, ensuring they are validated against a Pydantic schema."""
+    """Class that handles settings, ensuring they are validated against a Pydantic schema.
+
+    Observers are told which dotted keys changed, e.g.
+    ``{"file_monitor.library_paths"}``, and only once per change: assignments
+    inside ``batch()`` and every field of a reload are compared against what
+    observers last saw and reported together.
+    """
 
     def __init__(self):
-        self.observers = []
+        self.observers: List[Tuple[Callable, Tuple[str, ...]]] = []
         self.filename = "teemo.json"
         self.settings_file = data_dir_path / self.filename
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        # What observers last saw, and the settings file as last read or written
+        self.snapshot: Dict[str, object] = {}
+        self.file_content: Optional[str] = None
+        self.file_signature: Optional[Tuple[int, int]] = None
 
-        Observable.set_notify_observers(self.notify_observers)
+        Observable.set_notify_observers(self.settings_changed)
 
         if not self.settings_file.exists():
             self.settings = TeemoModel()
             self.settings = TeemoModel.model_validate(
                 self.check_environment(json.loads(self.settings.model_dump_json()), "TEEMO")
             )
-            self.notify_observers()
+            self.settings_changed()
         else:
             self.load()
 
-    def register_observer(self, observer):
-        self.observers.append(observer)
+    def register_observer(self, observer, keys: Iterable[str] = ()):
+        """Call ``observer(changed)`` after settings change.
+
+        ``changed`` is the set of dotted keys that changed, or None when anything
+        may have. With ``keys``, the observer is only called when one of those
+        keys, or a key below one of them, is among the changes.
+        """
+        self.observers.append((observer, tuple(keys)))
+
+    def notify_observers(self, changed: Optional[Set[str]] = None):
+        for observer, keys in self.observers:
+            if changed is None or not keys or any(
+                key == prefix or key.startswith(f"{prefix}.") for key in changed for prefix in keys
+            ):
+                observer(changed)
+
+    def settings_changed(self) -> Set[str]:
+        """Notify observers of the keys that differ from what they last saw, unless inside a batch."""
+        with self.lock:
+            if self.batch_depth or not hasattr(self, "settings"):
+                return set()
+            current = flatten(self.settings.model_dump())
+            changed = {key for key in current.keys() | self.snapshot.keys()
+                       if current.get(key) != self.snapshot.get(key)}
+            if changed and self.snapshot:
+                logger.debug(f"Settings changed: {', '.join(sorted(changed))}")
+            self.snapshot = current
+            if changed:
+                self.notify_observers(changed)
+            return changed
+
+    @contextmanager
+    def batch(self):
+        """Make several assignments count as one change, reported to observers when the batch ends."""
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield self.settings
+            finally:
+                self.batch_depth -= 1
+            self.settings_changed()
+
+    def update(self, settings_dict: dict) -> Set[str]:
+        """Validate new settings and apply them to the live models in one batch, returning the changed keys.
+
+        Models are updated in place, so everything holding on to
+        ``settings.file_monitor`` and the like sees the new values.
+        """
+        new_settings = TeemoModel.model_validate(settings_dict)
+        with self.lock:
+            if not hasattr(self, "settings"):
+                self.settings = new_settings
+                return self.settings_changed()
+            self.batch_depth += 1
+            try:
+                self._assign(self.settings, new_settings)
+            finally:
+                self.batch_depth -= 1
+            return self.settings_changed()
 
-    def notify_observers(self):
-        for observer in self.observers:
-            observer()
+    def _assign(self, model: Observable, new_model: Observable):
+        for name in model.model_fields:
+            value, new_value = getattr(model, name), getattr(new_model, name)
+            if isinstance(value, Observable) and isinstance(new_value, Observable):
+                self._assign(value, new_value)
+            else:
+                setattr(model, name, new_value)
 
     def check_environment(self, settings, prefix="", seperator="_"):
         checked_settings = {}
@@ -58,16 +147,32 @@ class SettingsManager:
                     checked_settings[key] = value
         return checked_settings
 
-    def load(self, settings_dict: dict | None = None):
-        """Load settings from file, validating against the AppModel schema."""
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.settings_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, settings_dict: dict | None = None) -> Set[str]:
+        """Load settings from file, validating against the AppModel schema.
+
+        The file is only written back when validation, migration or the
+        environment changed its contents, and observers only hear about keys
+        that actually changed.
+        """
         try:
             if not settings_dict:
                 with open(self.settings_file, "r", encoding="utf-8") as file:
-                    settings_dict = json.loads(file.read())
-                    if os.environ.get("TEEMO_FORCE_ENV", "false").lower() == "true":
-                        settings_dict = self.check_environment(settings_dict, "TEEMO")
-            self.settings = TeemoModel.model_validate(settings_dict)
-            self.save()
+                    self.file_content = file.read()
+                self.file_signature = self._signature()
+                settings_dict = json.loads(self.file_content)
+                if os.environ.get("TEEMO_FORCE_ENV", "false").lower() == "true":
+                    settings_dict = self.check_environment(settings_dict, "TEEMO")
+            changed = self.update(settings_dict)
+            if json.loads(self.settings.model_dump_json()) != settings_dict:
+                self.save()
+            return changed
         except ValidationError as e:
             logger.error(f"Error validating settings: {e}")
             raise
@@ -77,13 +182,60 @@ class SettingsManager:
         except FileNotFoundError:
             logger.warning(f"Error loading settings: {self.settings_file} does not exist")
             raise
-        self.notify_observers()
+
+    def reload_if_changed(self) -> Set[str]:
+        """Reload the settings file if it changed on disk, returning the keys that changed.
+
+        An unchanged modification time and size skips reading it, and
+        unchanged contents, such as our own save, skip parsing it. Invalid
+        contents are logged and the current settings are kept.
+        """
+        with self.lock:
+            signature = self._signature()
+            if signature is None or signature == self.file_signature:
+                return set()
+            try:
+                with open(self.settings_file, "r", encoding="utf-8") as file:
+                    content = file.read()
+            except OSError as e:
+                logger.error(f"Error reading settings: {e}")
+                return set()
+            self.file_signature = signature
+            if content == self.file_content:
+                return set()
+            try:
+                changed = self.load()
+            except (ValidationError, ValueError):
+                logger.error("Keeping the current settings until the settings file is fixed")
+                return set()
+            logger.info(f"Reloaded settings ({', '.join(sorted(changed)) or 'no changes'})")
+            return changed
+
+    def watch(self):
+        """Reload the settings file whenever it is written, returning the started observer."""
+        manager = self
+
+        class SettingsHandler(watchdog.events.FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = (event.src_path, getattr(event, "dest_path", ""))
+                if any(path and os.path.basename(path) == manager.filename for path in paths):
+                    manager.reload_if_changed()
+
+        observer = watchdog.observers.Observer()
+        observer.schedule(SettingsHandler(), str(self.settings_file.parent), recursive=False)
+        observer.start()
+        logger.info(f"Watching {self.settings_file} for changes")
+        return observer
 
     def save(self):
         if dir(self.settings_file) and not self.settings_file.parent.exists():
             self.settings_file.parent.mkdir(parents=True)
+        content = self.settings.model_dump_json(indent=4)
         with open(self.settings_file, "w", encoding="utf-8") as file:
-            file.write(self.settings.model_dump_json(indent=4))
+            file.write(content)
+        with self.lock:
+            self.file_content = content
+            self.file_signature = self._signature()
 
 
-settings_manager = SettingsManager()
\ No newline at end of file
+settings_manager = SettingsManager()
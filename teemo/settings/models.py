@@ -1,6 +1,9 @@
 """Teemo settings models"""
 
+from functools import lru_cache
 from typing import Callable, List, Any
+
+from pydantic import Field
 from settings.migratable import MigratableBaseModel
 from utils import version_file_path
 
@@ -16,12 +19,21 @@ class Observable(MigratableBaseModel):
         cls._notify_observers = notify_observers_callable
 
     def __setattr__(self, name, value):
+        """Assign a field and let the manager work out whether, and what, changed.
+
+        Assigning the value a field already has is a no-op, so observers are not
+        woken for it. The manager compares against what observers last saw, and
+        inside ``SettingsManager.batch()`` defers that until the batch ends.
+        """
+        if name in self.model_fields and getattr(self, name, None) == value:
+            return
         super().__setattr__(name, value)
-        if self.__class__._notify_observers:
-            with self._notify_observers_context():
-                self.__class__._notify_observers()
+        notify_observers = self.__class__._notify_observers
+        if callable(notify_observers):
+            notify_observers()
 
 
+@lru_cache(maxsize=None)
 def get_version() -> str:
     with open(version_file_path.resolve()) as file:
         return file.read() or "x.x.x"
@@ -31,21 +43,63 @@ class PlexLibraryModel(Observable):
     enabled: bool = True
     token: str = ""
     url: str = "http://localhost:32400"
+    refresh_quiet_seconds: int = 10
+    refresh_max_delay_seconds: int = 60
+    partial_scan_max_folders: int = 10
+    section_cache_seconds: int = 300
+    symlink_path_in_plex: str = ""
+    rclone_path_in_plex: str = ""
 
 
 class FileMonitorSettings(Observable):
     library_paths: List[str] = ["movies", "shows"]
     poll_interval_seconds: int = 5
+    change_batch_ms: int = 500
     rclone_path: str = "/mnt/rclone"
     symlink_path: str = "/mnt/teemo-symlinks"
+    # "flat" links every file as <lib>/<name>, "mirror" keeps the source folders below the library,
+    # the first symlink_layout_depth of them when that is above 0
+    symlink_layout: str = "flat"
+    symlink_layout_depth: int = 0
     ignored_files: List[str] = []
+    ignored_dirs: List[str] = []
     file_types: List[str] = ["*.mkv", "*.mp4", "*.avi", "*.m4v", "*.mov", "*.ts", "*.vob", "*.webm"]
+    persistent_index: bool = True
+    reconcile_workers: int = 16
+    hot_poll_seconds: int = 2
+    hot_window_seconds: int = 300
+    cold_poll_max_seconds: int = 600
+    full_sweep_seconds: int = 3600
+    always_hot_depth: int = 1
+    symlink_workers: int = 4
+    queue_size: int = 10000
+    dry_run: bool = False
+    stat_cache_seconds: int = 60
+    stat_cache_negative_seconds: int = 10
+    stat_cache_size: int = 100000
+    status_interval_seconds: int = 5
+    journal_enabled: bool = True
+    journal_commit_ms: int = 200
+    always_reconcile_on_start: bool = False
+    observer_backend: str = "auto"
+    shards: int = 1
+    watch_symlinks: bool = True
+    ingest_enabled: bool = False
+    ingest_host: str = "127.0.0.1"
+    ingest_port: int = 8686
+    metrics_enabled: bool = False
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9686
+    record_events_path: str = ""
+    log_summary_seconds: int = 10
 
 class TeemoModel(Observable):
     version: str = get_version()
     debug: bool = False
-    file_monitor: FileMonitorSettings = FileMonitorSettings()
-    plex: PlexLibraryModel = PlexLibraryModel()
+    log_json: bool = False
+    # Factories, so settings updated in place never share a model with another instance
+    file_monitor: FileMonitorSettings = Field(default_factory=FileMonitorSettings)
+    plex: PlexLibraryModel = Field(default_factory=PlexLibraryModel)
 
     def __init__(self, **data: Any):
         current_version = get_version()
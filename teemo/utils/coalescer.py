@@ -0,0 +1,81 @@
+"""Folding of raw watcher events into one net change per path"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+Change = Tuple[str, str, str]
+
+
+class ChangeCoalescer:
+    """Collects raw events for one processing window and folds them per path.
+
+    Every live path remembers where it came from at the start of the window
+    (``None`` when it was created inside the window), and every path that
+    existed at the start but is gone now is kept as a tombstone. Draining turns
+    that state back into the smallest list of ``(etype, src, dest)`` changes:
+    created then deleted cancels out, a chain of moves becomes a single move to
+    the final destination and repeated events for the same file collapse.
+    """
+
+    def __init__(self):
+        self.alive: Dict[str, Optional[str]] = {}
+        self.removed: Set[str] = set()
+        self.received = 0
+        self.emitted = 0
+
+    def __len__(self):
+        return len(self.alive) + len(self.removed)
+
+    @property
+    def absorbed(self) -> int:
+        return self.received - self.emitted - len(self)
+
+    def add(self, etype: str, src: str, dest: str = ""):
+        self.received += 1
+        if etype == "delete":
+            self._delete(src)
+        elif etype == "move":
+            self._move(src, dest)
+        elif src not in self.alive:
+            # A file that was deleted earlier in the window and shows up again was replaced
+            if src in self.removed or etype != "created":
+                self.removed.discard(src)
+                self.alive[src] = src
+            else:
+                self.alive[src] = None
+
+    def _delete(self, path: str):
+        if path in self.alive:
+            origin = self.alive.pop(path)
+            if origin is not None:
+                self.removed.add(origin)
+        else:
+            self.removed.add(path)
+
+    def _move(self, src: str, dest: str):
+        origin = self.alive.pop(src) if src in self.alive else src
+        replaced = self.alive.pop(dest, None)
+        if replaced is not None and replaced != origin:
+            self.removed.add(replaced)
+        self.removed.discard(dest)
+        self.alive[dest] = origin
+
+    def drain(self) -> List[Change]:
+        """Return the net changes of the window, deletes first, and start a new window."""
+        changes: List[Change] = [("delete", path, "") for path in sorted(self.removed)]
+        for path, origin in self.alive.items():
+            if origin is None or origin == path:
+                changes.append(("created", path, ""))
+            else:
+                changes.append(("move", origin, path))
+        self.alive.clear()
+        self.removed.clear()
+        self.emitted += len(changes)
+        return changes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "emitted": self.emitted,
+            "pending": len(self),
+            "absorbed": self.absorbed,
+        }
@@ -1,166 +1,564 @@
 import watchdog.events
 import watchdog.observers
-from watchdog.observers.polling import PollingObserver
+import json
 import os
+from functools import partial
 import time
 import threading
-from collections import defaultdict
 from loguru import logger
 from libraries.plex import PlexUpdater
 from settings.manager import settings_manager
+from utils import data_dir_path
+from utils.coalescer import ChangeCoalescer
+from utils.index import FileIndex, stat_entry
+from utils.journal import ChangeJournal
+from utils.logger import BurstSummary
+from utils.matcher import PathMatcher
+from utils.metrics import (CHANGES_PROCESSED, EVENT_TO_SYMLINK_SECONDS, EVENTS_COALESCED, EVENTS_RECEIVED,
+                           QUEUE_DEPTH, QUEUE_OLDEST, SYMLINKS_CREATED, SYMLINKS_REMOVED, trace_label, tracer)
+from utils.observers import ObserverGroup
+from utils.planner import ChangePlan, link, remove_empty_parents
+from utils.reconciler import Reconciler
+from utils.recorder import RECORDED_EVENTS, EventRecorder
+from utils.router import PathRouter, path_router
+from utils.scheduler import Scheduler
+from utils.snapshot import CompactPollingObserver, PollTiers
+from utils.statcache import StatCache
+from utils.workqueue import KeyedWorkQueue
+
+
+# File monitor settings that are only read when the watcher starts
+_RESTART_SETTINGS = {
+    "rclone_path", "symlink_path", "persistent_index", "symlink_workers", "queue_size", "journal_enabled",
+    "observer_backend", "shards", "watch_symlinks", "ingest_enabled", "ingest_host", "ingest_port",
+    "metrics_enabled", "metrics_host", "metrics_port", "record_events_path", "stat_cache_size",
+    "symlink_layout", "symlink_layout_depth",
+}
+
+# Written by a startup symlink check that ran to the end, removed when one starts
+_RECONCILED_MARKER = "reconciled"
+
+_TIER_SETTINGS = {"hot_poll_seconds", "hot_window_seconds", "cold_poll_max_seconds", "full_sweep_seconds",
+                  "always_hot_depth"}
 
 
 class FileWatcher:
-    def __init__(self):
-        self.file_monitor_settings = settings_manager.settings.file_monitor
-        self.plex = PlexUpdater()
-        self.changes = defaultdict(list)
+    def __init__(self, file_monitor_settings=None, plex=None, state_dir=None):
+        """By default watch every library from the global settings; a shard passes its own subset."""
+        self.sharded = file_monitor_settings is not None
+        self.file_monitor_settings = file_monitor_settings or settings_manager.settings.file_monitor
+        self.state_dir = state_dir or data_dir_path
+        self.scheduler = Scheduler(name="watcher")
+        self.plex = plex or PlexUpdater(scheduler=self.scheduler)
+        self.index = FileIndex(
+            self.state_dir / "index.db" if self.file_monitor_settings.persistent_index else ":memory:"
+        )
+        self.stat_cache = StatCache(
+            ttl=self.file_monitor_settings.stat_cache_seconds,
+            negative_ttl=self.file_monitor_settings.stat_cache_negative_seconds,
+            maxsize=self.file_monitor_settings.stat_cache_size,
+        )
+        # Symlinks touched by live events while startup reconciliation is still running
+        self.live_paths = set()
+        # The same for libraries added while running, per library being swept
+        self.sweeps = {}
+        self.ready = threading.Event()
+        self.router = PathRouter(self.file_monitor_settings) if self.sharded else path_router
+        self.matcher = PathMatcher.from_settings(self.file_monitor_settings)
+        self.reconciler = Reconciler(self.file_monitor_settings, self.index, self.stat_cache, self.live_paths,
+                                     router=self.router, matcher=self.matcher)
+        self.changes = ChangeCoalescer()
+        self.recorder = None
+        if self.file_monitor_settings.record_events_path:
+            self.recorder = EventRecorder(
+                self.state_dir / self.file_monitor_settings.record_events_path,
+                self.file_monitor_settings.rclone_path,
+                self.file_monitor_settings.library_paths,
+            )
+        self.journal = None
+        if self.file_monitor_settings.journal_enabled and not self.file_monitor_settings.dry_run:
+            self.journal = ChangeJournal(
+                self.state_dir / "journal.log",
+                commit_interval=self.file_monitor_settings.journal_commit_ms / 1000,
+            )
+            for _, etype, src, dest in self.journal.replay():
+                self.changes.add(etype, src, dest)
+            self.journal.start()
+        self.queue = KeyedWorkQueue(
+            self.handle_change,
+            workers=self.file_monitor_settings.symlink_workers,
+            maxsize=self.file_monitor_settings.queue_size,
+            name="symlinker",
+        )
         self.last_processed = time.time()
+        self.absorbed = 0
         self.lock = threading.Lock()
-        self.check_symlinks()
-        self.processing_thread = threading.Thread(target=self.process_changes)
-        self.processing_thread.daemon = True
-        self.processing_thread.start()
+        # Held while a batch is handed to the workers, so batches stay in order
+        self.drain_lock = threading.Lock()
+        self.observer = None
+        QUEUE_DEPTH.set_function(self.queue.depth)
+        QUEUE_OLDEST.set_function(self.queue.oldest_age)
+        self.queue.start()
+        self.scheduler.start()
+        self.scheduler.schedule("status", 0, self.write_status, offload=True)
+        self.scheduler.every(lambda: self.file_monitor_settings.status_interval_seconds, self.write_status,
+                             key="status", offload=True)
+        # Catches whatever no timer was set for, such as changes replayed from the journal
+        self.scheduler.every(lambda: self.file_monitor_settings.poll_interval_seconds, self.process_changes,
+                             key="changes", offload=True)
+        self.summary = BurstSummary()
+        self.scheduler.every(lambda: self.file_monitor_settings.log_summary_seconds, self.summary.flush,
+                             key="log-summary")
+        self.libraries = list(self.file_monitor_settings.library_paths)
+        self.tiers = PollTiers.from_settings(self.file_monitor_settings)
+        if not self.sharded:
+            settings_manager.register_observer(self.settings_changed, keys=("file_monitor",))
 
     def record_change(self, etype, src, dest=""):
+        self.stat_cache.invalidate(src, dest)
+        if etype == "move":
+            tracer.move(src, dest)
+        trace = tracer.start(dest or src)
         with self.lock:
-            self.changes[etype].append((src, dest))
-        logger.debug(f"Recorded change: {etype} - {src} -> {dest}")
+            if self.journal:
+                self.journal.append(etype, src, dest)
+            self.changes.add(etype, src, dest)
+        EVENTS_RECEIVED.inc(type=etype)
+        logger.debug("{}Recorded change: {} - {} -> {}", trace_label(trace), etype, src, dest)
+        # The first change of a batch sets when the batch is processed, later ones join it
+        self.scheduler.schedule("changes", self.file_monitor_settings.change_batch_ms / 1000, self.process_changes,
+                                replace=False, offload=True)
+
+    def process_now(self):
+        """Process the changes recorded so far without waiting for the batch window, e.g. for pushed changes."""
+        self.scheduler.schedule("changes", 0, self.process_changes, offload=True)
 
     def process_changes(self):
-        while True:
-            time.sleep(self.file_monitor_settings.poll_interval_seconds)
+        """Hand the coalesced changes to the worker pool.
 
+        Runs ``change_batch_ms`` after the first change of a batch, and every
+        poll interval to pick up anything else. Changes are keyed by the
+        symlink they touch, so all work on one symlink stays in order. A move
+        is split into a delete of the old path and a create of the new one,
+        each keyed by its own symlink.
+        """
+        with self.drain_lock:
             with self.lock:
-                changes_copy = dict(self.changes)
-                self.changes.clear()
+                changes = self.changes.drain()
+                stats = self.changes.stats()
+                journal_seq = self.journal.seq if self.journal else 0
+
+            absorbed, self.absorbed = stats["absorbed"] - self.absorbed, stats["absorbed"]
+            EVENTS_COALESCED.inc(absorbed)
+            CHANGES_PROCESSED.inc(len(changes))
+            if changes:
+                logger.debug(
+                    f"Processing {len(changes)} coalesced changes "
+                    f"({stats['received']} events received, {stats['absorbed']} absorbed so far)"
+                )
+            if changes and self.file_monitor_settings.dry_run:
+                logger.info(f"Dry run plan: {self.plan_changes(changes).describe()}")
+                return
+            for etype, src, dest in changes:
+                if etype == "move":
+                    self.queue.put(self.queue_key(src), ("delete", src, ""))
+                    self.queue.put(self.queue_key(dest), ("created", dest, ""))
+                else:
+                    self.queue.put(self.queue_key(src), (etype, src, dest))
+            if changes:
+                queue_stats = self.queue.stats()
+                cache_stats = self.stat_cache.stats()
+                logger.debug(
+                    f"Symlink queue depth {queue_stats['depth']}, "
+                    f"oldest change waiting {queue_stats['oldest_age_seconds']:.1f}s, "
+                    f"stat cache hit rate {cache_stats['hit_rate']:.0%}"
+                )
+                if self.journal:
+                    self.queue.join()
+                    self.journal.checkpoint(journal_seq)
 
-            for etype, changes in changes_copy.items():
-                for src, dest in changes:
-                    self.mushroom_tosser(src, dest, etype)
+    def queue_key(self, src) -> str:
+        _, symlink_path = self.symlink_for(src)
+        return symlink_path or src
 
-    def update_plex(self, lib):
+    def plan_changes(self, changes) -> ChangePlan:
+        """Turn a batch of coalesced changes into the symlink operations they would cause."""
+        plan = ChangePlan()
+        for etype, src, dest in changes:
+            if etype == "move":
+                _, old_symlink = self.symlink_for(src)
+                if old_symlink:
+                    plan.add_removal(old_symlink)
+                src = dest
+            _, symlink_path = self.symlink_for(src)
+            if not symlink_path:
+                continue
+            if etype == "delete":
+                plan.add_removal(symlink_path)
+            else:
+                plan.add_link(symlink_path, src, self.stat_cache.lexists(symlink_path))
+        return plan
+
+    def handle_change(self, change):
+        etype, src, dest = change
+        self.mushroom_tosser(src, dest, etype)
+
+    def update_plex(self, lib, path=None, trace=None):
         if self.plex.initialized:
-            self.plex.refresh_library(lib)
+            self.plex.schedule_refresh(lib, path, trace=trace)
 
-    def check_symlinks(self):
-        """Check and remove invalid symlinks at startup and create missing ones."""
+    def refresh_index(self, *paths):
+        """Bring the index entries of the given paths in line with the disk."""
+        for path in paths:
+            entry = stat_entry(path)
+            if entry:
+                self.index.upsert(entry)
+            else:
+                self.index.remove(path)
+
+    def check_symlinks(self, libraries=None, live_paths=None):
+        """Check and remove invalid symlinks at startup and create missing ones.
+
+        With ``live_paths`` the sweep gets a reconciler of its own that drops
+        its plans for those symlinks, rather than the startup one.
+        """
         logger.info("Checking symlinks at startup")
-        allowed_extensions = tuple(ext.lstrip('*') for ext in self.file_monitor_settings.file_types)
-        libsToUpdate = []  # Correctly instantiate the list
-        for lib in self.file_monitor_settings.library_paths:
-            symlink_dir = os.path.join(self.file_monitor_settings.symlink_path, lib)
-            rclone_dir = os.path.join(self.file_monitor_settings.rclone_path, lib)
-            if os.path.exists(symlink_dir):
-                for root, _, files in os.walk(symlink_dir):
-                    for file in files:
-                        symlink_path = os.path.join(root, file)
-                        if os.path.islink(symlink_path) and not os.path.exists(os.readlink(symlink_path)):
-                            self.remove_symlink(symlink_path)
-                            if lib not in libsToUpdate:
-                                libsToUpdate.append(lib)
-
-            if os.path.exists(rclone_dir):
-                for root, _, files in os.walk(rclone_dir):
-                    for file in files:
-                        if not file.endswith(allowed_extensions):
-                            continue
-
-                        src_path = os.path.join(root, file)
-
-                        symlink_path = os.path.join(self.file_monitor_settings.symlink_path, lib, file)
-                        if not os.path.exists(symlink_path):
-                            self.create_symlink(src_path, symlink_path)
-                            if lib not in libsToUpdate:
-                                libsToUpdate.append(lib)
-        if libsToUpdate:
-            for lib in libsToUpdate:
-                self.update_plex(lib)
+        started = time.monotonic()
+        reconciler = self.reconciler
+        if live_paths is not None:
+            reconciler = Reconciler(self.file_monitor_settings, self.index, self.stat_cache, live_paths,
+                                    router=self.router, matcher=self.matcher)
+        libsToUpdate = [result.lib for result in reconciler.run(libraries) if result.changed]
+        cache_stats = self.stat_cache.stats()
+        logger.info(
+            f"Startup symlink check finished in {time.monotonic() - started:.2f}s "
+            f"(stat cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses)"
+        )
+        for lib in libsToUpdate:
+            self.update_plex(lib)
+
+    def reconcile_added(self, libraries):
+        """Sweep libraries added while running; live events in them win over the sweep, as at startup."""
+        live_paths = set()
+        for lib in libraries:
+            self.sweeps[lib] = live_paths
+        try:
+            self.check_symlinks(libraries, live_paths)
+        except Exception as e:
+            logger.error(f"Symlink check of {', '.join(libraries)} failed: {e}")
+        finally:
+            for lib in libraries:
+                self.sweeps.pop(lib, None)
+
+    def start_reconciliation(self):
+        """Run the startup symlink check in the background while live events are already handled.
+
+        After a crash that left unapplied changes in the journal, the replayed
+        changes plus the first poll against the persistent index cover what
+        happened in the meantime, so the full sweep is skipped unless it is
+        forced. That needs an earlier sweep to have finished: a clean restart,
+        or one after an interrupted sweep, always runs it.
+        """
+        marker = self.state_dir / _RECONCILED_MARKER
+        if (self.journal and self.journal.recovered and marker.exists()
+                and self.file_monitor_settings.persistent_index
+                and not self.file_monitor_settings.always_reconcile_on_start):
+            logger.info("Recovered from the change journal, skipping the startup symlink check")
+            self.reconciler.progress.finished = time.monotonic()
+            self.ready.set()
+            self.live_paths.clear()
+            return None
+
+        def reconcile():
+            try:
+                marker.unlink(missing_ok=True)
+                self.check_symlinks()
+                marker.parent.mkdir(parents=True, exist_ok=True)
+                marker.touch()
+            except Exception as e:
+                logger.error(f"Startup symlink check failed: {e}")
+            finally:
+                self.ready.set()
+                self.live_paths.clear()
+                self.write_status()
+
+        thread = threading.Thread(target=reconcile, name="reconcile-startup", daemon=True)
+        thread.start()
+        return thread
+
+    def settings_changed(self, changed):
+        """Pick up edited file monitor settings while running, without a restart or a full sweep.
+
+        Most settings are read where they are used, so poll intervals and the
+        like apply from the next cycle on. Changed include or ignore rules
+        rebuild the matcher, and only libraries that were added are swept.
+        """
+        keys = None if changed is None else {key.split(".", 1)[1] for key in changed if "." in key}
+        settings = self.file_monitor_settings
+        if keys is None or keys & {"file_types", "ignored_files", "ignored_dirs"}:
+            self.matcher = PathMatcher.from_settings(settings)
+            self.reconciler.matcher = self.matcher
+        if keys is None or keys & _TIER_SETTINGS:
+            # Updated in place, the pollers share this instance
+            vars(self.tiers).update(vars(PollTiers.from_settings(settings)))
+        if keys is None or keys & {"stat_cache_seconds", "stat_cache_negative_seconds"}:
+            self.stat_cache.ttl = settings.stat_cache_seconds
+            self.stat_cache.negative_ttl = settings.stat_cache_negative_seconds
+        if keys is None or "library_paths" in keys:
+            added = [lib for lib in settings.library_paths if lib not in self.libraries]
+            removed = [lib for lib in self.libraries if lib not in settings.library_paths]
+            self.libraries = list(settings.library_paths)
+            if self.router is not path_router:
+                # The global router follows the settings by itself
+                self.router.rebuild(settings)
+            if removed:
+                logger.info(f"No longer watching {', '.join(removed)}, their symlinks are left in place")
+            if added:
+                logger.info(f"Now watching {', '.join(added)}, creating their symlinks")
+                threading.Thread(target=self.reconcile_added, args=(added,), name="reconcile-added",
+                                 daemon=True).start()
+        if keys and keys & _RESTART_SETTINGS:
+            logger.warning(f"Changes to {', '.join(sorted(keys & _RESTART_SETTINGS))} apply after a restart")
+
+    def status(self) -> dict:
+        return {
+            "live": self.observer is not None and self.observer.is_alive(),
+            "ready": self.ready.is_set(),
+            "reconcile": self.reconciler.progress.as_dict(),
+            "queue": self.queue.stats(),
+            "updated": time.time(),
+        }
+
+    def write_status(self):
+        """Write the current status to ``status.json`` in the data directory, atomically."""
+        status_path = self.state_dir / "status.json"
+        temp_path = status_path.with_suffix(".json.tmp")
+        try:
+            status_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path.write_text(json.dumps(self.status()))
+            os.replace(temp_path, status_path)
+        except OSError as e:
+            logger.error(f"Could not write status file: {e}")
+
+    def symlink_for(self, src):
+        """Return the library a source path belongs to and the symlink it maps to."""
+        return self.router.symlink_for(src)
 
     def mushroom_tosser(self, src, dest="", etype=""):
-        for lib in self.file_monitor_settings.library_paths:
-            lib_path = os.path.join(self.file_monitor_settings.rclone_path, lib)
-            logger.debug(f"Checking library path: {lib_path}")
-            original_filename = os.path.basename(src)
-            symlink_path = os.path.join(self.file_monitor_settings.symlink_path, lib, original_filename)
+        if etype == "move":
+            # The file now lives at dest: drop the link for its old name and link the new location
+            self.mushroom_tosser(src, etype="delete")
+            src, etype = dest, "created"
 
-            if etype == "delete":
-                logger.debug(f"Handling delete for {src}")
-                if os.path.islink(symlink_path) or os.path.exists(symlink_path):
-                    self.remove_symlink(symlink_path)
-                    logger.info(f"Removed symlink {symlink_path} for deleted file {src}")
-                    self.update_plex(lib)
-                return
+        lib, symlink_path = self.symlink_for(src)
+        trace = tracer.finish(src)
+        if lib is None:
+            logger.debug("{}No Mushrooms to throw for {}", trace_label(trace), src)
+            return
 
-            logger.debug(f"Handling etype: {etype}, src: {src}, dest: {dest}")
+        if not self.ready.is_set():
+            self.live_paths.add(symlink_path)
+        sweep = self.sweeps.get(lib)
+        if sweep is not None:
+            sweep.add(symlink_path)
 
-            if (
-                    (etype == "move" and os.path.dirname(dest).startswith(lib_path))
-                    or os.path.dirname(src).startswith(lib_path)
-            ):
-                self.create_symlink(src, symlink_path)
-                logger.info(f"Mushroom Thrown: {lib_path} and created symlink {symlink_path}")
-                self.update_plex(lib)
-                return
-        logger.info("No Mushrooms to throw.")
+        if etype == "delete":
+            logger.debug("Handling delete for {}", src)
+            self.index.remove(src)
+            if self.stat_cache.lexists(symlink_path):
+                self.remove_symlink(symlink_path)
+                self.stat_cache.invalidate(symlink_path, *remove_empty_parents(
+                    symlink_path, os.path.join(self.file_monitor_settings.symlink_path, lib)))
+                self.index.remove(symlink_path)
+                SYMLINKS_REMOVED.inc(library=lib)
+                self.observe_symlink_latency(trace)
+                self.summary.log("removed", "symlinks", lib, "{}Removed symlink {} for deleted file {}",
+                                 trace_label(trace), symlink_path, src)
+                self.update_plex(lib, symlink_path, trace)
+            return
+
+        if self.links_to(symlink_path, src):
+            # Already handled, e.g. pushed first and polled later
+            logger.debug("{}Symlink {} already points at {}", trace_label(trace), symlink_path, src)
+            return
+
+        logger.debug("{}Handling etype: {}, src: {}", trace_label(trace), etype, src)
+        self.create_symlink(src, symlink_path)
+        self.refresh_index(src, symlink_path)
+        SYMLINKS_CREATED.inc(library=lib)
+        self.observe_symlink_latency(trace)
+        self.summary.log("created", "symlinks", lib, "{}Mushroom Thrown: {} and created symlink {}",
+                         trace_label(trace), lib, symlink_path)
+        self.update_plex(lib, symlink_path, trace)
+
+    @staticmethod
+    def observe_symlink_latency(trace):
+        if trace is not None:
+            EVENT_TO_SYMLINK_SECONDS.observe(time.monotonic() - trace.started)
 
     @staticmethod
-    def create_symlink(src, symlink_path):
-        """Create a symlink for the given source file, resolving absolute paths."""
+    def links_to(symlink_path, src) -> bool:
+        try:
+            return os.readlink(symlink_path) == os.path.abspath(src)
+        except OSError:
+            return False
+
+    def create_symlink(self, src, symlink_path):
+        """Create a symlink for the given source file, atomically replacing an existing one."""
         abs_src = os.path.abspath(src)
         abs_symlink_path = os.path.abspath(symlink_path)
+        symlink_dir = os.path.dirname(abs_symlink_path)
 
-        if not os.path.exists(os.path.dirname(abs_symlink_path)):
-            os.makedirs(os.path.dirname(abs_symlink_path))
-        if os.path.islink(abs_symlink_path) or os.path.exists(abs_symlink_path):
-            os.remove(abs_symlink_path)
-        os.symlink(abs_src, abs_symlink_path)
-        logger.info(f"Created symlink {abs_symlink_path} for file {abs_src}")
+        if not self.stat_cache.isdir(symlink_dir):
+            os.makedirs(symlink_dir, exist_ok=True)
+            self.stat_cache.invalidate(symlink_dir)
+        try:
+            link(abs_src, abs_symlink_path)
+        except FileNotFoundError:
+            # The folder was removed as empty by a concurrent removal since it was cached
+            os.makedirs(symlink_dir, exist_ok=True)
+            self.stat_cache.invalidate(symlink_dir)
+            link(abs_src, abs_symlink_path)
+        self.stat_cache.invalidate(abs_symlink_path)
+        logger.debug("Created symlink {} for file {}", abs_symlink_path, abs_src)
 
     @staticmethod
     def remove_symlink(symlink_path):
         """Remove the given symlink."""
-        if os.path.islink(symlink_path) or os.path.exists(symlink_path):
+        try:
             os.remove(symlink_path)
-            logger.info(f"Removed invalid symlink: {symlink_path}")
+            logger.debug("Removed invalid symlink: {}", symlink_path)
+        except FileNotFoundError:
+            pass
 
-    class Handler(watchdog.events.PatternMatchingEventHandler):
+    class Handler(watchdog.events.FileSystemEventHandler):
         def __init__(self, monitor):
-            super().__init__(patterns=monitor.file_monitor_settings.file_types,
-                             ignore_patterns=monitor.file_monitor_settings.ignored_files, ignore_directories=False,
-                             case_sensitive=False)
+            super().__init__()
             self.monitor = monitor
 
+        def dispatch(self, event):
+            recorder = self.monitor.recorder
+            if recorder and event.event_type in RECORDED_EVENTS:
+                recorder.record(event.event_type, event.src_path, getattr(event, "dest_path", ""),
+                                event.is_directory)
+            matcher = self.monitor.matcher
+            paths = [event.src_path, getattr(event, "dest_path", "")]
+            if not any(path and matcher.matches(path) and not matcher.within_pruned(path) for path in paths):
+                return
+            super().dispatch(event)
+
         def on_created(self, event):
             try:
-                logger.info(f"File created: {event.src_path}")
+                logger.debug("File created: {}", event.src_path)
                 self.monitor.record_change("created", event.src_path)
             except Exception as e:
                 logger.error(f"Error in on_created: {e}")
 
         def on_deleted(self, event):
             try:
-                logger.info(f"File deleted: {event.src_path}")
+                logger.debug("File deleted: {}", event.src_path)
                 self.monitor.record_change("delete", event.src_path)
             except Exception as e:
                 logger.error(f"Error in on_deleted: {e}")
 
         def on_moved(self, event):
             try:
-                logger.info(f"File moved: {event.src_path} to {event.dest_path}")
+                logger.debug("File moved: {} to {}", event.src_path, event.dest_path)
                 self.monitor.record_change("move", event.src_path, event.dest_path)
             except Exception as e:
                 logger.error(f"Error in on_moved: {e}")
 
+    class SymlinkHandler(watchdog.events.FileSystemEventHandler):
+        """Repairs symlinks that are deleted by someone else while their source still exists."""
+
+        def __init__(self, monitor):
+            super().__init__()
+            self.monitor = monitor
+
+        def on_deleted(self, event):
+            try:
+                self.monitor.repair_symlink(event.src_path)
+            except Exception as e:
+                logger.error(f"Error in on_deleted: {e}")
+
+    def repair_symlink(self, symlink_path):
+        """Put back a deleted symlink through the normal pipeline if its source is still there.
+
+        Symlinks we remove ourselves are dropped from the index as they go, and
+        their sources are gone anyway, so only external deletions are repaired.
+        """
+        entry = self.index.get(symlink_path)
+        if entry is None or not entry.target or not self.stat_cache.exists(entry.target):
+            return
+        if self.symlink_for(entry.target)[1] != symlink_path:
+            return
+        # The same filter as Handler.dispatch, the rules may have changed since the link was made
+        if not self.matcher.matches(entry.target) or self.matcher.within_pruned(entry.target):
+            return
+        logger.info(f"Symlink {symlink_path} was deleted externally, restoring it")
+        self.stat_cache.invalidate(symlink_path)
+        self.index.remove(symlink_path)
+        self.record_change("created", entry.target)
+
+    def prune(self, path) -> bool:
+        """Through the current matcher, so pollers follow a reloaded ``ignored_dirs``."""
+        return self.matcher.prune(path)
+
+    def watch_roots(self, root):
+        """The whole root, or for a shard only the library directories it owns."""
+        if not self.sharded:
+            return [root]
+        roots = []
+        for lib in self.file_monitor_settings.library_paths:
+            lib_path = os.path.join(root, lib)
+            if os.path.isdir(lib_path):
+                roots.append(lib_path)
+            else:
+                logger.warning(f"Not watching {lib_path}, it does not exist")
+        return roots
+
     def start_monitoring(self):
-        event_handler = self.Handler(self)
-        observer = PollingObserver()
-        observer.schedule(event_handler, path=self.file_monitor_settings.rclone_path, recursive=True)
+        observer = ObserverGroup(
+            partial(
+                CompactPollingObserver,
+                index=self.index,
+                tiers=self.tiers,
+                prune=self.prune,
+                timeout=self.file_monitor_settings.hot_poll_seconds,
+            ),
+            backend=self.file_monitor_settings.observer_backend,
+        )
+        for path in self.watch_roots(self.file_monitor_settings.rclone_path):
+            observer.schedule(self.Handler(self), path=path, recursive=True)
+        if self.file_monitor_settings.watch_symlinks:
+            for path in self.watch_roots(self.file_monitor_settings.symlink_path):
+                if os.path.isdir(path):
+                    observer.schedule(self.SymlinkHandler(self), path=path, recursive=True)
         observer.start()
+        self.observer = observer
+        logger.info("Monitoring live, reconciling symlinks in the background")
+        self.start_reconciliation()
         return observer
 
     @staticmethod
     def stop_monitoring(observer):
         observer.stop()
         observer.join()
-        logger.info("Stopped monitoring")
\ No newline at end of file
+        logger.info("Stopped monitoring")
+
+    def shutdown(self, observer):
+        """Stop watching, finish the queued work and close everything down.
+
+        Batches still waiting for their timer are processed, and the workers
+        drain the queue, before the journal is closed and Plex is refreshed.
+        """
+        self.stop_monitoring(observer)
+        self.scheduler.stop()
+        self.process_changes()
+        self.queue.stop()
+        self.summary.flush()
+        if self.journal:
+            self.journal.close()
+        if self.recorder:
+            self.recorder.close()
+        self.plex.stop()
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""Persistent on-disk index of the rclone and symlink trees"""
+
+import os
+import sqlite3
+import stat as stat_module
+import threading
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+SCHEMA_VERSION = 1
+
+
+class IndexEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    ino: int
+    target: Optional[str] = None
+
+
+def scan_dir(path: str) -> Tuple[List[IndexEntry], List[str]]:
+    """List a single directory, returning its file entries and sub directories."""
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                target = os.readlink(entry.path) if entry.is_symlink() else None
+                files.append(IndexEntry(entry.path, stat.st_size, stat.st_mtime, entry.inode(), target))
+            except OSError as e:
+                logger.debug(f"Skipping {entry.path}: {e}")
+    return files, subdirs
+
+
+def stat_entry(path: str) -> Optional[IndexEntry]:
+    """Build an index entry for a single path, or None if it no longer exists."""
+    try:
+        stat = os.lstat(path)
+        target = os.readlink(path) if stat_module.S_ISLNK(stat.st_mode) else None
+    except OSError:
+        return None
+    return IndexEntry(path, stat.st_size, stat.st_mtime, stat.st_ino, target)
+
+
+class FileIndex:
+    """SQLite backed index of path, size, mtime and symlink target.
+
+    Directory rows remember the mtime they had when they were last listed, so a
+    walk only re-lists directories whose mtime has changed since. Files recorded
+    through ``upsert`` deliberately leave their parent's mtime alone, which
+    forces that directory to be verified once more on the next walk.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.lock = threading.Lock()
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.lock, self.conn:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                if version:
+                    logger.info(f"Index schema changed ({version} -> {SCHEMA_VERSION}), rebuilding index")
+                self.conn.execute("DROP TABLE IF EXISTS files")
+                self.conn.execute("DROP TABLE IF EXISTS dirs")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, parent TEXT NOT NULL, size INTEGER, mtime REAL, ino INTEGER, target TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_parent ON files (parent)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def dir_mtime(self, path: str) -> Optional[float]:
+        with self.lock:
+            row = self.conn.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def listing(self, path: str) -> Tuple[List[IndexEntry], List[str]]:
+        """Return the indexed files and sub directories of a directory."""
+        with self.lock:
+            files = [
+                IndexEntry(*row) for row in self.conn.execute(
+                    "SELECT path, size, mtime, ino, target FROM files WHERE parent = ?", (path,))
+            ]
+            subdirs = [row[0] for row in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+        return files, subdirs
+
+    def replace_dir(self, path: str, mtime: float, files: List[IndexEntry], subdirs: List[str]):
+        """Replace the indexed contents of a directory with a fresh listing."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO dirs (path, parent, mtime) VALUES (?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET mtime = excluded.mtime",
+                (path, os.path.dirname(path), mtime),
+            )
+            self.conn.execute("DELETE FROM files WHERE parent = ?", (path,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, parent, size, mtime, ino, target) VALUES (?, ?, ?, ?, ?, ?)",
+                [(f.path, path, f.size, f.mtime, f.ino, f.target) for f in files],
+            )
+            known = {row[0] for row in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))}
+            for gone in known.difference(subdirs):
+                self._delete_tree(gone)
+            # New sub directories get no mtime, so they are always listed on first sight
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO dirs (path, parent, mtime) VALUES (?, ?, NULL)",
+                [(subdir, path) for subdir in subdirs],
+            )
+
+    def count(self, root: str) -> Tuple[int, int]:
+        """Return how many directories and files the index knows below a root."""
+        like = self._like(root)
+        with self.lock:
+            dirs = self.conn.execute(
+                "SELECT COUNT(*) FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (root, like)).fetchone()[0]
+            files = self.conn.execute(
+                "SELECT COUNT(*) FROM files WHERE parent = ? OR parent LIKE ? ESCAPE '\\'", (root, like)).fetchone()[0]
+        return dirs, files
+
+    def get(self, path: str) -> Optional[IndexEntry]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT path, size, mtime, ino, target FROM files WHERE path = ?", (path,)).fetchone()
+        return IndexEntry(*row) if row else None
+
+    def upsert(self, entry: IndexEntry):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, parent, size, mtime, ino, target) VALUES (?, ?, ?, ?, ?, ?)",
+                (entry.path, os.path.dirname(entry.path), entry.size, entry.mtime, entry.ino, entry.target),
+            )
+
+    def remove(self, path: str):
+        """Forget a file, or a directory and everything below it."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._delete_tree(path)
+
+    @staticmethod
+    def _like(path: str) -> str:
+        """LIKE pattern matching everything below a directory."""
+        return path.rstrip(os.sep).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + os.sep + "%"
+
+    def _delete_tree(self, path: str):
+        like = self._like(path)
+        self.conn.execute("DELETE FROM files WHERE parent = ? OR parent LIKE ? ESCAPE '\\'", (path, like))
+        self.conn.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (path, like))
+
+    def visit(self, path: str) -> Optional[Tuple[List[IndexEntry], List[str]]]:
+        """Return the files and sub directories of a directory, or None if it is gone.
+
+        Only the directory itself is stat'ed. When its mtime still matches the
+        index the listing is served from the index, otherwise it is listed from
+        disk and written back.
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.remove(path)
+            return None
+        if self.dir_mtime(path) == mtime:
+            return self.listing(path)
+        try:
+            files, subdirs = scan_dir(path)
+        except OSError as e:
+            logger.warning(f"Unable to list {path}: {e}")
+            return None
+        self.replace_dir(path, mtime, files, subdirs)
+        return files, subdirs
+
+    def walk(self, root: str) -> Iterator[Tuple[str, List[IndexEntry]]]:
+        """Walk a tree like ``os.walk``, yielding ``(dirpath, files)``."""
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            listing = self.visit(path)
+            if listing is None:
+                continue
+            files, subdirs = listing
+            stack.extend(subdirs)
+            yield path, files
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
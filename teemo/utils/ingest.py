@@ -0,0 +1,115 @@
+"""Local HTTP endpoint that lets a downloader push file changes"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+ACTIONS = {
+    "added": "created",
+    "created": "created",
+    "removed": "delete",
+    "deleted": "delete",
+    "delete": "delete",
+    "moved": "move",
+    "move": "move",
+}
+
+
+class IngestServer:
+    """Accepts batched change notifications and feeds them to ``FileWatcher.record_change``.
+
+    ``POST /changes`` takes a JSON list (or ``{"changes": [...]}``) of
+    ``{"action": "added" | "removed" | "moved", "path": ..., "dest": ...}``.
+    Pushed changes go through the same coalescing, journal and worker queue as
+    polled ones and are processed right away. Handling a change is
+    idempotent, so when the poller sees the same file later nothing happens.
+    ``GET /status`` returns ``FileWatcher.status()``.
+    """
+
+    def __init__(self, monitor, host: str = "127.0.0.1", port: int = 8686):
+        self.monitor = monitor
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def ingest(self, changes: List[dict]) -> Dict[str, int]:
+        """Record a batch of pushed changes, returning how many were accepted and ignored.
+
+        The whole batch is validated first, so a bad entry rejects it without recording any of it.
+        """
+        parsed = []
+        for change in changes:
+            if not isinstance(change, dict):
+                raise ValueError(f"Invalid change: {change}")
+            etype = ACTIONS.get(str(change.get("action", "added")).lower())
+            src, dest = change.get("path"), change.get("dest") or ""
+            if etype is None or not isinstance(src, str) or not isinstance(dest, str) or (etype == "move" and not dest):
+                raise ValueError(f"Invalid change: {change}")
+            parsed.append((etype, src, dest))
+
+        accepted = ignored = 0
+        matcher = self.monitor.matcher
+        for etype, src, dest in parsed:
+            # The same filter as the observer's Handler.dispatch
+            if not any(self.monitor.router.library_for(path) and matcher.matches(path)
+                       and not matcher.within_pruned(path) for path in (src, dest) if path):
+                ignored += 1
+                continue
+            self.monitor.record_change(etype, src, dest)
+            accepted += 1
+        if accepted:
+            self.monitor.process_now()
+        return {"accepted": accepted, "ignored": ignored}
+
+    def _handler(self):
+        ingest_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code: int, body: dict):
+                payload = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == "/status":
+                    self._reply(200, ingest_server.monitor.status())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path != "/changes":
+                    self._reply(404, {"error": "not found"})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+                    changes = body.get("changes", []) if isinstance(body, dict) else body
+                    if not isinstance(changes, list):
+                        raise ValueError("Expected a list of changes")
+                    self._reply(202, ingest_server.ingest(changes))
+                except ValueError as e:
+                    self._reply(400, {"error": str(e)})
+
+            def log_message(self, format, *args):
+                logger.debug(f"Ingest {self.address_string()}: {format % args}")
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.1},
+                                       name="ingest", daemon=True)
+        self.thread.start()
+        logger.info(f"Accepting pushed changes on port {self.port}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
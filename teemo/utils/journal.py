@@ -0,0 +1,121 @@
+"""Write-ahead journal of pending file changes"""
+
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+JournalEntry = Tuple[int, str, str, str]
+
+_CHECKPOINT = "#"
+
+
+class ChangeJournal:
+    """Append-only log of recorded changes, so a restart can pick up where it left off.
+
+    Each change is one JSON line ``[seq, etype, src, dest]``; a checkpoint is
+    ``[seq, "#"]`` and marks every change up to ``seq`` as applied. Appends only
+    go to an in-memory buffer. A committer thread writes the buffer out and
+    fsyncs it every ``commit_interval`` seconds, so a burst of events costs one
+    fsync per interval rather than one per event. A crash loses at most the
+    last interval. Once everything is checkpointed and the file has grown past
+    ``max_bytes`` it is truncated.
+    """
+
+    def __init__(self, path, commit_interval: float = 0.2, max_bytes: int = 4 * 1024 * 1024):
+        self.path = str(path)
+        self.commit_interval = commit_interval
+        self.max_bytes = max_bytes
+        self.seq = 0
+        self.checkpointed = 0
+        self.commits = 0
+        self.buffer: List[str] = []
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.committer: Optional[threading.Thread] = None
+        self.pending = self._read()
+        # Only a shutdown that left changes unapplied is something to recover from
+        self.recovered = bool(self.pending)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8", errors="surrogateescape")
+
+    def _read(self) -> List[JournalEntry]:
+        """Load the changes recorded after the last checkpoint."""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8", errors="surrogateescape") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the end of the file, everything before it is intact
+                    break
+                self.seq = max(self.seq, record[0])
+                if record[1] == _CHECKPOINT:
+                    self.checkpointed = record[0]
+                    entries = [entry for entry in entries if entry[0] > record[0]]
+                else:
+                    entries.append(tuple(record))
+        return entries
+
+    def replay(self) -> List[JournalEntry]:
+        """Return the changes that were recorded but never checkpointed before the last shutdown."""
+        pending, self.pending = self.pending, []
+        if pending:
+            logger.info(f"Replaying {len(pending)} unapplied changes from {self.path}")
+        return pending
+
+    def start(self):
+        self.committer = threading.Thread(target=self._commit_loop, name="journal", daemon=True)
+        self.committer.start()
+
+    def append(self, etype: str, src: str, dest: str = "") -> int:
+        with self.lock:
+            self.seq += 1
+            self.buffer.append(json.dumps([self.seq, etype, src, dest], separators=(",", ":")) + "\n")
+            return self.seq
+
+    def checkpoint(self, seq: int):
+        """Mark every change up to ``seq`` as applied."""
+        with self.lock:
+            if seq <= self.checkpointed:
+                return
+            self.checkpointed = seq
+            self.buffer.append(json.dumps([seq, _CHECKPOINT]) + "\n")
+
+    def commit(self):
+        """Write out and fsync everything appended so far."""
+        with self.file_lock:
+            with self.lock:
+                lines, self.buffer = self.buffer, []
+                compact = self.checkpointed == self.seq
+            if not lines:
+                return
+            if compact and self.file.tell() > self.max_bytes:
+                # Nothing in the file is needed any more
+                self.file.truncate(0)
+                self.file.seek(0)
+                lines = lines[-1:]
+            self.file.writelines(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.commits += 1
+
+    def _commit_loop(self):
+        while not self.stopped.wait(self.commit_interval):
+            try:
+                self.commit()
+            except OSError as e:
+                logger.error(f"Could not write change journal: {e}")
+
+    def close(self):
+        self.stopped.set()
+        if self.committer:
+            self.committer.join()
+        self.commit()
+        self.file.close()
@@ -0,0 +1,102 @@
+"""Migration of an existing symlink tree to the configured symlink layout
+
+Stop Teemo, set ``symlink_layout`` (and ``symlink_layout_depth``) in the file
+monitor settings, then run from the teemo folder:
+
+    python -m utils.layout --dry-run
+    python -m utils.layout
+"""
+
+import argparse
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from loguru import logger
+from settings.manager import settings_manager
+from utils.planner import TEMP_SUFFIX, remove_empty_parents
+from utils.router import PathRouter
+
+
+@dataclass
+class MigrationResult:
+    lib: str
+    links: int = 0
+    moved: int = 0
+    duplicates: int = 0
+    folders_removed: int = 0
+    conflicts: List[str] = field(default_factory=list)
+
+
+def migrate(settings, router: Optional[PathRouter] = None, libraries: Optional[List[str]] = None,
+            dry_run: bool = False) -> List[MigrationResult]:
+    """Move every symlink to where the configured layout puts it, in place.
+
+    Links are renamed rather than recreated, so each one keeps pointing at
+    its file throughout and nothing is asked of Plex: its next scan, or a
+    targeted refresh, finds the same files in their new folders. A link
+    whose new path is already taken by a link to the same file is removed;
+    one whose new path holds anything else is left where it is and reported.
+    Folders the move leaves empty are removed. Links to files outside the
+    library are not touched.
+    """
+    router = router if router is not None else PathRouter(settings)
+    libraries = list(settings.library_paths) if libraries is None else libraries
+    results = []
+    for lib in libraries:
+        result = MigrationResult(lib)
+        symlink_dir = os.path.join(settings.symlink_path, lib)
+        # Listed up front, so the walk never runs into folders the moves create or remove
+        links = [os.path.join(dirpath, name) for dirpath, _, filenames in os.walk(symlink_dir)
+                 for name in filenames if not name.endswith(TEMP_SUFFIX)]
+        for path in links:
+            try:
+                target = os.readlink(path)
+            except OSError:
+                continue
+            result.links += 1
+            if router.library_for(target) != lib:
+                continue
+            _, new_path = router.symlink_for(target)
+            if new_path is None or new_path == path:
+                continue
+            if os.path.lexists(new_path):
+                try:
+                    duplicate = os.readlink(new_path) == target
+                except OSError:
+                    duplicate = False
+                if not duplicate:
+                    result.conflicts.append(path)
+                    continue
+                result.duplicates += 1
+                if not dry_run:
+                    os.remove(path)
+                    result.folders_removed += len(remove_empty_parents(path, symlink_dir))
+                continue
+            result.moved += 1
+            if not dry_run:
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                os.rename(path, new_path)
+                result.folders_removed += len(remove_empty_parents(path, symlink_dir))
+        logger.info(
+            f"{'Would migrate' if dry_run else 'Migrated'} '{lib}' to the {router.layout} layout: "
+            f"{result.links} links, {result.moved} moved, {result.duplicates} duplicates removed, "
+            f"{result.folders_removed} empty folders removed, {len(result.conflicts)} conflicts"
+        )
+        for path in result.conflicts[:20]:
+            logger.warning(f"Left {path} in place, its new path is taken by another file")
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    parser.add_argument("--library", action="append", help="migrate only this library, may be repeated")
+    args = parser.parse_args()
+    results = migrate(settings_manager.settings.file_monitor, libraries=args.library, dry_run=args.dry_run)
+    raise SystemExit(1 if any(result.conflicts for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,88 @@
-"""Logging utils"""
-
-import sys
-from loguru import logger
-from settings.manager import settings_manager
-from rich.console import Console
-
-
-def setup_logger(level):
-    # Default log levels
-    logger.level("INFO", icon="📰")
-    logger.level("DEBUG", icon="🤖")
-    logger.level("WARNING", icon="⚠️ ")
-    logger.level("CRITICAL", icon="")
-    logger.level("SUCCESS", icon="✔️ ")
-
-    log_format = (
-        "<fg #818589>{time:YY-MM-DD} {time:HH:mm:ss}</fg #818589> | "
-        "<level>{level.icon}</level> <level>{level: <9}</level> | "
-        "<fg #990066>{module}</fg #990066>.<fg #990066>{function}</fg #990066> - <level>{message}</level>"
-    )
-
-    logger.configure(handlers=[
-        {
-            "sink": sys.stderr,
-            "level": "DEBUG",
-            "format": log_format,
-            "backtrace": False,
-            "diagnose": False,
-            "enqueue": True,
-            "colorize": True
-        }
-    ])
-
-
-console = Console()
-log_level = "DEBUG" if settings_manager.settings.debug else "INFO"
-setup_logger(log_level)
\ No newline at end of file
+"""Logging utils"""
+
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+from loguru import logger
+from settings.manager import settings_manager
+from rich.console import Console
+
+
+def setup_logger(level, json_logs=False):
+    """Log at ``level`` and above to stderr, as text or as one JSON object per line.
+
+    Loguru checks the level before formatting, so hot paths log with
+    ``logger.debug("... {}", value)`` rather than f-strings and cost next to
+    nothing when their level is off. Keyword arguments end up in the
+    ``extra`` fields of JSON records.
+    """
+    # Default log levels
+    logger.level("INFO", icon="📰")
+    logger.level("DEBUG", icon="🤖")
+    logger.level("WARNING", icon="⚠️ ")
+    logger.level("CRITICAL", icon="")
+    logger.level("SUCCESS", icon="✔️ ")
+
+    log_format = (
+        "<fg #818589>{time:YY-MM-DD} {time:HH:mm:ss}</fg #818589> | "
+        "<level>{level.icon}</level> <level>{level: <9}</level> | "
+        "<fg #990066>{module}</fg #990066>.<fg #990066>{function}</fg #990066> - <level>{message}</level>"
+    )
+
+    logger.configure(handlers=[
+        {
+            "sink": sys.stderr,
+            "level": level,
+            "format": "{message}" if json_logs else log_format,
+            "serialize": json_logs,
+            "backtrace": False,
+            "diagnose": False,
+            "enqueue": True,
+            "colorize": not json_logs
+        }
+    ])
+
+
+class BurstSummary:
+    """Logs per-file lines at INFO until they arrive in bursts, then sums them up instead.
+
+    Per action and library, the first ``threshold`` lines of a window are
+    logged at INFO and the rest at DEBUG. ``flush``, called once per window,
+    then logs one line such as "created 4,812 symlinks in movies in the last
+    10s" for every action that went over.
+    """
+
+    def __init__(self, threshold: int = 20):
+        self.threshold = threshold
+        self.counts: Dict[Tuple[str, str, str], int] = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def log(self, action: str, noun: str, library: str, message: str, *args, **kwargs):
+        key = (action, noun, library)
+        with self.lock:
+            count = self.counts[key] = self.counts.get(key, 0) + 1
+        level = "INFO" if count <= self.threshold else "DEBUG"
+        logger.opt(depth=1).log(level, message, *args, action=action, library=library, **kwargs)
+
+    def flush(self):
+        now = time.monotonic()
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            elapsed, self.started = now - self.started, now
+        for (action, noun, library), count in counts.items():
+            if count > self.threshold:
+                logger.info(f"{action} {count:,} {noun} in {library} in the last {elapsed:.0f}s",
+                            action=action, library=library, count=count)
+
+
+def configure(changed=None):
+    settings = settings_manager.settings
+    setup_logger("DEBUG" if settings.debug else "INFO", settings.log_json)
+
+
+console = Console()
+configure()
+settings_manager.register_observer(configure, keys=("debug", "log_json"))
@@ -0,0 +1,76 @@
+"""Compiled include and ignore rules for paths"""
+
+import fnmatch
+import os
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def _compile(patterns: Iterable[str]) -> Tuple[Optional[Pattern], Optional[Pattern]]:
+    """Combine globs into one regex against the name and one against the full path.
+
+    Like watchdog's pattern matching, a glob without a separator matches the
+    last component of a path, one with a separator the path as a whole.
+    """
+    by_name, by_path = [], []
+    for pattern in patterns:
+        (by_path if os.sep in pattern else by_name).append(fnmatch.translate(pattern))
+    return (
+        re.compile("|".join(by_name), re.IGNORECASE) if by_name else None,
+        re.compile(".*(?:" + "|".join(by_path) + ")", re.IGNORECASE) if by_path else None,
+    )
+
+
+class PathMatcher:
+    """``file_types``, ``ignored_files`` and ``ignored_dirs`` compiled once.
+
+    Plain extension globs such as ``*.mkv`` become a suffix check, anything
+    else is folded into a single combined regex, so a path costs a couple of
+    string operations instead of one fnmatch per pattern. Directories matching
+    ``ignored_dirs`` are pruned: nothing below them is walked, polled or linked.
+    """
+
+    def __init__(self, file_types: List[str], ignored_files: List[str] = (), ignored_dirs: List[str] = ()):
+        suffixes, globs = [], []
+        for pattern in file_types:
+            body = pattern[1:] if pattern.startswith("*") else None
+            if body is not None and body.startswith(".") and not _GLOB_CHARS.search(body):
+                suffixes.append(body.lower())
+            else:
+                globs.append(pattern)
+        self.suffixes = tuple(suffixes)
+        self.include_name, self.include_path = _compile(globs)
+        self.ignore_name, self.ignore_path = _compile(ignored_files)
+        self.prune_name, self.prune_path = _compile(ignored_dirs)
+
+    @classmethod
+    def from_settings(cls, settings) -> "PathMatcher":
+        return cls(settings.file_types, settings.ignored_files, settings.ignored_dirs)
+
+    def matches(self, path: str) -> bool:
+        """Whether a file is one we link: included by ``file_types`` and not ignored."""
+        name = os.path.basename(path)
+        if not (name.lower().endswith(self.suffixes)
+                or (self.include_name and self.include_name.match(name))
+                or (self.include_path and self.include_path.match(path))):
+            return False
+        return not ((self.ignore_name and self.ignore_name.match(name))
+                    or (self.ignore_path and self.ignore_path.match(path)))
+
+    def prune(self, path: str) -> bool:
+        """Whether a directory, and so everything below it, is ignored."""
+        return bool((self.prune_name and self.prune_name.match(os.path.basename(path)))
+                    or (self.prune_path and self.prune_path.match(path)))
+
+    def within_pruned(self, path: str) -> bool:
+        """Whether any directory above a path is ignored, for paths that did not come from a pruned walk."""
+        if not (self.prune_name or self.prune_path):
+            return False
+        directory = os.path.dirname(path)
+        while directory and directory != os.path.dirname(directory):
+            if self.prune(directory):
+                return True
+            directory = os.path.dirname(directory)
+        return False
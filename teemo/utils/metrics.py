@@ -0,0 +1,334 @@
+"""In-process metrics with a Prometheus text endpoint, and per file trace ids"""
+
+import bisect
+import itertools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+# Name to (kind, documentation, sample lines), what ``MetricsRegistry.collect`` returns
+Collected = Dict[str, Tuple[str, str, List[str]]]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def with_label(sample: str, name: str, value: str) -> str:
+    """Add a label in front of the others of one sample line in the text format."""
+    label = f'{name}="{_escape(value)}"'
+    if "{" in sample.split(" ", 1)[0]:
+        metric, rest = sample.split("{", 1)
+        return f"{metric}{{{label},{rest}"
+    metric, rest = sample.split(" ", 1)
+    return f"{metric}{{{label}}} {rest}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(_Metric):
+    """A value that is set, or read from a function at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        self.functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        with self.lock:
+            self.functions[self._key(labels)] = function
+
+    def _read(self, key: LabelValues) -> float:
+        function = self.functions.get(key)
+        return function() if function else self.values.get(key, 0)
+
+    def value(self, **labels) -> float:
+        return self._read(self._key(labels))
+
+    def samples(self):
+        with self.lock:
+            keys = list(self.values) + [key for key in self.functions if key not in self.values]
+        lines = []
+        for key in keys:
+            try:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {self._read(key)}")
+            except Exception as e:
+                logger.debug(f"Could not read {self.name}: {e}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sums[key] = self.sums.get(key, 0) + value
+
+    def count(self, **labels) -> int:
+        return sum(self.counts.get(self._key(labels), ()))
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            for key, counts in self.counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self.sums[key]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.monotonic() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    """The metrics of this process, plus the last samples other processes sent in.
+
+    Samples from elsewhere, such as the shards of a ``ShardSupervisor``, are
+    rendered next to our own with one extra label telling them apart.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.remote: Dict[Tuple[str, str], Collected] = {}
+        self.lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, documentation, tuple(labelnames), **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def collect(self) -> Collected:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: (metric.kind, metric.documentation, metric.samples()) for metric in metrics}
+
+    def update_remote(self, label: str, value: str, collected: Collected):
+        """Replace the samples last received from the process labelled ``label=value``."""
+        with self.lock:
+            self.remote[label, value] = collected
+
+    def render(self) -> str:
+        collected = self.collect()
+        with self.lock:
+            remote = list(self.remote.items())
+        for (label, value), metrics in remote:
+            for name, (kind, documentation, samples) in metrics.items():
+                collected.setdefault(name, (kind, documentation, []))[2].extend(
+                    with_label(sample, label, value) for sample in samples)
+        lines = []
+        for name, (kind, documentation, samples) in collected.items():
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", *samples])
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+EVENTS_RECEIVED = registry.counter("teemo_events_received_total", "Raw file events recorded", ["type"])
+EVENTS_COALESCED = registry.counter("teemo_events_coalesced_total", "Events absorbed by coalescing")
+CHANGES_PROCESSED = registry.counter("teemo_changes_processed_total", "Coalesced changes handed to the workers")
+SYMLINKS_CREATED = registry.counter("teemo_symlinks_created_total", "Symlinks created or replaced", ["library"])
+SYMLINKS_REMOVED = registry.counter("teemo_symlinks_removed_total", "Symlinks removed", ["library"])
+QUEUE_DEPTH = registry.gauge("teemo_queue_depth", "Changes waiting for a symlink worker")
+QUEUE_OLDEST = registry.gauge("teemo_queue_oldest_age_seconds", "Age of the oldest change waiting for a worker")
+POLL_SECONDS = registry.histogram("teemo_poll_duration_seconds", "Duration of one polling cycle", ["root"])
+RECONCILE_SECONDS = registry.histogram("teemo_reconcile_duration_seconds", "Duration of reconciling a library",
+                                       ["library"])
+PLEX_REQUEST_SECONDS = registry.histogram("teemo_plex_request_seconds", "Latency of Plex API requests", ["method"])
+PLEX_ERRORS = registry.counter("teemo_plex_errors_total", "Failed Plex API requests and refreshes", ["kind"])
+PLEX_REFRESHES = registry.counter("teemo_plex_refreshes_total", "Plex refreshes started", ["library", "scope"])
+EVENT_TO_SYMLINK_SECONDS = registry.histogram("teemo_event_to_symlink_seconds",
+                                              "Time from recording a change to its symlink being updated")
+EVENT_TO_PLEX_SECONDS = registry.histogram("teemo_event_to_plex_seconds",
+                                           "Time from recording a change to the Plex refresh covering it")
+
+
+class Trace(NamedTuple):
+    trace_id: str
+    started: float
+
+
+class Tracer:
+    """Hands out a trace id per file and remembers it until the file has made it to Plex.
+
+    The id shows up in the log lines of every stage, so one file can be
+    followed from its event to the refresh that picked it up. Traces that
+    are never finished are dropped once more than ``maxsize`` are open.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.open: Dict[str, Trace] = {}
+        self.prefix = f"{os.getpid():x}"
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start(self, path: str) -> Trace:
+        """Open a trace for a path, or return the one already open so latency counts from the first event."""
+        with self.lock:
+            trace = self.open.get(path)
+            if trace is not None:
+                return trace
+            trace = Trace(f"{self.prefix}-{next(self.ids):x}", time.monotonic())
+            self.open[path] = trace
+            while len(self.open) > self.maxsize:
+                self.open.pop(next(iter(self.open)))
+        return trace
+
+    def get(self, path: str) -> Optional[Trace]:
+        return self.open.get(path)
+
+    def move(self, src: str, dest: str):
+        with self.lock:
+            trace = self.open.pop(src, None)
+            if trace is not None:
+                self.open[dest] = trace
+
+    def finish(self, path: str) -> Optional[Trace]:
+        with self.lock:
+            return self.open.pop(path, None)
+
+
+tracer = Tracer()
+
+
+def trace_label(trace: Optional[Trace]) -> str:
+    return f"[{trace.trace_id}] " if trace else ""
+
+
+class MetricsServer:
+    """Serves ``GET /metrics`` in the Prometheus text format."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9686, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.1},
+                                       name="metrics", daemon=True)
+        self.thread.start()
+        logger.info(f"Serving metrics on port {self.port}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
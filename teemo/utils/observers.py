@@ -0,0 +1,100 @@
+"""Per root choice between native and polling observers"""
+
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import watchdog.observers
+from loguru import logger
+from watchdog.observers.api import BaseObserver
+
+NATIVE = "native"
+POLLING = "polling"
+
+# Filesystems that do not deliver native change notifications for changes made elsewhere
+_POLLING_FSTYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "davfs", "sshfs"}
+
+
+def _unescape(field: str) -> str:
+    """Undo the octal escapes ``/proc/mounts`` uses for spaces, tabs and the like."""
+    return field.encode().decode("unicode_escape").encode("latin-1").decode("utf-8", "surrogateescape")
+
+
+def read_mounts(mounts_file: str = "/proc/mounts") -> List[Tuple[str, str]]:
+    """Return ``(mount point, fstype)`` pairs, or nothing where the file is not available."""
+    mounts = []
+    try:
+        with open(mounts_file, encoding="utf-8", errors="surrogateescape") as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) >= 3:
+                    mounts.append((_unescape(fields[1]), fields[2]))
+    except OSError:
+        pass
+    return mounts
+
+
+def mount_fstype(path: str, mounts: List[Tuple[str, str]]) -> Optional[str]:
+    """Filesystem type of the most specific mount containing ``path``."""
+    path = os.path.realpath(path)
+    best, best_length = None, -1
+    for mount_point, fstype in mounts:
+        if (path == mount_point or path.startswith(os.path.join(mount_point, ""))) and len(mount_point) > best_length:
+            best, best_length = fstype, len(mount_point)
+    return best
+
+
+def needs_polling(fstype: Optional[str]) -> bool:
+    if fstype is None:
+        return False
+    return fstype.startswith("fuse") or fstype.split(".")[0] in _POLLING_FSTYPES
+
+
+class ObserverGroup:
+    """One native and one polling observer behind the interface of a single observer.
+
+    Each scheduled root gets the backend that works for its filesystem: native
+    (inotify on Linux) for local disks and tmpfs, polling for FUSE mounts such
+    as rclone and for network filesystems. ``backend`` forces one of the two
+    for every root. All handlers feed the same ``FileWatcher`` pipeline,
+    whichever observer delivers their events.
+    """
+
+    def __init__(self, polling_factory: Callable[[], BaseObserver], backend: str = "auto",
+                 mounts_file: str = "/proc/mounts"):
+        self.polling_factory = polling_factory
+        self.backend = backend
+        self.mounts = read_mounts(mounts_file)
+        self.observers: Dict[str, BaseObserver] = {}
+
+    def backend_for(self, path: str) -> str:
+        if self.backend in (NATIVE, POLLING):
+            return self.backend
+        return POLLING if needs_polling(mount_fstype(path, self.mounts)) else NATIVE
+
+    def _observer(self, backend: str) -> BaseObserver:
+        if backend not in self.observers:
+            self.observers[backend] = (
+                self.polling_factory() if backend == POLLING else watchdog.observers.Observer()
+            )
+        return self.observers[backend]
+
+    def schedule(self, event_handler, path: str, recursive: bool = False):
+        backend = self.backend_for(path)
+        logger.info(f"Watching {path} with the {backend} observer")
+        return self._observer(backend).schedule(event_handler, path, recursive=recursive)
+
+    def start(self):
+        for observer in self.observers.values():
+            observer.start()
+
+    def stop(self):
+        for observer in self.observers.values():
+            observer.stop()
+
+    def join(self, timeout: Optional[float] = None):
+        for observer in self.observers.values():
+            observer.join(timeout)
+
+    def is_alive(self) -> bool:
+        return bool(self.observers) and all(observer.is_alive() for observer in self.observers.values())
+
@@ -0,0 +1,147 @@
+"""Explicit, atomic change plans for the symlink tree"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+TEMP_SUFFIX = ".teemo-tmp"
+
+
+def atomic_symlink(src: str, symlink_path: str):
+    """Point ``symlink_path`` at ``src`` in one step.
+
+    The new link is created under a temporary name in the same directory and
+    renamed over the old one, so there is never a moment where the path is
+    missing.
+    """
+    directory, name = os.path.split(symlink_path)
+    temp_path = os.path.join(directory, f".{name}{TEMP_SUFFIX}")
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    os.symlink(src, temp_path)
+    os.replace(temp_path, symlink_path)
+
+
+def link(src: str, symlink_path: str):
+    """Create a symlink, atomically replacing whatever is already at its path."""
+    try:
+        os.symlink(src, symlink_path)
+    except FileExistsError:
+        atomic_symlink(src, symlink_path)
+
+
+def remove_empty_parents(path: str, stop: str) -> List[str]:
+    """Remove the directories above ``path`` that are left empty, up to but not including ``stop``.
+
+    Returns the directories removed. In the flat layout the parent is
+    ``stop`` itself and nothing is touched.
+    """
+    removed = []
+    stop = os.path.join(os.path.abspath(stop), "")
+    directory = os.path.dirname(os.path.abspath(path))
+    while directory.startswith(stop) and directory != stop.rstrip(os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        removed.append(directory)
+        directory = os.path.dirname(directory)
+    return removed
+
+
+@dataclass
+class ChangePlan:
+    """Symlinks to create, replace and remove, grouped so each parent directory is prepared once."""
+
+    create: Dict[str, str] = field(default_factory=dict)
+    replace: Dict[str, str] = field(default_factory=dict)
+    remove: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_reconcile(cls, result) -> "ChangePlan":
+        """A broken link that is also due to be created is swapped in place rather than removed first."""
+        plan = cls()
+        for symlink_path in result.to_remove:
+            if symlink_path in result.to_create:
+                plan.replace[symlink_path] = result.to_create[symlink_path]
+            else:
+                plan.remove.add(symlink_path)
+        for symlink_path, src in result.to_create.items():
+            if symlink_path not in plan.replace:
+                plan.create[symlink_path] = src
+        return plan
+
+    def add_link(self, symlink_path: str, src: str, exists: bool):
+        self.remove.discard(symlink_path)
+        if exists:
+            self.create.pop(symlink_path, None)
+            self.replace[symlink_path] = src
+        else:
+            self.create[symlink_path] = src
+
+    def add_removal(self, symlink_path: str):
+        self.create.pop(symlink_path, None)
+        self.replace.pop(symlink_path, None)
+        self.remove.add(symlink_path)
+
+    def discard(self, symlink_paths):
+        """Drop every operation on the given symlinks."""
+        for symlink_path in symlink_paths:
+            self.create.pop(symlink_path, None)
+            self.replace.pop(symlink_path, None)
+            self.remove.discard(symlink_path)
+
+    def paths(self) -> List[str]:
+        return [*self.create, *self.replace, *self.remove]
+
+    def __len__(self):
+        return len(self.create) + len(self.replace) + len(self.remove)
+
+    def directories(self) -> Dict[str, List[str]]:
+        by_dir: Dict[str, List[str]] = {}
+        for symlink_path in self.create:
+            by_dir.setdefault(os.path.dirname(symlink_path), []).append(symlink_path)
+        return by_dir
+
+    def estimated_syscalls(self) -> int:
+        """One mkdir per new parent, one symlink per create, symlink and rename per replace, one unlink per remove."""
+        return len(self.directories()) + len(self.create) + 2 * len(self.replace) + len(self.remove)
+
+    def describe(self, limit: int = 20) -> str:
+        lines = [
+            f"{len(self.create)} to create, {len(self.replace)} to replace, {len(self.remove)} to remove "
+            f"in {len(self.directories())} directories (~{self.estimated_syscalls()} syscalls)"
+        ]
+        operations = (
+                [f"  + {path} -> {src}" for path, src in sorted(self.create.items())]
+                + [f"  ~ {path} -> {src}" for path, src in sorted(self.replace.items())]
+                + [f"  - {path}" for path in sorted(self.remove)]
+        )
+        lines.extend(operations[:limit])
+        if len(operations) > limit:
+            lines.append(f"  ... and {len(operations) - limit} more")
+        return "\n".join(lines)
+
+    def apply(self, prune_below: Optional[str] = None):
+        """Make the planned changes, and with ``prune_below`` remove folders that removals left empty under it."""
+        for symlink_path in self.remove:
+            try:
+                os.remove(symlink_path)
+                logger.debug("Removed invalid symlink: {}", symlink_path)
+            except FileNotFoundError:
+                pass
+            if prune_below:
+                remove_empty_parents(symlink_path, prune_below)
+        for symlink_path, src in self.replace.items():
+            atomic_symlink(os.path.abspath(src), symlink_path)
+            logger.debug("Replaced symlink {} for file {}", symlink_path, src)
+        for directory, symlink_paths in self.directories().items():
+            os.makedirs(directory, exist_ok=True)
+            for symlink_path in symlink_paths:
+                src = os.path.abspath(self.create[symlink_path])
+                link(src, symlink_path)
+                logger.debug("Created symlink {} for file {}", symlink_path, src)
@@ -0,0 +1,213 @@
+"""Startup reconciliation of the symlink tree against the rclone tree"""
+
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+from utils.index import FileIndex, IndexEntry, stat_entry
+from utils.matcher import PathMatcher
+from utils.metrics import RECONCILE_SECONDS, SYMLINKS_CREATED, SYMLINKS_REMOVED
+from utils.planner import TEMP_SUFFIX, ChangePlan
+from utils.router import PathRouter
+from utils.statcache import StatCache
+
+
+@dataclass
+class ReconcileResult:
+    lib: str
+    sources: int = 0
+    links: int = 0
+    to_create: Dict[str, str] = field(default_factory=dict)
+    to_remove: List[str] = field(default_factory=list)
+    walk_seconds: float = 0.0
+    apply_seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.to_create or self.to_remove)
+
+
+@dataclass
+class ReconcileProgress:
+    libraries_total: int = 0
+    libraries_done: int = 0
+    dirs_done: int = 0
+    files_done: int = 0
+    dirs_expected: int = 0
+    files_expected: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate from the directory counts of the previous run, None until there is something to go on."""
+        if self.finished is not None:
+            return 0.0
+        if not self.dirs_done or not self.dirs_expected:
+            return None
+        remaining = max(self.dirs_expected - self.dirs_done, 0)
+        return (time.monotonic() - self.started) / self.dirs_done * remaining
+
+    def as_dict(self) -> dict:
+        eta = self.eta_seconds()
+        return {
+            "libraries_done": self.libraries_done,
+            "libraries_total": self.libraries_total,
+            "dirs_done": self.dirs_done,
+            "dirs_expected": self.dirs_expected,
+            "files_done": self.files_done,
+            "files_expected": self.files_expected,
+            "elapsed_seconds": round((self.finished or time.monotonic()) - self.started, 1),
+            "eta_seconds": None if eta is None else round(eta, 1),
+        }
+
+
+class Reconciler:
+    """Set based diff between ``rclone_path/<lib>`` and ``symlink_path/<lib>``.
+
+    Both trees of a library are walked at the same time on a thread pool, one
+    task per directory, so slow directory listings on the mount overlap instead
+    of queueing behind each other. The create and remove sets are computed in
+    memory and turned into a ``ChangePlan``, which is applied in bulk or, with
+    ``dry_run``, only logged.
+
+    Reconciliation may run while the watcher is already live. Symlinks in
+    ``live_paths`` were handled by a live event after the walk started, so
+    their planned operations are stale and dropped before the plan is applied.
+    """
+
+    def __init__(self, settings, index: FileIndex, stat_cache: Optional[StatCache] = None,
+                 live_paths: Optional[Set[str]] = None, router: Optional[PathRouter] = None,
+                 matcher: Optional[PathMatcher] = None):
+        self.settings = settings
+        self.router = router if router is not None else PathRouter(settings)
+        self.matcher = matcher if matcher is not None else PathMatcher.from_settings(settings)
+        self.index = index
+        self.stat_cache = stat_cache if stat_cache is not None else StatCache()
+        self.live_paths = live_paths if live_paths is not None else set()
+        self.progress = ReconcileProgress()
+
+    def walk(self, *roots: str) -> Dict[str, Dict[str, IndexEntry]]:
+        """Walk several trees concurrently, returning the files found below each root."""
+        found = {root: {} for root in roots}
+        done = queue.SimpleQueue()
+        outstanding = 0
+
+        with ThreadPoolExecutor(max_workers=self.settings.reconcile_workers,
+                                thread_name_prefix="reconcile") as pool:
+            def submit(path, root):
+                nonlocal outstanding
+                outstanding += 1
+                pool.submit(self.index.visit, path).add_done_callback(lambda future: done.put((root, future)))
+
+            for root in roots:
+                if os.path.isdir(root):
+                    submit(root, root)
+
+            while outstanding:
+                root, future = done.get()
+                outstanding -= 1
+                listing = future.result()
+                if listing is None:
+                    continue
+                files, subdirs = listing
+                self.progress.dirs_done += 1
+                self.progress.files_done += len(files)
+                found[root].update((entry.path, entry) for entry in files)
+                for subdir in subdirs:
+                    if not self.matcher.prune(subdir):
+                        submit(subdir, root)
+        return found
+
+    def diff(self, lib: str) -> ReconcileResult:
+        """Compute which symlinks of a library are missing and which are broken."""
+        result = ReconcileResult(lib)
+        started = time.monotonic()
+        symlink_dir = os.path.join(self.settings.symlink_path, lib)
+        rclone_dir = os.path.join(self.settings.rclone_path, lib)
+
+        found = self.walk(rclone_dir, symlink_dir)
+        sources, links = found[rclone_dir], found[symlink_dir]
+        result.sources, result.links = len(sources), len(links)
+
+        valid = set()
+        for path, entry in links.items():
+            if path.endswith(TEMP_SUFFIX):
+                # Left behind by an interrupted atomic swap
+                result.to_remove.append(path)
+            elif entry.target is None:
+                valid.add(path)
+            elif self.router.library_for(entry.target) == lib:
+                # Links left where another symlink layout put them are replaced too
+                if entry.target in sources and self.router.symlink_for(entry.target)[1] == path:
+                    valid.add(path)
+                else:
+                    result.to_remove.append(path)
+            elif self.stat_cache.exists(entry.target):
+                valid.add(path)
+            else:
+                result.to_remove.append(path)
+
+        for src_path in sources:
+            if not self.matcher.matches(src_path):
+                continue
+            _, symlink_path = self.router.symlink_for(src_path)
+            if symlink_path and symlink_path not in valid:
+                result.to_create.setdefault(symlink_path, src_path)
+
+        result.walk_seconds = time.monotonic() - started
+        return result
+
+    def apply(self, result: ReconcileResult, plan: ChangePlan):
+        started = time.monotonic()
+        stale = [symlink_path for symlink_path in plan.paths() if symlink_path in self.live_paths]
+        if stale:
+            logger.debug(f"Skipping {len(stale)} symlinks in '{result.lib}' already handled by live events")
+            plan.discard(stale)
+        plan.apply(prune_below=os.path.join(self.settings.symlink_path, result.lib))
+        self.stat_cache.invalidate(*plan.remove, *plan.create, *plan.replace)
+        for symlink_path in plan.remove:
+            self.index.remove(symlink_path)
+        for symlink_path in list(plan.create) + list(plan.replace):
+            entry = stat_entry(symlink_path)
+            if entry:
+                self.index.upsert(entry)
+        result.apply_seconds = time.monotonic() - started
+
+    def reconcile(self, lib: str) -> ReconcileResult:
+        result = self.diff(lib)
+        plan = ChangePlan.from_reconcile(result)
+        if self.settings.dry_run:
+            logger.info(f"Dry run plan for '{lib}': {plan.describe()}")
+            result.to_create, result.to_remove = {}, []
+            return result
+        self.apply(result, plan)
+        RECONCILE_SECONDS.observe(result.walk_seconds + result.apply_seconds, library=lib)
+        SYMLINKS_CREATED.inc(len(plan.create) + len(plan.replace), library=lib)
+        SYMLINKS_REMOVED.inc(len(plan.remove), library=lib)
+        logger.info(
+            f"Reconciled '{lib}': {result.sources} files, {result.links} links, "
+            f"{len(plan.create)} created, {len(plan.replace)} replaced, {len(plan.remove)} removed "
+            f"(walk {result.walk_seconds:.2f}s, apply {result.apply_seconds:.2f}s)"
+        )
+        return result
+
+    def run(self, libraries: Optional[List[str]] = None) -> List[ReconcileResult]:
+        """Reconcile every library, or only the given ones."""
+        libraries = list(self.settings.library_paths) if libraries is None else libraries
+        self.progress = ReconcileProgress(libraries_total=len(libraries))
+        for lib in libraries:
+            for root in (self.settings.rclone_path, self.settings.symlink_path):
+                dirs, files = self.index.count(os.path.join(root, lib))
+                self.progress.dirs_expected += dirs
+                self.progress.files_expected += files
+
+        results = []
+        for lib in libraries:
+            results.append(self.reconcile(lib))
+            self.progress.libraries_done += 1
+        self.progress.finished = time.monotonic()
+        return results
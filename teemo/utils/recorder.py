@@ -0,0 +1,107 @@
+"""Recording of the raw watcher event stream for later replay"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+RECORDED_EVENTS = ("created", "deleted", "moved")
+
+
+class RecordedEvent(NamedTuple):
+    time: float
+    event_type: str
+    src: str
+    dest: str
+    is_directory: bool
+
+
+class EventRecorder:
+    """Appends every event the watcher's ``Handler`` receives to a trace file.
+
+    Each session starts with a header line holding the watched root and
+    libraries; every event after it is one compact JSON line
+    ``[seconds since the header, event type, src, dest, is directory]``.
+    Paths below the root are stored relative to it, so a trace can be
+    replayed against another tree. A ``.gz`` suffix compresses the trace.
+    Lines are buffered and written at most every ``flush_interval`` seconds.
+    """
+
+    def __init__(self, path, root: str, library_paths: List[str], flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.root = os.path.join(root, "")
+        self.flush_interval = flush_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        opener = gzip.open if self.path.suffix == ".gz" else open
+        self.file = opener(self.path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+        self.started = time.monotonic()
+        self.flushed = self.started
+        self._write({"root": root, "library_paths": list(library_paths), "started": time.time()})
+        logger.info(f"Recording watcher events to {self.path}")
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _relative(self, path: str) -> str:
+        return path[len(self.root):] if path.startswith(self.root) else path
+
+    def record(self, event_type: str, src: str, dest: str = "", is_directory: bool = False):
+        now = time.monotonic()
+        with self.lock:
+            if self.file.closed:
+                return
+            self._write([round(now - self.started, 4), event_type, self._relative(src),
+                         self._relative(dest) if dest else "", int(is_directory)])
+            self.count += 1
+            if now - self.flushed >= self.flush_interval:
+                self.file.flush()
+                self.flushed = now
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+        logger.info(f"Recorded {self.count} watcher events to {self.path}")
+
+
+def read_trace(path) -> Tuple[Optional[dict], List[RecordedEvent]]:
+    """Read a trace, returning the first header and every event with times relative to its start.
+
+    Sessions appended to the same file follow on in wall clock time. A line
+    torn by a crash, or a truncated gzip stream, ends the trace.
+    """
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    first, origin, events = None, 0.0, []
+    with opener(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if isinstance(record, dict):
+                    if first is None:
+                        first = record
+                    origin = record["started"] - first["started"]
+                    root = record["root"]
+                    continue
+                if first is None:
+                    continue
+                offset, event_type, src, dest, is_directory = record
+                events.append(RecordedEvent(origin + offset, event_type, _absolute(root, src),
+                                            _absolute(root, dest) if dest else "", bool(is_directory)))
+        except (EOFError, OSError):
+            pass
+    return first, events
+
+
+def _absolute(root: str, path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(root, path)
@@ -0,0 +1,120 @@
+"""Routing of paths to the library they belong to"""
+
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from loguru import logger
+from settings.manager import settings_manager
+
+RCLONE = "rclone"
+SYMLINK = "symlink"
+
+# Symlink layouts: every file straight below its library, or below the source folders it is in
+FLAT = "flat"
+MIRROR = "mirror"
+
+
+class Route(NamedTuple):
+    kind: str
+    root: str
+    lib: Optional[str]
+    relative: str
+
+
+class _Node:
+    __slots__ = ("children", "kind", "root", "lib")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.kind: Optional[str] = None
+        self.root: Optional[str] = None
+        self.lib: Optional[str] = None
+
+
+def _components(path: str):
+    return [part for part in path.split(os.sep) if part and part != "."]
+
+
+class PathRouter:
+    """Path component trie over ``rclone_path``, ``symlink_path`` and their libraries.
+
+    Routing a path walks its components once, so it costs O(depth) whatever
+    the number of libraries, and only whole components match: ``movies2/x``
+    is not part of ``movies``. A rebuild swaps in a new trie, so lookups from
+    other threads never see a half built one.
+
+    The symlink layout is fixed when the router is created, as links already
+    on disk only move with ``utils.layout.migrate``.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.trie = self._build(settings)
+        self.layout = settings.symlink_layout
+        self.layout_depth = settings.symlink_layout_depth
+        if self.layout not in (FLAT, MIRROR):
+            logger.warning(f"Unknown symlink layout '{self.layout}', using '{FLAT}'")
+            self.layout = FLAT
+
+    @staticmethod
+    def _build(settings) -> _Node:
+        trie = _Node()
+        for kind, root in ((RCLONE, settings.rclone_path), (SYMLINK, settings.symlink_path)):
+            if not root:
+                continue
+            node = trie
+            for part in _components(root):
+                node = node.children.setdefault(part, _Node())
+            node.kind, node.root = kind, root.rstrip(os.sep) or os.sep
+            for lib in settings.library_paths:
+                lib_node = node
+                for part in _components(lib):
+                    lib_node = lib_node.children.setdefault(part, _Node())
+                lib_node.kind, lib_node.root, lib_node.lib = kind, node.root, lib
+        return trie
+
+    def rebuild(self, settings=None):
+        if settings is not None:
+            self.settings = settings
+        self.trie = self._build(self.settings)
+
+    def route(self, path: str) -> Optional[Route]:
+        """Return the most specific root or library containing ``path``, or None."""
+        parts = _components(path)
+        node, match, depth = self.trie, None, 0
+        for number, part in enumerate(parts, 1):
+            node = node.children.get(part)
+            if node is None:
+                break
+            if node.kind is not None:
+                match, depth = node, number
+        if match is None:
+            return None
+        return Route(match.kind, match.root, match.lib, os.sep.join(parts[depth:]))
+
+    def library_for(self, path: str, kind: str = RCLONE) -> Optional[str]:
+        route = self.route(path)
+        return route.lib if route and route.kind == kind else None
+
+    def symlink_for(self, src: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return the library a source path belongs to and the symlink it maps to."""
+        route = self.route(src)
+        if route is None or route.kind != RCLONE or route.lib is None or not route.relative:
+            return None, None
+        return route.lib, os.path.join(self.settings.symlink_path, route.lib, self.symlink_relative(route.relative))
+
+    def symlink_relative(self, relative: str) -> str:
+        """Where a file at ``relative`` below its library is linked, relative to the library's symlink folder."""
+        folders, name = os.path.split(relative)
+        if self.layout == FLAT or not folders:
+            return name
+        if self.layout_depth > 0:
+            folders = os.sep.join(_components(folders)[:self.layout_depth])
+        return os.path.join(folders, name)
+
+
+path_router = PathRouter(settings_manager.settings.file_monitor)
+settings_manager.register_observer(
+    lambda changed: path_router.rebuild(settings_manager.settings.file_monitor),
+    keys=("file_monitor.library_paths", "file_monitor.rclone_path", "file_monitor.symlink_path"),
+)
@@ -0,0 +1,152 @@
+"""One asyncio event loop that owns the timers of the watcher runtime"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+
+from loguru import logger
+
+Interval = Union[float, Callable[[], float]]
+
+
+class Scheduler:
+    """Runs timers, debouncing and periodic jobs on a single asyncio loop in its own thread.
+
+    Callbacks run on the loop and must not block; anything that touches the
+    disk or the network is passed with ``offload=True`` and runs on a bounded
+    executor instead, so a slow Plex request never holds up a timer. Keyed
+    timers replace sleep loops: work is scheduled for the moment it is due
+    instead of being found by the next wake-up, which makes latency a
+    setting rather than a matter of where in the interval a change arrived.
+    Runs of the same key never overlap.
+
+    Every method can be called from any thread.
+    """
+
+    def __init__(self, workers: int = 4, name: str = "scheduler"):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-io")
+        self.loop.set_default_executor(self.executor)
+        self.thread: Optional[threading.Thread] = None
+        # Keyed timers, with the callback each would run
+        self.timers: Dict[str, Tuple[asyncio.TimerHandle, Callable, bool]] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.periodic: Set[asyncio.Task] = set()
+        self.stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _threadsafe(self, function: Callable, *args):
+        if self.stopping or self.loop.is_closed():
+            return
+        if self.running and threading.current_thread() is self.thread:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+    def schedule(self, key: str, delay: float, function: Callable[[], None], replace: bool = True,
+                 offload: bool = False):
+        """Run ``function`` in ``delay`` seconds, once, under ``key``.
+
+        A pending timer for the same key is moved to the new time, or with
+        ``replace=False`` kept as it is, so the first of a burst of calls sets
+        the time and the rest ride along.
+        """
+        self._threadsafe(self._schedule, key, delay, function, replace, offload)
+
+    def _schedule(self, key, delay, function, replace, offload):
+        pending = self.timers.get(key)
+        if pending is not None:
+            if not replace:
+                return
+            pending[0].cancel()
+        handle = self.loop.call_later(max(0.0, delay), self._fire, key)
+        self.timers[key] = (handle, function, offload)
+
+    def cancel(self, key: str):
+        self._threadsafe(self._cancel, key)
+
+    def _cancel(self, key):
+        pending = self.timers.pop(key, None)
+        if pending is not None:
+            pending[0].cancel()
+
+    def _fire(self, key):
+        _, function, offload = self.timers.pop(key)
+        self._spawn(self._call(key, function, offload))
+
+    def every(self, interval: Interval, function: Callable[[], None], key: Optional[str] = None,
+              offload: bool = False):
+        """Run ``function`` every ``interval`` seconds; a callable interval is read again each time."""
+        self._threadsafe(self._every_start, interval, function, key or repr(function), offload)
+
+    def _every_start(self, interval, function, key, offload):
+        self.periodic.add(self._spawn(self._every(interval, function, key, offload)))
+
+    async def _every(self, interval, function, key, offload):
+        while True:
+            await asyncio.sleep(interval() if callable(interval) else interval)
+            await self._call(key, function, offload)
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = self.loop.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _call(self, key, function, offload):
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            try:
+                if offload:
+                    await self.loop.run_in_executor(None, function)
+                else:
+                    function()
+            except Exception as e:
+                logger.error(f"Scheduled {key} failed: {e}")
+
+    def stop(self, timeout: float = 30, run_pending: bool = True):
+        """Stop the loop once running callbacks are done, running timers that are still pending first.
+
+        With ``run_pending=False`` pending timers are dropped instead.
+        """
+        if not self.running:
+            self.loop.close()
+            self.executor.shutdown(wait=True)
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(run_pending), self.loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.error(f"Scheduler {self.name} did not stop cleanly: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.executor.shutdown(wait=True)
+
+    async def _shutdown(self, run_pending):
+        self.stopping = True
+        pending = list(self.timers.items())
+        self.timers.clear()
+        for _, (handle, _, _) in pending:
+            handle.cancel()
+        for task in self.periodic:
+            task.cancel()
+        if run_pending:
+            for key, (_, function, offload) in pending:
+                self._spawn(self._call(key, function, offload))
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -0,0 +1,381 @@
+"""Compact directory snapshot and the polling observer built on it"""
+
+import os
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from watchdog.events import (
+    DirCreatedEvent,
+    DirDeletedEvent,
+    DirMovedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent,
+)
+from watchdog.observers.api import DEFAULT_EMITTER_TIMEOUT, DEFAULT_OBSERVER_TIMEOUT, BaseObserver, EventEmitter
+from loguru import logger
+from utils.metrics import POLL_SECONDS
+
+FileStat = Tuple[int, int, float]
+
+
+class DirNode:
+    """One directory of a snapshot.
+
+    File names are interned and kept in a list, with inode, size and mtime in
+    parallel typed arrays, so a file costs a few dozen bytes instead of a full
+    path string plus an ``os.stat_result``.
+    """
+
+    __slots__ = ("mtime", "ino", "dirs", "names", "inos", "sizes", "mtimes",
+                 "changed", "interval", "due", "subtree_due")
+
+    def __init__(self, mtime: float, ino: int = 0):
+        self.mtime = mtime
+        self.ino = ino
+        self.changed = 0.0
+        self.interval = 0.0
+        self.due = 0.0
+        self.subtree_due = 0.0
+        self.dirs: Dict[str, "DirNode"] = {}
+        self.names: List[str] = []
+        self.inos = array("Q")
+        self.sizes = array("q")
+        self.mtimes = array("d")
+
+    def set_files(self, files: Dict[str, FileStat]):
+        self.names = [sys.intern(name) for name in files]
+        self.inos = array("Q", (stat[0] for stat in files.values()))
+        self.sizes = array("q", (stat[1] for stat in files.values()))
+        self.mtimes = array("d", (stat[2] for stat in files.values()))
+
+    def files(self) -> Dict[str, FileStat]:
+        return {name: (ino, size, mtime)
+                for name, ino, size, mtime in zip(self.names, self.inos, self.sizes, self.mtimes)}
+
+    def __len__(self):
+        return len(self.names) + sum(len(child) for child in self.dirs.values())
+
+
+@dataclass
+class SnapshotDiff:
+    created: Dict[str, int] = field(default_factory=dict)
+    deleted: Dict[str, int] = field(default_factory=dict)
+    modified: List[str] = field(default_factory=list)
+    moved: List[Tuple[str, str]] = field(default_factory=list)
+    dirs_created: Dict[str, int] = field(default_factory=dict)
+    dirs_deleted: Dict[str, int] = field(default_factory=dict)
+    dirs_moved: List[Tuple[str, str]] = field(default_factory=list)
+
+    @staticmethod
+    def _pair(created: Dict[str, int], deleted: Dict[str, int], moved: List[Tuple[str, str]]):
+        by_inode = {ino: path for path, ino in deleted.items() if ino}
+        for dest, ino in list(created.items()):
+            src = by_inode.pop(ino, None) if ino else None
+            if src is not None:
+                moved.append((src, dest))
+                del created[dest]
+                del deleted[src]
+
+    def pair_moves(self):
+        """Turn a delete and a create of the same inode into a move."""
+        self._pair(self.created, self.deleted, self.moved)
+        self._pair(self.dirs_created, self.dirs_deleted, self.dirs_moved)
+
+    def __bool__(self):
+        return any((self.created, self.deleted, self.modified, self.moved,
+                    self.dirs_created, self.dirs_deleted, self.dirs_moved))
+
+
+@dataclass
+class PollTiers:
+    """Hot/cold poll schedule for the directories of a snapshot.
+
+    A directory that changed within ``hot_window_seconds`` (by our own
+    observation or by its mtime) is checked every ``hot_seconds``. Once it goes
+    quiet its interval doubles on every unchanged check, up to
+    ``cold_max_seconds``. Directories up to ``always_hot_depth`` below the root
+    never cool down, so new folders in a library are seen at the hot rate, and
+    every ``full_sweep_seconds`` all directories are listed regardless of mtime.
+    """
+
+    hot_seconds: float = 2
+    hot_window_seconds: float = 300
+    cold_max_seconds: float = 600
+    full_sweep_seconds: float = 3600
+    always_hot_depth: int = 1
+
+    @classmethod
+    def from_settings(cls, settings) -> "PollTiers":
+        return cls(
+            hot_seconds=settings.hot_poll_seconds,
+            hot_window_seconds=settings.hot_window_seconds,
+            cold_max_seconds=settings.cold_poll_max_seconds,
+            full_sweep_seconds=settings.full_sweep_seconds,
+            always_hot_depth=settings.always_hot_depth,
+        )
+
+    def schedule(self, node: DirNode, depth: int, now: float, changed: bool):
+        if changed:
+            node.changed = now
+        if depth <= self.always_hot_depth or now - max(node.changed, node.mtime) < self.hot_window_seconds:
+            node.interval = self.hot_seconds
+        else:
+            node.interval = min(max(node.interval, self.hot_seconds) * 2, self.cold_max_seconds)
+        node.due = now + node.interval
+
+
+def _scan(path: str) -> Tuple[Dict[str, FileStat], Dict[str, int]]:
+    files, subdirs = {}, {}
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs[entry.name] = entry.inode()
+                else:
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.name] = (entry.inode(), stat.st_size, stat.st_mtime)
+            except OSError:
+                continue
+    return files, subdirs
+
+
+class CompactSnapshot:
+    """Directory tree snapshot that is refreshed in place, one directory at a time.
+
+    Polling stats every known directory but only lists those whose mtime
+    changed, so steady state costs one ``stat`` per directory rather than one
+    per file. Creates, deletes and renames always touch the parent directory's
+    mtime; in-place content changes of a file are only noticed when its
+    directory is listed again for another reason. Sub directories for which
+    ``prune`` returns True are left out entirely, so they are never stat'ed.
+    """
+
+    def __init__(self, root: str, recursive: bool = True, tiers: Optional[PollTiers] = None,
+                 prune: Optional[Callable[[str], bool]] = None):
+        self.root = root
+        self.recursive = recursive
+        self.tiers = tiers
+        self.prune = prune
+        self.tree: Optional[DirNode] = None
+        self.next_sweep = 0.0
+        self.checked = 0
+        self.listed = 0
+
+    def __len__(self):
+        return len(self.tree) if self.tree else 0
+
+    def build(self, index=None):
+        """Take the initial snapshot, reusing the listings of a ``FileIndex`` where it has them."""
+        self.tree = self._load(self.root, 0, index, None)
+        if self.tiers:
+            self.next_sweep = time.time() + self.tiers.full_sweep_seconds
+
+    def _load(self, path: str, ino: int, index, diff: Optional[SnapshotDiff]) -> DirNode:
+        indexed_mtime = index.dir_mtime(path) if index is not None else None
+        if indexed_mtime is not None:
+            # An out of date mtime simply makes the first poll list this directory again
+            node = DirNode(indexed_mtime, ino)
+            entries, subdir_paths = index.listing(path)
+            files = {os.path.basename(entry.path): (entry.ino or 0, entry.size, entry.mtime) for entry in entries}
+            subdirs = {os.path.basename(subdir): 0 for subdir in subdir_paths}
+        else:
+            node = DirNode(os.stat(path).st_mtime, ino)
+            files, subdirs = _scan(path)
+        subdirs = self._unpruned(path, subdirs)
+        node.set_files(files)
+        if diff is not None:
+            diff.created.update((os.path.join(path, name), stat[0]) for name, stat in files.items())
+        if self.recursive:
+            for name, child_ino in subdirs.items():
+                child_path = os.path.join(path, name)
+                try:
+                    node.dirs[sys.intern(name)] = self._load(child_path, child_ino, index, diff)
+                except OSError:
+                    continue
+                if diff is not None:
+                    diff.dirs_created[child_path] = child_ino
+        return node
+
+    def _unpruned(self, path: str, subdirs: Dict[str, int]) -> Dict[str, int]:
+        if self.prune is None:
+            return subdirs
+        return {name: ino for name, ino in subdirs.items() if not self.prune(os.path.join(path, name))}
+
+    def _forget(self, path: str, node: DirNode, diff: SnapshotDiff):
+        diff.deleted.update((os.path.join(path, name), ino) for name, ino in zip(node.names, node.inos))
+        for name, child in node.dirs.items():
+            child_path = os.path.join(path, name)
+            diff.dirs_deleted[child_path] = child.ino
+            self._forget(child_path, child, diff)
+
+    def _refresh_children(self, path: str, node: DirNode, diff: SnapshotDiff, depth: int, now: float, sweep: bool):
+        for name, child in list(node.dirs.items()):
+            child_path = os.path.join(path, name)
+            try:
+                node.dirs[name] = self._refresh(child_path, child, diff, depth + 1, now, sweep)
+            except OSError:
+                diff.dirs_deleted[child_path] = child.ino
+                self._forget(child_path, child, diff)
+                del node.dirs[name]
+
+    def _refresh(self, path: str, node: DirNode, diff: SnapshotDiff,
+                 depth: int = 0, now: float = 0.0, sweep: bool = True) -> DirNode:
+        if not sweep and node.subtree_due > now:
+            return node
+        if not sweep and node.due > now:
+            self._refresh_children(path, node, diff, depth, now, sweep)
+            self._update_subtree_due(node)
+            return node
+
+        self.checked += 1
+        mtime = os.stat(path).st_mtime
+        if mtime == node.mtime and not (sweep and self.tiers):
+            if self.tiers:
+                self.tiers.schedule(node, depth, now, changed=False)
+            self._refresh_children(path, node, diff, depth, now, sweep)
+            self._update_subtree_due(node)
+            return node
+
+        self.listed += 1
+        files, subdirs = _scan(path)
+        subdirs = self._unpruned(path, subdirs)
+        old_files = node.files()
+        changed = mtime != node.mtime or old_files.keys() != files.keys()
+        for name in old_files.keys() - files.keys():
+            diff.deleted[os.path.join(path, name)] = old_files[name][0]
+        for name, stat in files.items():
+            old = old_files.get(name)
+            if old is None or (old[0] != stat[0] and old[0] and stat[0]):
+                diff.created[os.path.join(path, name)] = stat[0]
+            elif old[1:] != stat[1:]:
+                diff.modified.append(os.path.join(path, name))
+
+        fresh = DirNode(mtime, node.ino)
+        fresh.changed, fresh.interval = node.changed, node.interval
+        fresh.set_files(files)
+        if self.recursive:
+            changed = changed or node.dirs.keys() != subdirs.keys()
+            for name in node.dirs.keys() - subdirs.keys():
+                child_path = os.path.join(path, name)
+                diff.dirs_deleted[child_path] = node.dirs[name].ino
+                self._forget(child_path, node.dirs[name], diff)
+            for name, child_ino in subdirs.items():
+                child_path = os.path.join(path, name)
+                child = node.dirs.get(name)
+                try:
+                    if child is None:
+                        child = self._load(child_path, child_ino, None, diff)
+                        diff.dirs_created[child_path] = child_ino
+                        if self.tiers:
+                            self._schedule_new(child, depth + 1, now)
+                    else:
+                        child.ino = child.ino or child_ino
+                        child = self._refresh(child_path, child, diff, depth + 1, now, sweep)
+                except OSError:
+                    continue
+                fresh.dirs[sys.intern(name)] = child
+        if self.tiers:
+            self.tiers.schedule(fresh, depth, now, changed=changed)
+        self._update_subtree_due(fresh)
+        return fresh
+
+    def _schedule_new(self, node: DirNode, depth: int, now: float):
+        self.tiers.schedule(node, depth, now, changed=True)
+        for child in node.dirs.values():
+            self._schedule_new(child, depth + 1, now)
+        self._update_subtree_due(node)
+
+    @staticmethod
+    def _update_subtree_due(node: DirNode):
+        node.subtree_due = min([node.due] + [child.subtree_due for child in node.dirs.values()])
+
+    def poll(self, now: Optional[float] = None) -> SnapshotDiff:
+        """Bring the snapshot up to date and return what changed since the last poll.
+
+        With tiers only the directories that are due are checked, except on a
+        full sweep. Raises ``OSError`` when the root itself is gone.
+        """
+        diff = SnapshotDiff()
+        if self.tree is None:
+            self.build()
+            return diff
+        now = time.time() if now is None else now
+        sweep = self.tiers is None or now >= self.next_sweep
+        if self.tiers and sweep:
+            self.next_sweep = now + self.tiers.full_sweep_seconds
+        self.checked = self.listed = 0
+        self.tree = self._refresh(self.root, self.tree, diff, 0, now, sweep)
+        diff.pair_moves()
+        return diff
+
+    def paths(self) -> Iterator[str]:
+        stack = [(self.root, self.tree)] if self.tree else []
+        while stack:
+            path, node = stack.pop()
+            yield from (os.path.join(path, name) for name in node.names)
+            stack.extend((os.path.join(path, name), child) for name, child in node.dirs.items())
+
+
+class CompactPollingEmitter(EventEmitter):
+    """Polling emitter backed by a ``CompactSnapshot`` instead of watchdog's ``DirectorySnapshot``."""
+
+    def __init__(self, event_queue, watch, timeout=DEFAULT_EMITTER_TIMEOUT, event_filter=None,
+                 index=None, tiers=None, prune=None):
+        super().__init__(event_queue, watch, timeout, event_filter)
+        self.index = index
+        self.snapshot = CompactSnapshot(watch.path, watch.is_recursive, tiers, prune)
+        self._lock = threading.Lock()
+
+    def on_thread_start(self):
+        self.snapshot.build(self.index)
+        logger.debug(f"Snapshot of {self.watch.path} holds {len(self.snapshot)} files")
+
+    def queue_events(self, timeout):
+        # timeout behaves like an interval for polling emitters
+        if self.stopped_event.wait(timeout):
+            return
+
+        with self._lock:
+            if not self.should_keep_running():
+                return
+            try:
+                with POLL_SECONDS.time(root=self.watch.path):
+                    diff = self.snapshot.poll()
+            except OSError:
+                self.queue_event(DirDeletedEvent(self.watch.path))
+                self.stop()
+                return
+
+            for src_path in diff.deleted:
+                self.queue_event(FileDeletedEvent(src_path))
+            for src_path in diff.modified:
+                self.queue_event(FileModifiedEvent(src_path))
+            for src_path in diff.created:
+                self.queue_event(FileCreatedEvent(src_path))
+            for src_path, dest_path in diff.moved:
+                self.queue_event(FileMovedEvent(src_path, dest_path))
+
+            for src_path in diff.dirs_deleted:
+                self.queue_event(DirDeletedEvent(src_path))
+            for src_path in diff.dirs_created:
+                self.queue_event(DirCreatedEvent(src_path))
+            for src_path, dest_path in diff.dirs_moved:
+                self.queue_event(DirMovedEvent(src_path, dest_path))
+
+
+class CompactPollingObserver(BaseObserver):
+    """Polling observer that keeps a compact snapshot, optionally seeded from a ``FileIndex``.
+
+    With ``tiers`` the observer should tick at ``tiers.hot_seconds``; each tick
+    only checks the directories that are due.
+    """
+
+    def __init__(self, index=None, tiers=None, prune=None, timeout=DEFAULT_OBSERVER_TIMEOUT):
+        super().__init__(partial(CompactPollingEmitter, index=index, tiers=tiers, prune=prune), timeout=timeout)
@@ -0,0 +1,88 @@
+"""TTL/LRU cache for stat and existence checks"""
+
+import os
+import stat as stat_module
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class StatCache:
+    """Caches ``stat``/``lstat`` results, including "does not exist".
+
+    Positive results live for ``ttl`` seconds and negative ones for
+    ``negative_ttl``; past ``maxsize`` entries the least recently used are
+    evicted. Watcher events and our own writes invalidate the paths they touch.
+    """
+
+    def __init__(self, ttl: float = 60, negative_ttl: float = 10, maxsize: int = 100000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Tuple[str, bool], Tuple[float, Optional[os.stat_result]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, path: str, follow: bool) -> Optional[os.stat_result]:
+        key = (path, follow)
+        now = time.monotonic()
+        with self._lock:
+            cached = self.entries.get(key)
+            if cached is not None and cached[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        try:
+            result = os.stat(path) if follow else os.lstat(path)
+        except OSError:
+            result = None
+        expires = now + (self.ttl if result is not None else self.negative_ttl)
+        with self._lock:
+            self.entries[key] = (expires, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        return self._lookup(path, True)
+
+    def lstat(self, path: str) -> Optional[os.stat_result]:
+        return self._lookup(path, False)
+
+    def exists(self, path: str) -> bool:
+        return self.stat(path) is not None
+
+    def lexists(self, path: str) -> bool:
+        return self.lstat(path) is not None
+
+    def islink(self, path: str) -> bool:
+        result = self.lstat(path)
+        return result is not None and stat_module.S_ISLNK(result.st_mode)
+
+    def isdir(self, path: str) -> bool:
+        result = self.stat(path)
+        return result is not None and stat_module.S_ISDIR(result.st_mode)
+
+    def invalidate(self, *paths: str):
+        with self._lock:
+            for path in paths:
+                if path:
+                    self.entries.pop((path, True), None)
+                    self.entries.pop((path, False), None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
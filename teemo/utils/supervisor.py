@@ -0,0 +1,202 @@
+"""Supervisor that shards libraries over worker processes"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from loguru import logger
+from settings.models import FileMonitorSettings
+from utils import data_dir_path
+from utils.filewatcher import FileWatcher
+from utils.metrics import Collected, MetricsRegistry, registry
+
+
+class ShardMetrics(NamedTuple):
+    """The samples of one shard, sent to the supervisor over the refresh queue."""
+    number: int
+    metrics: Collected
+
+
+class RefreshChannel:
+    """Stands in for ``PlexUpdater`` inside a shard and forwards refreshes to the supervisor."""
+
+    initialized = True
+
+    def __init__(self, refresh_queue):
+        self.refresh_queue = refresh_queue
+
+    def schedule_refresh(self, library_title: str, path: Optional[str] = None, trace=None):
+        self.refresh_queue.put((library_title, path, trace))
+
+    def stop(self):
+        pass
+
+
+def shard_libraries(library_paths: List[str], shards: int) -> List[List[str]]:
+    """Deal the libraries out over at most ``shards`` groups."""
+    groups = [[] for _ in range(max(1, min(shards, len(library_paths))))]
+    for number, lib in enumerate(library_paths):
+        groups[number % len(groups)].append(lib)
+    return groups
+
+
+def run_shard(number: int, settings: dict, state_dir: str, refresh_queue, stop_event):
+    """Entry point of a shard process: one ``FileWatcher`` over a subset of the libraries.
+
+    With metrics enabled, the shard sends its samples to the supervisor every
+    ``status_interval_seconds`` and once more when it stops, and the
+    supervisor serves them on its own metrics port.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    file_monitor_settings = FileMonitorSettings(**settings)
+    interval = file_monitor_settings.status_interval_seconds if file_monitor_settings.metrics_enabled else 1
+    watcher = FileWatcher(file_monitor_settings, RefreshChannel(refresh_queue), Path(state_dir))
+    observer = watcher.start_monitoring()
+    try:
+        while not stop_event.wait(interval):
+            if file_monitor_settings.metrics_enabled:
+                refresh_queue.put(ShardMetrics(number, registry.collect()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.shutdown(observer)
+        if file_monitor_settings.metrics_enabled:
+            refresh_queue.put(ShardMetrics(number, registry.collect()))
+
+
+class ShardSupervisor:
+    """Runs each group of libraries in its own process and keeps those processes running.
+
+    Every shard has its own observer, reconciler, index and journal under
+    ``shard-<n>`` in the data directory, so a huge library no longer holds up
+    the others and snapshot diffing is not capped by a single GIL. Plex
+    refreshes from all shards come back over one queue to the supervisor's
+    ``PlexUpdater``, which debounces them as a whole. Their metrics come the
+    same way and are served by the supervisor with a ``shard`` label. A shard
+    that dies is restarted, with a growing delay if it keeps dying.
+    """
+
+    def __init__(self, settings, plex, shards: int, state_dir: Optional[Path] = None,
+                 restart_delay_seconds: float = 5, metrics: MetricsRegistry = registry):
+        self.settings = settings
+        self.plex = plex
+        self.metrics = metrics
+        self.state_dir = state_dir or data_dir_path
+        self.restart_delay_seconds = restart_delay_seconds
+        self.context = multiprocessing.get_context("spawn")
+        self.refresh_queue = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.groups = shard_libraries(settings.library_paths, shards)
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.started: Dict[int, float] = {}
+        self.restarts: Dict[int, int] = {number: 0 for number in range(len(self.groups))}
+        self.restart_at: Dict[int, float] = {}
+        self.refresh_thread: Optional[threading.Thread] = None
+
+    def shard_dir(self, number: int) -> Path:
+        return self.state_dir / f"shard-{number}"
+
+    def _spawn(self, number: int):
+        settings = self.settings.model_dump()
+        settings["library_paths"] = self.groups[number]
+        process = self.context.Process(
+            target=run_shard,
+            args=(number, settings, str(self.shard_dir(number)), self.refresh_queue, self.stop_event),
+            name=f"teemo-shard-{number}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[number] = process
+        self.started[number] = time.monotonic()
+        logger.info(f"Started shard {number} (pid {process.pid}) for {', '.join(self.groups[number])}")
+
+    def start(self):
+        self.refresh_thread = threading.Thread(target=self._forward_refreshes, name="shard-refresh", daemon=True)
+        self.refresh_thread.start()
+        for number in range(len(self.groups)):
+            self._spawn(number)
+
+    def _forward_refreshes(self):
+        while True:
+            item = self.refresh_queue.get()
+            if item is None:
+                return
+            if isinstance(item, ShardMetrics):
+                self.metrics.update_remote("shard", str(item.number), item.metrics)
+            elif self.plex.initialized:
+                library_title, path, trace = item
+                self.plex.schedule_refresh(library_title, path, trace=trace)
+
+    def check(self):
+        """Restart shards that died and write the combined status. Call this periodically."""
+        now = time.monotonic()
+        for number, process in list(self.processes.items()):
+            if process.is_alive() or self.stop_event.is_set():
+                continue
+            if number not in self.restart_at:
+                # A shard that ran for a while before dying starts over with the shortest delay
+                if now - self.started[number] > 60:
+                    self.restarts[number] = 0
+                delay = min(self.restart_delay_seconds * 2 ** self.restarts[number], 300)
+                logger.error(f"Shard {number} exited with code {process.exitcode}, restarting in {delay:.0f}s")
+                self.restart_at[number] = now + delay
+            elif now >= self.restart_at[number]:
+                del self.restart_at[number]
+                self.restarts[number] += 1
+                self._spawn(number)
+        self.write_status()
+
+    def _shard_status(self, number: int) -> dict:
+        try:
+            status = json.loads((self.shard_dir(number) / "status.json").read_text())
+        except (OSError, ValueError):
+            status = {"live": False, "ready": False}
+        process = self.processes.get(number)
+        status.update(
+            libraries=self.groups[number],
+            pid=process.pid if process else None,
+            alive=bool(process and process.is_alive()),
+            restarts=self.restarts[number],
+        )
+        return status
+
+    def status(self) -> dict:
+        shards = {str(number): self._shard_status(number) for number in range(len(self.groups))}
+        queue = {}
+        for shard in shards.values():
+            for key, value in shard.get("queue", {}).items():
+                queue[key] = max(queue.get(key, 0), value) if key == "oldest_age_seconds" else queue.get(key, 0) + value
+        return {
+            "live": all(shard["alive"] and shard["live"] for shard in shards.values()),
+            "ready": all(shard["ready"] for shard in shards.values()),
+            "queue": queue,
+            "shards": shards,
+            "updated": time.time(),
+        }
+
+    def write_status(self):
+        status_path = self.state_dir / "status.json"
+        temp_path = status_path.with_suffix(".json.tmp")
+        try:
+            status_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path.write_text(json.dumps(self.status()))
+            os.replace(temp_path, status_path)
+        except OSError as e:
+            logger.error(f"Could not write status file: {e}")
+
+    def stop(self, timeout: float = 30):
+        """Ask every shard to shut down cleanly, terminating those that do not."""
+        self.stop_event.set()
+        for number, process in self.processes.items():
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Shard {number} did not stop in time, terminating it")
+                process.terminate()
+                process.join()
+        self.refresh_queue.put(None)
+        if self.refresh_thread:
+            self.refresh_thread.join()
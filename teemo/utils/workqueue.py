@@ -0,0 +1,102 @@
+"""Bounded work queue drained by a pool of worker threads"""
+
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+_STOP = object()
+
+
+class KeyedWorkQueue:
+    """Bounded queue whose items are handled by ``workers`` threads.
+
+    Items are sharded over the workers by a hash of their key, so work for the
+    same key is always handled by the same worker in the order it was put,
+    while different keys are handled concurrently. Each shard holds at most
+    ``maxsize / workers`` items; ``put`` blocks when the shard is full, which
+    pushes back on the producer instead of letting a burst grow without bound.
+    """
+
+    def __init__(self, handler: Callable[[Any], None], workers: int = 4, maxsize: int = 10000,
+                 name: str = "worker"):
+        self.handler = handler
+        self.name = name
+        self.shards: List[queue.Queue] = [queue.Queue(max(1, maxsize // workers)) for _ in range(max(1, workers))]
+        self.threads: List[threading.Thread] = []
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for number, shard in enumerate(self.shards):
+            thread = threading.Thread(target=self._work, args=(shard,), name=f"{self.name}-{number}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _shard(self, key: str) -> queue.Queue:
+        return self.shards[zlib.crc32(key.encode("utf-8", "surrogateescape")) % len(self.shards)]
+
+    def put(self, key: str, item: Any, timeout: Optional[float] = None):
+        """Queue an item, blocking while the shard for its key is full."""
+        self._shard(key).put((time.monotonic(), item), timeout=timeout)
+
+    def _work(self, shard: queue.Queue):
+        while True:
+            queued_at, item = shard.get()
+            if item is _STOP:
+                shard.task_done()
+                return
+            with self._lock:
+                self.busy += 1
+            try:
+                self.handler(item)
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                logger.error(f"Error handling {item}: {e}")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                shard.task_done()
+
+    def join(self):
+        """Wait until everything queued so far has been handled."""
+        for shard in self.shards:
+            shard.join()
+
+    def stop(self):
+        """Let the workers finish what is queued, then end them."""
+        for shard in self.shards:
+            shard.put((time.monotonic(), _STOP))
+        for thread in self.threads:
+            thread.join()
+        self.threads.clear()
+
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self.shards)
+
+    def oldest_age(self) -> float:
+        """Seconds the oldest queued item has been waiting."""
+        now = time.monotonic()
+        oldest = now
+        for shard in self.shards:
+            with shard.mutex:
+                if shard.queue:
+                    oldest = min(oldest, shard.queue[0][0])
+        return now - oldest
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "depth": self.depth(),
+            "oldest_age_seconds": self.oldest_age(),
+            "busy": self.busy,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,64 @@
+from teemo.utils.coalescer import ChangeCoalescer
+
+
+def test_created_then_deleted_cancels_out():
+    coalescer = ChangeCoalescer()
+    coalescer.add("created", "/r/movies/a.mkv")
+    coalescer.add("delete", "/r/movies/a.mkv")
+    assert coalescer.drain() == []
+    assert coalescer.stats()["absorbed"] == 2
+
+
+def test_repeated_events_collapse():
+    coalescer = ChangeCoalescer()
+    coalescer.add("created", "/r/movies/a.mkv")
+    coalescer.add("modified", "/r/movies/a.mkv")
+    coalescer.add("created", "/r/movies/a.mkv")
+    assert coalescer.drain() == [("created", "/r/movies/a.mkv", "")]
+    assert coalescer.absorbed == 2
+
+
+def test_move_chain_collapses_to_final_destination():
+    coalescer = ChangeCoalescer()
+    coalescer.add("move", "/r/movies/a.mkv", "/r/movies/b.mkv")
+    coalescer.add("move", "/r/movies/b.mkv", "/r/movies/c.mkv")
+    assert coalescer.drain() == [("move", "/r/movies/a.mkv", "/r/movies/c.mkv")]
+
+
+def test_created_then_moved_is_a_create_at_destination():
+    coalescer = ChangeCoalescer()
+    coalescer.add("created", "/r/movies/a.partial.mkv")
+    coalescer.add("move", "/r/movies/a.partial.mkv", "/r/movies/a.mkv")
+    assert coalescer.drain() == [("created", "/r/movies/a.mkv", "")]
+
+
+def test_moved_then_deleted_deletes_origin():
+    coalescer = ChangeCoalescer()
+    coalescer.add("move", "/r/movies/a.mkv", "/r/movies/b.mkv")
+    coalescer.add("delete", "/r/movies/b.mkv")
+    assert coalescer.drain() == [("delete", "/r/movies/a.mkv", "")]
+
+
+def test_deleted_then_created_is_a_replacement():
+    coalescer = ChangeCoalescer()
+    coalescer.add("delete", "/r/movies/a.mkv")
+    coalescer.add("created", "/r/movies/a.mkv")
+    assert coalescer.drain() == [("created", "/r/movies/a.mkv", "")]
+
+
+def test_move_onto_existing_file_removes_replaced_origin():
+    coalescer = ChangeCoalescer()
+    coalescer.add("move", "/r/movies/a.mkv", "/r/movies/b.mkv")
+    coalescer.add("move", "/r/movies/c.mkv", "/r/movies/b.mkv")
+    assert coalescer.drain() == [
+        ("delete", "/r/movies/a.mkv", ""),
+        ("move", "/r/movies/c.mkv", "/r/movies/b.mkv"),
+    ]
+
+
+def test_drain_starts_a_new_window():
+    coalescer = ChangeCoalescer()
+    coalescer.add("created", "/r/movies/a.mkv")
+    coalescer.drain()
+    assert coalescer.drain() == []
+    assert coalescer.stats() == {"received": 1, "emitted": 1, "pending": 0, "absorbed": 0}
@@ -1,4 +1,5 @@
 import pytest
+import time
 import os
 from pyfakefs.fake_filesystem_unittest import Patcher
 from unittest.mock import patch, MagicMock
@@ -23,11 +24,13 @@ class TestFileWatcher:
             yield MockPlexUpdater, mock_plex_updater_instance
 
     @pytest.fixture
-    def file_watcher(self, mock_plex_updater):
+    def file_watcher(self, mock_plex_updater, tmp_path):
         _, mock_plex_updater_instance = mock_plex_updater
-        file_watcher = FileWatcher()
+        # Index, journal and status go to tmp_path, never to the data directory of the checkout
+        file_watcher = FileWatcher(state_dir=tmp_path)
         file_watcher.plex_updater = mock_plex_updater_instance
-        return file_watcher
+        yield file_watcher
+        file_watcher.shutdown(MagicMock())
 
     def test_toucher_movies(self, file_watcher, mock_plex_updater):
         _, mock_plex_updater_instance = mock_plex_updater
@@ -54,9 +57,9 @@ class TestFileWatcher:
             assert patcher.fs.islink(symlink_path)
             assert patcher.fs.readlink(symlink_path) == src
 
-            # Verify that PlexUpdater's refresh_library method was called
-            mock_plex_updater_instance.refresh_library.assert_called_with(
-                file_watcher.file_monitor_settings.library_paths[0])
+            # Verify that the library was scheduled for a Plex refresh
+            mock_plex_updater_instance.schedule_refresh.assert_called_with(
+                file_watcher.file_monitor_settings.library_paths[0], symlink_path, trace=None)
 
     def test_toucher_shows(self, file_watcher, mock_plex_updater):
         _, mock_plex_updater_instance = mock_plex_updater
@@ -83,9 +86,9 @@ class TestFileWatcher:
             assert patcher.fs.islink(symlink_path)
             assert patcher.fs.readlink(symlink_path) == src
 
-            # Verify that PlexUpdater's refresh_library method was called
-            mock_plex_updater_instance.refresh_library.assert_called_with(
-                file_watcher.file_monitor_settings.library_paths[1])
+            # Verify that the library was scheduled for a Plex refresh
+            mock_plex_updater_instance.schedule_refresh.assert_called_with(
+                file_watcher.file_monitor_settings.library_paths[1], symlink_path, trace=None)
 
     def test_toucher_delete(self, file_watcher, mock_plex_updater):
         _, mock_plex_updater_instance = mock_plex_updater
@@ -117,6 +120,238 @@ class TestFileWatcher:
 
             assert not patcher.fs.exists(symlink_path)
 
-            # Verify that PlexUpdater's refresh_library method was called
-            mock_plex_updater_instance.refresh_library.assert_called_with(
-                file_watcher.file_monitor_settings.library_paths[0])
\ No newline at end of file
+            # Verify that the library was scheduled for a Plex refresh
+            mock_plex_updater_instance.schedule_refresh.assert_called_with(
+                file_watcher.file_monitor_settings.library_paths[0], symlink_path, trace=None)
+
+    def test_toucher_move(self, file_watcher, mock_plex_updater):
+        _, mock_plex_updater_instance = mock_plex_updater
+
+        with Patcher() as patcher:
+            rclone_path = file_watcher.file_monitor_settings.rclone_path
+            symlink_path = file_watcher.file_monitor_settings.symlink_path
+            lib = file_watcher.file_monitor_settings.library_paths[0]
+            patcher.fs.create_dir(symlink_path)
+
+            src = os.path.join(rclone_path, lib, "Movie", "movie.partial.mkv")
+            patcher.fs.create_file(src)
+            file_watcher.mushroom_tosser(src)
+            old_symlink = os.path.join(symlink_path, lib, "movie.partial.mkv")
+            assert patcher.fs.islink(old_symlink)
+
+            dest = os.path.join(rclone_path, lib, "Movie", "movie.mkv")
+            patcher.fs.rename(src, dest)
+            file_watcher.mushroom_tosser(src, dest, etype="move")
+
+            new_symlink = os.path.join(symlink_path, lib, "movie.mkv")
+            assert not patcher.fs.exists(old_symlink)
+            assert patcher.fs.islink(new_symlink)
+            assert patcher.fs.readlink(new_symlink) == dest
+            mock_plex_updater_instance.schedule_refresh.assert_called_with(lib, new_symlink, trace=None)
+
+    def test_toucher_is_idempotent(self, file_watcher, mock_plex_updater):
+        _, mock_plex_updater_instance = mock_plex_updater
+
+        with Patcher() as patcher:
+            lib = file_watcher.file_monitor_settings.library_paths[0]
+            src = os.path.join(file_watcher.file_monitor_settings.rclone_path, lib, "pushed.mkv")
+            patcher.fs.create_file(src)
+            patcher.fs.create_dir(file_watcher.file_monitor_settings.symlink_path)
+
+            file_watcher.mushroom_tosser(src)
+            file_watcher.mushroom_tosser(src, etype="created")
+
+            assert mock_plex_updater_instance.schedule_refresh.call_count == 1
+
+    def test_externally_deleted_symlink_is_repaired(self, file_watcher, mock_plex_updater):
+        with Patcher() as patcher:
+            lib = file_watcher.file_monitor_settings.library_paths[0]
+            src = os.path.join(file_watcher.file_monitor_settings.rclone_path, lib, "kept.mkv")
+            patcher.fs.create_file(src)
+            patcher.fs.create_dir(file_watcher.file_monitor_settings.symlink_path)
+            file_watcher.mushroom_tosser(src)
+            symlink_path = os.path.join(file_watcher.file_monitor_settings.symlink_path, lib, "kept.mkv")
+
+            os.remove(symlink_path)
+            with patch.object(file_watcher, "record_change") as record_change:
+                file_watcher.repair_symlink(symlink_path)
+                record_change.assert_called_once_with("created", src)
+
+                # Links we remove ourselves are dropped from the index and stay removed
+                file_watcher.index.remove(symlink_path)
+                file_watcher.repair_symlink(symlink_path)
+                assert record_change.call_count == 1
+
+    def test_externally_deleted_symlink_to_an_ignored_file_stays_deleted(self, file_watcher, mock_plex_updater):
+        with Patcher() as patcher:
+            lib = file_watcher.file_monitor_settings.library_paths[0]
+            src = os.path.join(file_watcher.file_monitor_settings.rclone_path, lib, "Extras", "x.mkv")
+            patcher.fs.create_file(src)
+            patcher.fs.create_dir(file_watcher.file_monitor_settings.symlink_path)
+            file_watcher.mushroom_tosser(src)
+            symlink_path = os.path.join(file_watcher.file_monitor_settings.symlink_path, lib, "x.mkv")
+
+            file_watcher.file_monitor_settings = file_watcher.file_monitor_settings.model_copy(
+                update={"ignored_dirs": ["Extras"]})
+            file_watcher.settings_changed({"file_monitor.ignored_dirs"})
+            os.remove(symlink_path)
+            with patch.object(file_watcher, "record_change") as record_change:
+                file_watcher.repair_symlink(symlink_path)
+                record_change.assert_not_called()
+
+
+def test_settings_changes_apply_without_a_full_sweep(tmp_path):
+    from teemo.settings.models import FileMonitorSettings
+
+    settings = FileMonitorSettings(
+        library_paths=["movies"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        persistent_index=False,
+        journal_enabled=False,
+    )
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), tmp_path)
+    matcher = file_watcher.matcher
+    with patch.object(file_watcher, "check_symlinks") as check_symlinks:
+        file_watcher.file_monitor_settings = settings.model_copy(update={
+            "library_paths": ["movies", "anime"], "ignored_dirs": ["Extras"], "hot_poll_seconds": 7,
+        })
+        file_watcher.settings_changed({"file_monitor.library_paths", "file_monitor.ignored_dirs",
+                                       "file_monitor.hot_poll_seconds"})
+        for _ in range(50):
+            if check_symlinks.called:
+                break
+            time.sleep(0.01)
+
+    check_symlinks.assert_called_once()
+    assert check_symlinks.call_args.args[0] == ["anime"]
+    assert file_watcher.matcher is not matcher
+    assert file_watcher.reconciler.matcher is file_watcher.matcher
+    assert file_watcher.prune(str(tmp_path / "rclone" / "movies" / "Extras"))
+    assert file_watcher.tiers.hot_seconds == 7
+    file_watcher.queue.stop()
+
+
+def make_settings(tmp_path, **overrides):
+    from teemo.settings.models import FileMonitorSettings
+
+    return FileMonitorSettings(**{
+        "library_paths": ["movies"],
+        "rclone_path": str(tmp_path / "rclone"),
+        "symlink_path": str(tmp_path / "links"),
+        "change_batch_ms": 60000,
+        **overrides,
+    })
+
+
+def make_source(settings, name):
+    src = os.path.join(settings.rclone_path, "movies", name)
+    os.makedirs(os.path.dirname(src), exist_ok=True)
+    open(src, "w").close()
+    return src
+
+
+def test_processed_changes_are_checkpointed_in_the_journal(tmp_path):
+    settings = make_settings(tmp_path, persistent_index=False)
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), tmp_path / "state")
+    src = make_source(settings, "a.mkv")
+
+    file_watcher.record_change("created", src)
+    file_watcher.process_changes()
+
+    assert os.readlink(os.path.join(settings.symlink_path, "movies", "a.mkv")) == src
+    assert file_watcher.journal.seq == 1
+    assert file_watcher.journal.checkpointed == 1
+    file_watcher.shutdown(MagicMock())
+
+
+def test_coalesced_events_are_counted_once(tmp_path):
+    from teemo.utils import filewatcher
+
+    settings = make_settings(tmp_path, persistent_index=False, journal_enabled=False)
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), tmp_path / "state")
+    src = make_source(settings, "a.mkv")
+    before = filewatcher.EVENTS_COALESCED.value()
+
+    for _ in range(2):
+        file_watcher.record_change("created", src)
+        file_watcher.record_change("created", src)
+        file_watcher.process_changes()
+
+    assert filewatcher.EVENTS_COALESCED.value() - before == 2
+    file_watcher.shutdown(MagicMock())
+
+
+def test_startup_sweep_is_only_skipped_after_a_crash(tmp_path):
+    settings = make_settings(tmp_path)
+    state_dir = tmp_path / "state"
+    make_source(settings, "a.mkv")
+
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), state_dir)
+    file_watcher.start_reconciliation().join()
+    file_watcher.shutdown(MagicMock())
+
+    # A clean shutdown leaves nothing to recover, so the sweep runs again
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), state_dir)
+    assert not file_watcher.journal.recovered
+    with patch.object(file_watcher, "check_symlinks") as check_symlinks:
+        file_watcher.start_reconciliation().join()
+    check_symlinks.assert_called_once_with()
+    # A crash with unapplied changes after a finished sweep skips it
+    file_watcher.journal.append("created", make_source(settings, "b.mkv"))
+    file_watcher.journal.commit()
+    file_watcher.scheduler.stop(run_pending=False)
+    file_watcher.queue.stop()
+    file_watcher.index.close()
+
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), state_dir)
+    assert file_watcher.journal.recovered
+    assert file_watcher.start_reconciliation() is None
+    file_watcher.shutdown(MagicMock())
+
+
+def test_added_library_is_linked(tmp_path):
+    settings = make_settings(tmp_path, persistent_index=False, journal_enabled=False)
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), tmp_path / "state")
+    src = os.path.join(settings.rclone_path, "anime", "A", "a.mkv")
+    os.makedirs(os.path.dirname(src))
+    open(src, "w").close()
+
+    file_watcher.file_monitor_settings = settings.model_copy(update={"library_paths": ["movies", "anime"]})
+    file_watcher.settings_changed({"file_monitor.library_paths"})
+
+    symlink_path = os.path.join(settings.symlink_path, "anime", "a.mkv")
+    for _ in range(200):
+        if os.path.islink(symlink_path):
+            break
+        time.sleep(0.01)
+    assert os.readlink(symlink_path) == src
+    assert not file_watcher.sweeps
+    file_watcher.shutdown(MagicMock())
+
+
+def test_live_changes_win_over_the_sweep_of_an_added_library(tmp_path):
+    from teemo.utils import filewatcher
+
+    settings = make_settings(tmp_path, library_paths=["movies", "anime"], persistent_index=False,
+                             journal_enabled=False)
+    file_watcher = FileWatcher(settings, MagicMock(initialized=True), tmp_path / "state")
+    src = os.path.join(settings.rclone_path, "anime", "a.mkv")
+    os.makedirs(os.path.dirname(src))
+    open(src, "w").close()
+    file_watcher.ready.set()
+    diff = filewatcher.Reconciler.diff
+
+    def diff_then_delete(reconciler, lib):
+        result = diff(reconciler, lib)
+        # Deleted and handled live after the sweep walked the library
+        os.remove(src)
+        file_watcher.mushroom_tosser(src, etype="delete")
+        return result
+
+    with patch.object(filewatcher.Reconciler, "diff", diff_then_delete):
+        file_watcher.reconcile_added(["anime"])
+
+    assert not os.path.lexists(os.path.join(settings.symlink_path, "anime", "a.mkv"))
+    assert not file_watcher.sweeps
+    file_watcher.shutdown(MagicMock())
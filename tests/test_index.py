@@ -0,0 +1,92 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from teemo.utils import index as index_module
+from teemo.utils.index import FileIndex, IndexEntry, stat_entry
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "rclone"
+    (root / "movies" / "Movie (2024)").mkdir(parents=True)
+    (root / "movies" / "Movie (2024)" / "movie.mkv").write_bytes(b"x" * 10)
+    (root / "movies" / "other.mp4").write_bytes(b"y")
+    return root
+
+
+@pytest.fixture
+def file_index(tmp_path):
+    file_index = FileIndex(tmp_path / "data" / "index.db")
+    yield file_index
+    file_index.close()
+
+
+def walked(file_index, root):
+    return {entry.path: entry for _, files in file_index.walk(str(root)) for entry in files}
+
+
+def test_walk_lists_all_files(file_index, tree):
+    files = walked(file_index, tree)
+    assert set(files) == {
+        str(tree / "movies" / "Movie (2024)" / "movie.mkv"),
+        str(tree / "movies" / "other.mp4"),
+    }
+    assert files[str(tree / "movies" / "Movie (2024)" / "movie.mkv")].size == 10
+
+
+def test_unchanged_directories_are_served_from_index(file_index, tree):
+    first = walked(file_index, tree)
+    with patch.object(index_module, "scan_dir", wraps=index_module.scan_dir) as scan:
+        second = walked(file_index, tree)
+    assert first == second
+    scan.assert_not_called()
+
+
+def test_changed_directory_is_rescanned(file_index, tree):
+    walked(file_index, tree)
+    movie_dir = tree / "movies" / "Movie (2024)"
+    (movie_dir / "movie.mkv").unlink()
+    os.utime(movie_dir, (1, 1))
+    with patch.object(index_module, "scan_dir", wraps=index_module.scan_dir) as scan:
+        files = walked(file_index, tree)
+    scan.assert_called_once_with(str(movie_dir))
+    assert set(files) == {str(tree / "movies" / "other.mp4")}
+
+
+def test_index_survives_reopen(tmp_path, tree):
+    db_path = tmp_path / "data" / "index.db"
+    file_index = FileIndex(db_path)
+    walked(file_index, tree)
+    file_index.close()
+
+    reopened = FileIndex(db_path)
+    with patch.object(index_module, "scan_dir", wraps=index_module.scan_dir) as scan:
+        files = walked(reopened, tree)
+    reopened.close()
+    scan.assert_not_called()
+    assert len(files) == 2
+
+
+def test_symlink_target_is_recorded(file_index, tree, tmp_path):
+    links = tmp_path / "links"
+    links.mkdir()
+    src = tree / "movies" / "other.mp4"
+    (links / "other.mp4").symlink_to(src)
+    files = walked(file_index, links)
+    assert files[str(links / "other.mp4")].target == str(src)
+    assert stat_entry(str(links / "other.mp4")).target == str(src)
+
+
+def test_remove_drops_subtree(file_index, tree):
+    walked(file_index, tree)
+    file_index.remove(str(tree / "movies"))
+    assert file_index.dir_mtime(str(tree / "movies")) is None
+    assert file_index.listing(str(tree / "movies" / "Movie (2024)")) == ([], [])
+
+
+def test_upsert_and_listing(file_index):
+    entry = IndexEntry("/mnt/rclone/movies/new.mkv", 1, 2.0, 3)
+    file_index.upsert(entry)
+    assert file_index.listing("/mnt/rclone/movies") == ([entry], [])
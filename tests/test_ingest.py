@@ -0,0 +1,82 @@
+import json
+import urllib.request
+from unittest.mock import MagicMock
+
+import pytest
+
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.ingest import IngestServer
+from teemo.utils.matcher import PathMatcher
+from teemo.utils.router import PathRouter
+
+
+@pytest.fixture
+def monitor():
+    settings = FileMonitorSettings(rclone_path="/mnt/rclone", symlink_path="/mnt/links")
+    monitor = MagicMock()
+    monitor.router = PathRouter(settings)
+    monitor.matcher = PathMatcher.from_settings(settings)
+    monitor.status.return_value = {"ready": True}
+    return monitor
+
+
+@pytest.fixture
+def server(monitor):
+    server = IngestServer(monitor, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def request(server, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{server.port}{path}", data=data, method=method)
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_batch_is_recorded_and_wakes_processing(server, monitor):
+    status, body = request(server, "POST", "/changes", {"changes": [
+        {"action": "added", "path": "/mnt/rclone/movies/A/a.mkv"},
+        {"action": "removed", "path": "/mnt/rclone/shows/B/b.mkv"},
+        {"action": "moved", "path": "/mnt/rclone/movies/A/a.mkv", "dest": "/mnt/rclone/movies/A/b.mkv"},
+        {"action": "added", "path": "/mnt/rclone/movies/A/a.nfo"},
+        {"action": "added", "path": "/somewhere/else.mkv"},
+    ]})
+    assert status == 202
+    assert body == {"accepted": 3, "ignored": 2}
+    assert [call.args for call in monitor.record_change.call_args_list] == [
+        ("created", "/mnt/rclone/movies/A/a.mkv", ""),
+        ("delete", "/mnt/rclone/shows/B/b.mkv", ""),
+        ("move", "/mnt/rclone/movies/A/a.mkv", "/mnt/rclone/movies/A/b.mkv"),
+    ]
+    monitor.process_now.assert_called_once_with()
+
+
+def test_changes_under_ignored_dirs_are_ignored(server, monitor):
+    monitor.matcher = PathMatcher.from_settings(FileMonitorSettings(ignored_dirs=["Extras"]))
+    status, body = request(server, "POST", "/changes", {"changes": [
+        {"action": "added", "path": "/mnt/rclone/movies/A/Extras/trailer.mkv"},
+        {"action": "added", "path": "/mnt/rclone/movies/A/a.mkv"},
+    ]})
+    assert status == 202
+    assert body == {"accepted": 1, "ignored": 1}
+    assert [call.args for call in monitor.record_change.call_args_list] == [
+        ("created", "/mnt/rclone/movies/A/a.mkv", ""),
+    ]
+
+
+def test_invalid_batch_is_rejected_whole(server, monitor):
+    status, _ = request(server, "POST", "/changes", [
+        {"action": "added", "path": "/mnt/rclone/movies/A/a.mkv"},
+        {"action": "moved", "path": "/mnt/rclone/movies/A/a.mkv"},
+    ])
+    assert status == 400
+    assert not monitor.record_change.called
+
+
+def test_status(server):
+    assert request(server, "GET", "/status") == (200, {"ready": True})
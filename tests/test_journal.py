@@ -0,0 +1,78 @@
+import os
+from unittest.mock import patch
+
+from teemo.utils.journal import ChangeJournal
+
+
+def test_fresh_journal_has_nothing_to_replay(tmp_path):
+    journal = ChangeJournal(tmp_path / "journal.log")
+    assert not journal.recovered
+    assert journal.replay() == []
+    journal.close()
+
+
+def test_unapplied_changes_are_replayed(tmp_path):
+    path = tmp_path / "journal.log"
+    journal = ChangeJournal(path)
+    journal.append("created", "/rclone/movies/a.mkv")
+    applied = journal.append("delete", "/rclone/movies/b.mkv")
+    journal.checkpoint(applied)
+    journal.append("move", "/rclone/movies/c.mkv", "/rclone/movies/d.mkv")
+    journal.close()
+
+    reopened = ChangeJournal(path)
+    assert reopened.recovered
+    assert reopened.replay() == [(3, "move", "/rclone/movies/c.mkv", "/rclone/movies/d.mkv")]
+    assert reopened.append("created", "/rclone/movies/e.mkv") == 4
+    reopened.close()
+
+
+def test_cleanly_closed_journal_is_not_recovered(tmp_path):
+    path = tmp_path / "journal.log"
+    journal = ChangeJournal(path)
+    journal.checkpoint(journal.append("created", "/rclone/movies/a.mkv"))
+    journal.close()
+
+    reopened = ChangeJournal(path)
+    assert not reopened.recovered
+    assert reopened.replay() == []
+    reopened.close()
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    path = tmp_path / "journal.log"
+    journal = ChangeJournal(path)
+    journal.append("created", "/rclone/movies/a.mkv")
+    journal.close()
+    with open(path, "a") as file:
+        file.write('[2,"crea')
+
+    assert [entry[2] for entry in ChangeJournal(path).replay()] == ["/rclone/movies/a.mkv"]
+
+
+def test_burst_is_group_committed(tmp_path):
+    journal = ChangeJournal(tmp_path / "journal.log")
+    with patch("os.fsync", side_effect=os.fsync) as fsync:
+        for number in range(10000):
+            journal.append("created", f"/rclone/movies/{number}.mkv")
+        journal.commit()
+    assert fsync.call_count == 1
+    assert len(ChangeJournal(tmp_path / "journal.log").replay()) == 10000
+    journal.close()
+
+
+def test_fully_checkpointed_journal_is_truncated(tmp_path):
+    path = tmp_path / "journal.log"
+    journal = ChangeJournal(path, max_bytes=1024)
+    for number in range(100):
+        journal.append("created", f"/rclone/movies/{number}.mkv")
+    journal.commit()
+    journal.checkpoint(journal.seq)
+    journal.commit()
+    journal.close()
+
+    assert os.path.getsize(path) < 1024
+    reopened = ChangeJournal(path)
+    assert reopened.replay() == []
+    assert reopened.seq == 100
+    reopened.close()
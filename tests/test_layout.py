@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.layout import migrate
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return FileMonitorSettings(
+        library_paths=["shows"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        symlink_layout="mirror",
+    )
+
+
+def make_link(settings, relative_src, relative_link):
+    src = os.path.join(settings.rclone_path, "shows", relative_src)
+    link = os.path.join(settings.symlink_path, "shows", relative_link)
+    os.makedirs(os.path.dirname(link), exist_ok=True)
+    os.symlink(src, link)
+    return src, link
+
+
+def test_flat_tree_is_moved_in_place(settings):
+    src, flat = make_link(settings, "B/Season 1/b.mkv", "b.mkv")
+    inode = os.lstat(flat).st_ino
+
+    [result] = migrate(settings)
+
+    moved = os.path.join(settings.symlink_path, "shows", "B", "Season 1", "b.mkv")
+    assert os.readlink(moved) == src
+    assert os.lstat(moved).st_ino == inode
+    assert not os.path.lexists(flat)
+    assert (result.links, result.moved, result.conflicts) == (1, 1, [])
+    assert migrate(settings)[0].moved == 0
+
+
+def test_grouping_depth_change_removes_emptied_folders(settings):
+    make_link(settings, "B/Season 1/b.mkv", "B/Season 1/b.mkv")
+    settings.symlink_layout_depth = 1
+
+    [result] = migrate(settings)
+
+    assert os.path.islink(os.path.join(settings.symlink_path, "shows", "B", "b.mkv"))
+    assert not os.path.exists(os.path.join(settings.symlink_path, "shows", "B", "Season 1"))
+    assert result.folders_removed == 1
+
+
+def test_conflicts_and_duplicates(settings):
+    _, kept = make_link(settings, "B/b.mkv", "B/b.mkv")
+    _, duplicate = make_link(settings, "B/b.mkv", "b.mkv")
+    taken = os.path.join(settings.symlink_path, "shows", "C", "c.mkv")
+    os.makedirs(os.path.dirname(taken))
+    open(taken, "w").close()
+    _, conflict = make_link(settings, "C/c.mkv", "c.mkv")
+
+    [result] = migrate(settings)
+
+    assert os.path.islink(kept)
+    assert not os.path.lexists(duplicate)
+    assert os.path.islink(conflict)
+    assert result.duplicates == 1
+    assert result.conflicts == [conflict]
+
+
+def test_dry_run_changes_nothing(settings):
+    _, flat = make_link(settings, "B/b.mkv", "b.mkv")
+    [result] = migrate(settings, dry_run=True)
+    assert result.moved == 1
+    assert os.path.islink(flat)
+    assert not os.path.exists(os.path.join(settings.symlink_path, "shows", "B"))
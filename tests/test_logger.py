@@ -0,0 +1,59 @@
+import json
+
+import pytest
+from loguru import logger
+
+from teemo.utils.logger import BurstSummary, setup_logger
+
+
+@pytest.fixture
+def records():
+    records = []
+    handler = logger.add(lambda message: records.append(message.record), level="DEBUG")
+    yield records
+    logger.remove(handler)
+
+
+def test_bursts_drop_to_debug_and_are_summed_up(records):
+    summary = BurstSummary(threshold=2)
+    for number in range(5):
+        summary.log("created", "symlinks", "movies", "Created symlink {}", number)
+    summary.log("removed", "symlinks", "movies", "Removed symlink {}", 0)
+
+    assert [(record["level"].name, record["message"]) for record in records] == [
+        ("INFO", "Created symlink 0"),
+        ("INFO", "Created symlink 1"),
+        ("DEBUG", "Created symlink 2"),
+        ("DEBUG", "Created symlink 3"),
+        ("DEBUG", "Created symlink 4"),
+        ("INFO", "Removed symlink 0"),
+    ]
+
+    records.clear()
+    summary.flush()
+    assert len(records) == 1
+    assert records[0]["message"].startswith("created 5 symlinks in movies in the last")
+    assert records[0]["extra"] == {"action": "created", "library": "movies", "count": 5}
+
+    records.clear()
+    summary.log("created", "symlinks", "movies", "Created symlink {}", 5)
+    summary.flush()
+    assert [record["level"].name for record in records] == ["INFO"]
+
+
+def test_setup_logger_honours_the_level_and_writes_json(capsys):
+    try:
+        setup_logger("INFO", json_logs=True)
+        logger.debug("hidden {}", 1)
+        logger.info("shown {}", 2, library="movies")
+        logger.complete()
+        lines = capsys.readouterr().err.splitlines()
+    finally:
+        # Outside the capture, which is closed after the test
+        with capsys.disabled():
+            setup_logger("INFO")
+
+    assert len(lines) == 1
+    record = json.loads(lines[0])["record"]
+    assert record["message"] == "shown 2"
+    assert record["extra"] == {"library": "movies"}
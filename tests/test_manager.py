@@ -1,6 +1,7 @@
 import pytest
 import json
 from unittest.mock import patch, mock_open, MagicMock
+from teemo.settings import manager
 from teemo.settings.manager import SettingsManager
 from teemo.settings.models import TeemoModel
 
@@ -13,7 +14,8 @@ def test_load_settings(settings_manager):
     with patch("builtins.open", mock_open(read_data=settings_json)) as mock_file:
         settings_manager.load()
         mock_file.assert_called_once_with(settings_manager.settings_file, "r", encoding="utf-8")
-        assert isinstance(settings_manager.settings, TeemoModel)
+        # The manager's own TeemoModel, as the package imports it as settings.models
+        assert isinstance(settings_manager.settings, manager.TeemoModel)
 
 def test_save_settings(settings_manager):
     with patch("builtins.open", mock_open()) as mock_file:
@@ -24,4 +26,61 @@ def test_notify_observers(settings_manager):
     mock_observer = MagicMock()
     settings_manager.register_observer(mock_observer)
     settings_manager.notify_observers()
-    mock_observer.assert_called_once()
\ No newline at end of file
+    mock_observer.assert_called_once()
+
+
+def test_batch_notifies_once_with_changed_keys(settings_manager):
+    mock_observer = MagicMock()
+    settings_manager.register_observer(mock_observer)
+    file_monitor = settings_manager.settings.file_monitor
+    with settings_manager.batch():
+        file_monitor.poll_interval_seconds = file_monitor.poll_interval_seconds + 1
+        file_monitor.library_paths = file_monitor.library_paths + ["anime"]
+        mock_observer.assert_not_called()
+    mock_observer.assert_called_once_with({"file_monitor.poll_interval_seconds", "file_monitor.library_paths"})
+
+
+def test_unchanged_assignment_does_not_notify(settings_manager):
+    mock_observer = MagicMock()
+    settings_manager.register_observer(mock_observer)
+    settings_manager.settings.file_monitor.rclone_path = settings_manager.settings.file_monitor.rclone_path
+    mock_observer.assert_not_called()
+
+
+def test_observers_only_hear_about_their_keys(settings_manager):
+    plex_observer, file_monitor_observer = MagicMock(), MagicMock()
+    settings_manager.register_observer(plex_observer, keys=("plex",))
+    settings_manager.register_observer(file_monitor_observer, keys=("file_monitor.poll_interval_seconds",))
+    settings_manager.settings.plex.refresh_quiet_seconds += 1
+    plex_observer.assert_called_once_with({"plex.refresh_quiet_seconds"})
+    file_monitor_observer.assert_not_called()
+
+
+def test_reload_applies_only_real_changes_in_place(settings_manager, tmp_path):
+    settings_manager.settings_file = tmp_path / "teemo.json"
+    settings_manager.save()
+    file_monitor = settings_manager.settings.file_monitor
+    mock_observer = MagicMock()
+    settings_manager.register_observer(mock_observer)
+
+    # Our own save and an untouched file are neither parsed nor reported
+    with patch.object(settings_manager, "load") as load:
+        assert settings_manager.reload_if_changed() == set()
+        load.assert_not_called()
+
+    settings = json.loads(settings_manager.settings_file.read_text())
+    settings["file_monitor"]["library_paths"] = ["movies", "shows", "anime"]
+    settings_manager.settings_file.write_text(json.dumps(settings, indent=4))
+    assert settings_manager.reload_if_changed() == {"file_monitor.library_paths"}
+    assert settings_manager.settings.file_monitor is file_monitor
+    assert file_monitor.library_paths == ["movies", "shows", "anime"]
+    mock_observer.assert_called_once_with({"file_monitor.library_paths"})
+
+
+def test_invalid_reload_keeps_current_settings(settings_manager, tmp_path):
+    settings_manager.settings_file = tmp_path / "teemo.json"
+    settings_manager.save()
+    before = settings_manager.settings.model_dump()
+    settings_manager.settings_file.write_text('{"file_monitor": {"poll_interval_seconds": "often"}}')
+    assert settings_manager.reload_if_changed() == set()
+    assert settings_manager.settings.model_dump() == before
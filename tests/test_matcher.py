@@ -0,0 +1,32 @@
+import os
+
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.matcher import PathMatcher
+
+
+def test_default_file_types_are_a_suffix_check():
+    matcher = PathMatcher.from_settings(FileMonitorSettings())
+    assert matcher.suffixes
+    assert matcher.include_name is None
+    assert matcher.matches("/mnt/rclone/movies/A/a.mkv")
+    assert matcher.matches("/mnt/rclone/movies/A/A.MKV")
+    assert not matcher.matches("/mnt/rclone/movies/A/a.nfo")
+
+
+def test_other_globs_are_combined():
+    matcher = PathMatcher(["*.mkv", "movie-??.*"], ignored_files=["*sample*", "*/incomplete/*"])
+    assert matcher.matches("/x/movie-01.avi")
+    assert not matcher.matches("/x/movie-001.avi")
+    assert not matcher.matches("/x/a-sample.mkv")
+    assert not matcher.matches("/x/incomplete/a.mkv")
+
+
+def test_directory_rules_prune_subtrees():
+    matcher = PathMatcher(["*.mkv"], ignored_dirs=["extras", "*.partial", "*/shows/*/specials"])
+    assert matcher.prune("/mnt/rclone/movies/A/Extras")
+    assert matcher.prune("/mnt/rclone/movies/A.partial")
+    assert matcher.prune("/mnt/rclone/shows/B/Specials")
+    assert not matcher.prune("/mnt/rclone/movies/A")
+    assert matcher.within_pruned("/mnt/rclone/movies/A/Extras/x/a.mkv")
+    assert not matcher.within_pruned("/mnt/rclone/movies/A/a.mkv")
+    assert not PathMatcher(["*.mkv"]).within_pruned(os.path.join("extras", "a.mkv"))
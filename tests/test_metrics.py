@@ -0,0 +1,69 @@
+import urllib.request
+
+from teemo.utils.metrics import MetricsRegistry, MetricsServer, Tracer
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    events = registry.counter("events_total", "Events", ["type"])
+    depth = registry.gauge("depth", "Depth")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    events.inc(type="created")
+    events.inc(2, type="created")
+    depth.set_function(lambda: 7)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+
+    assert "# TYPE events_total counter" in text
+    assert 'events_total{type="created"} 3' in text
+    assert "depth 7" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+    assert registry.counter("events_total", "Events", ["type"]) is events
+
+
+def test_remote_samples_are_merged_with_a_label():
+    local = MetricsRegistry()
+    local.counter("events_total", "Events", ["type"]).inc(type="created")
+    shard = MetricsRegistry()
+    shard.counter("events_total", "Events", ["type"]).inc(2, type="created")
+    shard.gauge("depth", "Depth").set(4)
+    local.update_remote("shard", "0", shard.collect())
+
+    text = local.render()
+
+    assert text.count("# TYPE events_total counter") == 1
+    assert 'events_total{type="created"} 1' in text
+    assert 'events_total{shard="0",type="created"} 2' in text
+    assert 'depth{shard="0"} 4' in text
+
+
+def test_trace_follows_a_file():
+    tracer = Tracer(maxsize=2)
+    first = tracer.start("/rclone/movies/a.partial.mkv")
+    assert tracer.start("/rclone/movies/a.partial.mkv") == first
+    tracer.move("/rclone/movies/a.partial.mkv", "/rclone/movies/a.mkv")
+    assert tracer.finish("/rclone/movies/a.mkv") == first
+    assert tracer.finish("/rclone/movies/a.mkv") is None
+
+    for name in "abc":
+        tracer.start(f"/rclone/movies/{name}.mkv")
+    assert tracer.get("/rclone/movies/a.mkv") is None
+
+
+def test_metrics_endpoint():
+    registry = MetricsRegistry()
+    registry.counter("up_total", "Up").inc()
+    server = MetricsServer(port=0, metrics=registry)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "up_total 1" in response.read().decode()
+    finally:
+        server.stop()
@@ -0,0 +1,76 @@
+import time
+
+from watchdog.events import FileSystemEventHandler
+
+from teemo.utils.observers import NATIVE, POLLING, ObserverGroup, mount_fstype, needs_polling, read_mounts
+from teemo.utils.snapshot import CompactPollingObserver
+
+MOUNTS = """\
+/dev/sda1 / ext4 rw,relatime 0 0
+tmpfs /tmp tmpfs rw,nosuid,nodev 0 0
+rclone: /mnt/rclone fuse.rclone rw,nosuid,nodev,relatime,user_id=0,group_id=0 0 0
+//nas/media /mnt/my\\040media cifs rw 0 0
+"""
+
+
+def write_mounts(tmp_path):
+    mounts_file = tmp_path / "mounts"
+    mounts_file.write_text(MOUNTS)
+    return str(mounts_file)
+
+
+def test_fstype_of_most_specific_mount(tmp_path):
+    mounts = read_mounts(write_mounts(tmp_path))
+    assert mount_fstype("/mnt/rclone/movies/a.mkv", mounts) == "fuse.rclone"
+    assert mount_fstype("/mnt/my media/movies", mounts) == "cifs"
+    assert mount_fstype("/mnt/rclone2", mounts) == "ext4"
+    assert read_mounts(str(tmp_path / "missing")) == []
+
+
+def test_fuse_and_network_mounts_are_polled():
+    assert needs_polling("fuse.rclone")
+    assert needs_polling("nfs4")
+    assert not needs_polling("tmpfs")
+    assert not needs_polling("ext4")
+    assert not needs_polling(None)
+
+
+def test_backend_per_root(tmp_path):
+    group = ObserverGroup(CompactPollingObserver, mounts_file=write_mounts(tmp_path))
+    assert group.backend_for("/mnt/rclone") == POLLING
+    assert group.backend_for("/mnt/teemo-symlinks") == NATIVE
+    assert ObserverGroup(CompactPollingObserver, backend=POLLING).backend_for("/tmp") == POLLING
+
+
+class Collector(FileSystemEventHandler):
+    def __init__(self):
+        self.events = []
+
+    def on_any_event(self, event):
+        self.events.append((event.event_type, event.src_path))
+
+
+def test_native_and_polling_roots_share_one_group(tmp_path):
+    local, mounted = tmp_path / "local", tmp_path / "mounted"
+    local.mkdir()
+    mounted.mkdir()
+    group = ObserverGroup(lambda: CompactPollingObserver(timeout=0.05), mounts_file=write_mounts(tmp_path))
+    group.backend_for = lambda path: POLLING if path == str(mounted) else NATIVE
+    handler = Collector()
+    group.schedule(handler, str(local), recursive=True)
+    group.schedule(handler, str(mounted), recursive=True)
+    group.start()
+    try:
+        assert group.is_alive()
+        time.sleep(0.2)
+        (local / "a.mkv").touch()
+        (mounted / "b.mkv").touch()
+        deadline = time.monotonic() + 5
+        expected = {("created", str(local / "a.mkv")), ("created", str(mounted / "b.mkv"))}
+        while not expected <= set(handler.events) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert expected <= set(handler.events)
+    finally:
+        group.stop()
+        group.join()
+    assert set(group.observers) == {NATIVE, POLLING}
@@ -0,0 +1,63 @@
+import os
+from unittest.mock import patch
+
+from teemo.utils.planner import TEMP_SUFFIX, ChangePlan, atomic_symlink, link
+from teemo.utils.reconciler import ReconcileResult
+
+
+def test_atomic_symlink_replaces_existing_link(tmp_path):
+    old, new = tmp_path / "old.mkv", tmp_path / "new.mkv"
+    symlink_path = tmp_path / "link.mkv"
+    os.symlink(old, symlink_path)
+    with patch("os.remove", side_effect=os.remove) as remove:
+        atomic_symlink(str(new), str(symlink_path))
+    assert os.readlink(symlink_path) == str(new)
+    assert str(symlink_path) not in [call.args[0] for call in remove.call_args_list]
+    assert not any(name.endswith(TEMP_SUFFIX) for name in os.listdir(tmp_path))
+
+
+def test_link_creates_or_replaces(tmp_path):
+    symlink_path = str(tmp_path / "link.mkv")
+    link("/a.mkv", symlink_path)
+    link("/b.mkv", symlink_path)
+    assert os.readlink(symlink_path) == "/b.mkv"
+
+
+def test_broken_link_with_new_source_is_replaced():
+    result = ReconcileResult("movies", to_create={"/l/movies/a.mkv": "/r/movies/B/a.mkv",
+                                                   "/l/movies/b.mkv": "/r/movies/b.mkv"},
+                             to_remove=["/l/movies/a.mkv", "/l/movies/c.mkv"])
+    plan = ChangePlan.from_reconcile(result)
+    assert plan.replace == {"/l/movies/a.mkv": "/r/movies/B/a.mkv"}
+    assert plan.create == {"/l/movies/b.mkv": "/r/movies/b.mkv"}
+    assert plan.remove == {"/l/movies/c.mkv"}
+    assert plan.estimated_syscalls() == 1 + 1 + 2 + 1
+
+
+def test_apply_creates_each_parent_once(tmp_path):
+    plan = ChangePlan()
+    for name in ("a", "b", "c"):
+        plan.add_link(str(tmp_path / "movies" / f"{name}.mkv"), f"/r/{name}.mkv", exists=False)
+    plan.add_link(str(tmp_path / "shows" / "d.mkv"), "/r/d.mkv", exists=False)
+    with patch("os.makedirs", side_effect=os.makedirs) as makedirs:
+        plan.apply()
+    assert makedirs.call_count == 2
+    assert os.readlink(tmp_path / "movies" / "b.mkv") == "/r/b.mkv"
+
+
+def test_later_operations_override_earlier_ones():
+    plan = ChangePlan()
+    plan.add_link("/l/a.mkv", "/r/a.mkv", exists=False)
+    plan.add_removal("/l/a.mkv")
+    assert not plan.create and plan.remove == {"/l/a.mkv"}
+    plan.add_link("/l/a.mkv", "/r/a.mkv", exists=True)
+    assert plan.replace == {"/l/a.mkv": "/r/a.mkv"} and not plan.remove
+
+
+def test_describe_summarises_plan():
+    plan = ChangePlan()
+    for number in range(30):
+        plan.add_link(f"/l/movies/{number}.mkv", f"/r/{number}.mkv", exists=False)
+    description = plan.describe(limit=5)
+    assert description.splitlines()[0] == "30 to create, 0 to replace, 0 to remove in 1 directories (~31 syscalls)"
+    assert description.splitlines()[-1] == "  ... and 25 more"
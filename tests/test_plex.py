@@ -0,0 +1,127 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from teemo.libraries import plex as plex_module
+from teemo.libraries.plex import PlexUpdater
+from teemo.settings.models import FileMonitorSettings, PlexLibraryModel
+from teemo.utils.router import PathRouter
+from teemo.utils.scheduler import Scheduler
+
+
+@pytest.fixture
+def plex_updater():
+    with patch.object(PlexUpdater, "validate", return_value=False):
+        plex_updater = PlexUpdater()
+    plex_updater.settings = PlexLibraryModel(refresh_quiet_seconds=10, refresh_max_delay_seconds=60)
+    plex_updater.refresh_library = MagicMock(return_value=True)
+    return plex_updater
+
+
+def test_burst_is_refreshed_once(plex_updater):
+    for _ in range(24):
+        plex_updater.schedule_refresh("shows")
+    assert plex_updater.flush_refreshes() == []
+    assert plex_updater.flush_refreshes(force=True) == ["shows"]
+    plex_updater.refresh_library.assert_called_once_with("shows")
+
+
+def test_refresh_after_quiet_period(plex_updater):
+    plex_updater.settings = PlexLibraryModel(refresh_quiet_seconds=0)
+    plex_updater.schedule_refresh("movies")
+    plex_updater.schedule_refresh("shows")
+    assert sorted(plex_updater.flush_refreshes()) == ["movies", "shows"]
+    assert plex_updater.flush_refreshes() == []
+
+
+def test_max_delay_caps_a_steady_trickle(plex_updater):
+    plex_updater.schedule_refresh("movies")
+    first, last = plex_updater.pending_refreshes["movies"]
+    plex_updater.pending_refreshes["movies"] = (first - 61, last)
+    plex_updater.schedule_refresh("movies")
+    assert plex_updater.flush_refreshes() == ["movies"]
+
+
+def test_scheduled_refresh_runs_and_stops(plex_updater):
+    plex_updater.settings = PlexLibraryModel(refresh_quiet_seconds=0)
+    plex_updater.scheduler, plex_updater.owns_scheduler = Scheduler(), True
+    plex_updater.scheduler.start()
+    plex_updater.schedule_refresh("movies")
+    deadline = time.monotonic() + 5
+    while not plex_updater.refresh_library.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    plex_updater.stop()
+    assert not plex_updater.scheduler.running
+    plex_updater.refresh_library.assert_called_once_with("movies")
+
+
+def test_stop_refreshes_what_is_still_pending(plex_updater):
+    plex_updater.scheduler, plex_updater.owns_scheduler = Scheduler(), True
+    plex_updater.scheduler.start()
+    plex_updater.schedule_refresh("shows")
+    plex_updater.stop()
+    plex_updater.refresh_library.assert_called_once_with("shows")
+
+
+@pytest.fixture
+def sectioned_updater(plex_updater):
+    plex_updater.library_path = "/mnt/teemo-symlinks"
+    plex_updater.router = PathRouter(FileMonitorSettings(symlink_path="/mnt/teemo-symlinks"))
+    plex_updater.settings = PlexLibraryModel(symlink_path_in_plex="/data/media", partial_scan_max_folders=2)
+    movies = MagicMock(key="1")
+    movies.title = "movies"
+    plex_updater.sections = {movies: ["/data/media/movies"]}
+    return plex_updater, movies
+
+
+def test_to_plex_path_translates_symlink_prefix(sectioned_updater):
+    plex_updater, _ = sectioned_updater
+    assert plex_updater.to_plex_path("/mnt/teemo-symlinks/movies/A/a.mkv") == "/data/media/movies/A/a.mkv"
+    assert plex_updater.to_plex_path("/elsewhere/a.mkv") == "/elsewhere/a.mkv"
+
+
+def test_paths_in_one_folder_are_one_partial_scan(sectioned_updater):
+    plex_updater, movies = sectioned_updater
+    plex_updater.client = MagicMock()
+    plex_updater.map_sections_with_paths = MagicMock(return_value=plex_updater.sections)
+    assert plex_updater.refresh_paths("movies", {
+        "/mnt/teemo-symlinks/movies/A/a1.mkv",
+        "/mnt/teemo-symlinks/movies/A/a2.mkv",
+    })
+    plex_updater.client.refresh_section.assert_called_once_with("1", "/data/media/movies/A")
+    plex_updater.refresh_library.assert_not_called()
+    plex_updater.map_sections_with_paths.assert_called_once_with()
+
+
+def test_too_many_folders_falls_back_to_full_refresh(sectioned_updater):
+    plex_updater, _ = sectioned_updater
+    plex_updater.refresh_folder = MagicMock()
+    plex_updater.refresh_paths("movies", {f"/mnt/teemo-symlinks/movies/{name}/x.mkv" for name in "ABC"})
+    plex_updater.refresh_folder.assert_not_called()
+    plex_updater.refresh_library.assert_called_once_with("movies")
+
+
+def test_unmapped_path_falls_back_to_full_refresh(sectioned_updater):
+    plex_updater, _ = sectioned_updater
+    plex_updater.refresh_paths("shows", {"/mnt/teemo-symlinks/shows/x.mkv"})
+    plex_updater.refresh_library.assert_called_once_with("shows")
+
+
+def test_flush_passes_collected_paths(sectioned_updater):
+    plex_updater, _ = sectioned_updater
+    plex_updater.refresh_paths = MagicMock(return_value=True)
+    plex_updater.schedule_refresh("movies", "/mnt/teemo-symlinks/movies/A/a.mkv")
+    plex_updater.schedule_refresh("shows", "/mnt/teemo-symlinks/shows/b.mkv")
+    plex_updater.schedule_refresh("shows")
+    plex_updater.flush_refreshes(force=True)
+    plex_updater.refresh_paths.assert_any_call("movies", {"/mnt/teemo-symlinks/movies/A/a.mkv"})
+    plex_updater.refresh_paths.assert_any_call("shows", None)
+
+
+def test_refresh_records_trace_latency(plex_updater):
+    latency = plex_module.EVENT_TO_PLEX_SECONDS
+    before = latency.count()
+    plex_updater.schedule_refresh("movies", trace=plex_module.Trace("t-1", time.monotonic() - 3))
+    plex_updater.flush_refreshes(force=True)
+    assert latency.count() == before + 1
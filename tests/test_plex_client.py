@@ -0,0 +1,130 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from teemo.libraries.client import PlexClient
+from teemo.libraries.plex import PlexUpdater
+from teemo.settings.models import PlexLibraryModel
+
+
+class StubPlex(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body=None):
+        payload = json.dumps({"MediaContainer": body or {}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def record(self):
+        url = urlparse(self.path)
+        self.server.requests.append((self.command, url.path, parse_qs(url.query), self.client_address[1],
+                                     self.headers.get("X-Plex-Token")))
+        return url.path
+
+    def do_GET(self):
+        path = self.record()
+        if path == "/library/sections":
+            self.reply({"Directory": [
+                {"key": "1", "title": "Movies", "type": "movie", "Location": [{"path": "/data/movies"}]},
+                {"key": "2", "title": "Shows", "type": "show", "Location": [{"path": "/data/shows"}]},
+            ]})
+        elif path == "/activities":
+            self.reply({"Activity": self.server.activities})
+        else:
+            self.reply()
+
+    def do_DELETE(self):
+        self.record()
+        self.reply()
+
+
+@pytest.fixture
+def stub_plex():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPlex)
+    server.requests = []
+    server.activities = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub_plex):
+    client = PlexClient(f"http://127.0.0.1:{stub_plex.server_port}", "token", section_cache_seconds=300)
+    yield client
+    client.close()
+
+
+def paths(stub_plex):
+    return [(method, path) for method, path, *_ in stub_plex.requests]
+
+
+def test_sections_are_cached(client, stub_plex):
+    assert client.section("movies").key == "1"
+    assert client.section("Shows").locations == ("/data/shows",)
+    assert paths(stub_plex) == [("GET", "/library/sections")]
+
+
+def test_section_miss_reloads_cache(client, stub_plex):
+    client.sections()
+    assert client.section("anime") is None
+    assert paths(stub_plex) == [("GET", "/library/sections"), ("GET", "/library/sections")]
+
+
+def test_requests_share_one_connection(client, stub_plex):
+    client.sections()
+    client.refresh_section("1")
+    client.refresh_section("1", "/data/movies/A")
+    ports = {port for *_, port, _ in stub_plex.requests}
+    assert len(ports) == 1
+    assert all(token == "token" for *_, token in stub_plex.requests)
+    assert stub_plex.requests[-1][2] == {"path": ["/data/movies/A"]}
+
+
+def test_is_scanning_reads_activities(client, stub_plex):
+    assert not client.is_scanning("1")
+    stub_plex.activities = [{"type": "library.update.section", "Context": {"librarySectionID": "1"}}]
+    assert client.is_scanning("1")
+    assert not client.is_scanning("2")
+
+
+@pytest.fixture
+def plex_updater(client):
+    with patch.object(PlexUpdater, "validate", return_value=False):
+        plex_updater = PlexUpdater()
+    plex_updater.settings = PlexLibraryModel(refresh_max_delay_seconds=60)
+    plex_updater.client = client
+    return plex_updater
+
+
+def test_refresh_without_running_scan_does_not_cancel(plex_updater, stub_plex):
+    assert plex_updater.refresh_library("movies")
+    assert ("DELETE", "/library/sections/1/refresh") not in paths(stub_plex)
+    assert ("GET", "/library/sections/1/refresh") in paths(stub_plex)
+
+
+def test_refresh_during_running_scan_is_deferred(plex_updater, stub_plex):
+    stub_plex.activities = [{"type": "library.update.section", "Context": {"librarySectionID": "1"}}]
+    assert plex_updater.refresh_library("movies")
+    assert ("GET", "/library/sections/1/refresh") not in paths(stub_plex)
+    assert "movies" in plex_updater.pending_refreshes
+
+
+def test_long_running_scan_is_restarted(plex_updater, stub_plex):
+    stub_plex.activities = [{"type": "library.update.section", "Context": {"librarySectionID": "1"}}]
+    plex_updater.deferred["movies"] = 0.0
+    assert plex_updater.refresh_library("movies")
+    assert paths(stub_plex)[-2:] == [("DELETE", "/library/sections/1/refresh"),
+                                     ("GET", "/library/sections/1/refresh")]
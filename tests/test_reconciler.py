@@ -0,0 +1,171 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.index import FileIndex
+from teemo.utils.reconciler import Reconciler
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return FileMonitorSettings(
+        library_paths=["movies", "shows"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        reconcile_workers=4,
+    )
+
+
+@pytest.fixture
+def reconciler(settings):
+    file_index = FileIndex(":memory:")
+    yield Reconciler(settings, file_index)
+    file_index.close()
+
+
+def make_file(root, *parts):
+    path = os.path.join(root, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w"):
+        pass
+    return path
+
+
+def test_walk_finds_files_in_both_trees(settings, reconciler):
+    movie = make_file(settings.rclone_path, "movies", "A (2020)", "a.mkv")
+    show = make_file(settings.rclone_path, "shows", "B", "Season 1", "b.mp4")
+    movies = os.path.join(settings.rclone_path, "movies")
+    shows = os.path.join(settings.rclone_path, "shows")
+
+    found = reconciler.walk(movies, shows, os.path.join(settings.rclone_path, "missing"))
+
+    assert set(found[movies]) == {movie}
+    assert set(found[shows]) == {show}
+
+
+def test_diff_computes_create_and_remove_sets(settings, reconciler):
+    kept = make_file(settings.rclone_path, "movies", "A", "kept.mkv")
+    new = make_file(settings.rclone_path, "movies", "B", "new.mkv")
+    make_file(settings.rclone_path, "movies", "B", "notes.txt")
+    gone = os.path.join(settings.rclone_path, "movies", "C", "gone.mkv")
+    os.makedirs(os.path.join(settings.symlink_path, "movies"))
+    os.symlink(kept, os.path.join(settings.symlink_path, "movies", "kept.mkv"))
+    os.symlink(gone, os.path.join(settings.symlink_path, "movies", "gone.mkv"))
+
+    result = reconciler.diff("movies")
+
+    assert result.to_create == {os.path.join(settings.symlink_path, "movies", "new.mkv"): new}
+    assert result.to_remove == [os.path.join(settings.symlink_path, "movies", "gone.mkv")]
+    assert result.sources == 3
+    assert result.links == 2
+
+
+def test_run_applies_changes(settings, reconciler):
+    src = make_file(settings.rclone_path, "shows", "B", "Season 1", "b.mp4")
+    broken = os.path.join(settings.symlink_path, "shows", "old.mp4")
+    os.makedirs(os.path.dirname(broken))
+    os.symlink(os.path.join(settings.rclone_path, "shows", "old.mp4"), broken)
+
+    results = {result.lib: result for result in reconciler.run()}
+
+    link = os.path.join(settings.symlink_path, "shows", "b.mp4")
+    assert os.readlink(link) == src
+    assert not os.path.lexists(broken)
+    assert results["shows"].changed
+    assert not results["movies"].changed
+    assert results["shows"].walk_seconds >= 0
+
+
+def test_second_run_is_a_no_op(settings, reconciler):
+    make_file(settings.rclone_path, "movies", "A", "a.mkv")
+    reconciler.run()
+    assert not any(result.changed for result in reconciler.run())
+
+
+def test_dry_run_does_not_touch_disk(tmp_path):
+    settings = FileMonitorSettings(
+        library_paths=["movies"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        dry_run=True,
+    )
+    make_file(settings.rclone_path, "movies", "A", "a.mkv")
+    file_index = FileIndex(":memory:")
+    result = Reconciler(settings, file_index).reconcile("movies")
+    file_index.close()
+    assert not result.changed
+    assert not os.path.exists(settings.symlink_path)
+
+
+def test_broken_link_is_swapped_in_place(settings, reconciler):
+    src = make_file(settings.rclone_path, "movies", "B", "a.mkv")
+    symlink_path = os.path.join(settings.symlink_path, "movies", "a.mkv")
+    os.makedirs(os.path.dirname(symlink_path))
+    os.symlink(os.path.join(settings.rclone_path, "movies", "A", "a.mkv"), symlink_path)
+    with patch("os.remove", side_effect=os.remove) as remove:
+        reconciler.reconcile("movies")
+    assert os.readlink(symlink_path) == src
+    assert symlink_path not in [call.args[0] for call in remove.call_args_list]
+
+
+def test_run_tracks_progress(settings, reconciler):
+    make_file(settings.rclone_path, "movies", "A", "a.mkv")
+    make_file(settings.rclone_path, "movies", "B", "b.mkv")
+    reconciler.run()
+    first = reconciler.progress.as_dict()
+    assert first["libraries_done"] == first["libraries_total"] == 2
+    assert first["files_done"] == 2
+    assert first["eta_seconds"] == 0.0
+
+    reconciler.run()
+    second = reconciler.progress.as_dict()
+    # The expected counts come from what the index saw on the previous run
+    assert second["dirs_expected"] > 0
+    assert second["files_expected"] == second["files_done"] == 4
+
+
+def test_live_paths_take_precedence(settings, reconciler):
+    make_file(settings.rclone_path, "movies", "A", "a.mkv")
+    make_file(settings.rclone_path, "movies", "B", "b.mkv")
+    handled_live = os.path.join(settings.symlink_path, "movies", "a.mkv")
+    reconciler.live_paths.add(handled_live)
+
+    reconciler.reconcile("movies")
+
+    assert not os.path.lexists(handled_live)
+    assert os.path.islink(os.path.join(settings.symlink_path, "movies", "b.mkv"))
+
+
+def test_ignored_directories_are_not_walked(tmp_path):
+    settings = FileMonitorSettings(
+        library_paths=["movies"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        ignored_dirs=["extras"],
+    )
+    make_file(settings.rclone_path, "movies", "A", "a.mkv")
+    make_file(settings.rclone_path, "movies", "A", "Extras", "trailer.mkv")
+    file_index = FileIndex(":memory:")
+    result = Reconciler(settings, file_index).diff("movies")
+    file_index.close()
+    assert list(result.to_create) == [os.path.join(settings.symlink_path, "movies", "a.mkv")]
+
+
+def test_mirror_layout_replaces_flat_links_and_prunes_empty_folders(settings, reconciler):
+    settings.symlink_layout = "mirror"
+    reconciler = Reconciler(settings, reconciler.index)
+    src = make_file(settings.rclone_path, "shows", "B", "Season 1", "b.mp4")
+    flat = os.path.join(settings.symlink_path, "shows", "b.mp4")
+    stale = os.path.join(settings.symlink_path, "shows", "C", "Season 1", "c.mp4")
+    os.makedirs(os.path.dirname(stale))
+    os.symlink(src, flat)
+    os.symlink(os.path.join(settings.rclone_path, "shows", "C", "Season 1", "c.mp4"), stale)
+
+    reconciler.reconcile("shows")
+
+    assert os.readlink(os.path.join(settings.symlink_path, "shows", "B", "Season 1", "b.mp4")) == src
+    assert not os.path.lexists(flat)
+    assert not os.path.exists(os.path.join(settings.symlink_path, "shows", "C"))
+    assert os.path.isdir(os.path.join(settings.symlink_path, "shows"))
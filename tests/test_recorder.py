@@ -0,0 +1,94 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import watchdog.events
+
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.filewatcher import FileWatcher
+from teemo.utils.recorder import EventRecorder, RecordedEvent, read_trace
+
+
+@pytest.mark.parametrize("name", ["events.jsonl", "events.jsonl.gz"])
+def test_trace_round_trip(tmp_path, name):
+    recorder = EventRecorder(tmp_path / name, "/rclone", ["movies"])
+    recorder.record("created", "/rclone/movies/a.mkv")
+    recorder.record("moved", "/rclone/movies/a", "/rclone/movies/b", is_directory=True)
+    recorder.record("deleted", "/elsewhere/c.mkv")
+    recorder.close()
+
+    header, events = read_trace(tmp_path / name)
+    assert header["root"] == "/rclone"
+    assert header["library_paths"] == ["movies"]
+    assert [event[1:] for event in events] == [
+        ("created", "/rclone/movies/a.mkv", "", False),
+        ("moved", "/rclone/movies/a", "/rclone/movies/b", True),
+        ("deleted", "/elsewhere/c.mkv", "", False),
+    ]
+    assert all(event.time >= 0 for event in events)
+
+
+def test_paths_are_stored_relative_to_the_root(tmp_path):
+    recorder = EventRecorder(tmp_path / "events.jsonl", "/rclone", ["movies"])
+    recorder.record("created", "/rclone/movies/a.mkv")
+    recorder.close()
+    assert '"movies/a.mkv"' in (tmp_path / "events.jsonl").read_text()
+
+
+def test_appended_sessions_follow_on(tmp_path):
+    path = tmp_path / "events.jsonl"
+    for name in ("first", "second"):
+        recorder = EventRecorder(path, "/rclone", ["movies"])
+        recorder.record("created", f"/rclone/movies/{name}.mkv")
+        recorder.close()
+        time.sleep(0.01)
+
+    _, events = read_trace(path)
+    assert [event.src for event in events] == ["/rclone/movies/first.mkv", "/rclone/movies/second.mkv"]
+    assert events[1].time > events[0].time
+
+
+def test_torn_tail_ends_the_trace(tmp_path):
+    path = tmp_path / "events.jsonl"
+    recorder = EventRecorder(path, "/rclone", ["movies"])
+    recorder.record("created", "/rclone/movies/a.mkv")
+    recorder.close()
+    with open(path, "a") as file:
+        file.write('[0.5,"created","movies/b')
+
+    _, events = read_trace(path)
+    assert events == [RecordedEvent(events[0].time, "created", "/rclone/movies/a.mkv", "", False)]
+
+
+def test_handler_records_and_processes_events(tmp_path):
+    rclone = tmp_path / "rclone"
+    (rclone / "movies").mkdir(parents=True)
+    settings = FileMonitorSettings(
+        library_paths=["movies"],
+        rclone_path=str(rclone),
+        symlink_path=str(tmp_path / "links"),
+        poll_interval_seconds=1,
+        persistent_index=False,
+        watch_symlinks=False,
+        record_events_path="events.jsonl",
+    )
+    plex = MagicMock(initialized=True)
+    watcher = FileWatcher(settings, plex, tmp_path / "state")
+    src = rclone / "movies" / "new.mkv"
+    src.touch()
+
+    handler = FileWatcher.Handler(watcher)
+    handler.dispatch(watchdog.events.FileCreatedEvent(str(src)))
+    handler.dispatch(watchdog.events.FileModifiedEvent(str(src)))
+
+    symlink_path = tmp_path / "links" / "movies" / "new.mkv"
+    deadline = time.monotonic() + 5
+    while not symlink_path.is_symlink() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert symlink_path.is_symlink()
+    watcher.queue.stop()
+    watcher.journal.close()
+    watcher.recorder.close()
+
+    _, events = read_trace(tmp_path / "state" / "events.jsonl")
+    assert [(event.event_type, event.src) for event in events] == [("created", str(src))]
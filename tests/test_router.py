@@ -0,0 +1,48 @@
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.router import RCLONE, SYMLINK, Route, PathRouter
+
+
+def make_router(**overrides):
+    return PathRouter(FileMonitorSettings(
+        library_paths=["movies", "shows", "anime/series"],
+        rclone_path="/mnt/rclone",
+        symlink_path="/mnt/links",
+        **overrides,
+    ))
+
+
+def test_routes_to_library():
+    router = make_router()
+    assert router.route("/mnt/rclone/movies/A/a.mkv") == Route(RCLONE, "/mnt/rclone", "movies", "A/a.mkv")
+    assert router.route("/mnt/links/shows/b.mkv") == Route(SYMLINK, "/mnt/links", "shows", "b.mkv")
+    assert router.library_for("/mnt/rclone/anime/series/x/c.mkv") == "anime/series"
+
+
+def test_only_whole_components_match():
+    router = make_router()
+    assert router.route("/mnt/rclone/movies2/a.mkv") == Route(RCLONE, "/mnt/rclone", None, "movies2/a.mkv")
+    assert router.symlink_for("/mnt/rclone/movies2/a.mkv") == (None, None)
+    assert router.route("/mnt/rclone2/movies/a.mkv") is None
+
+
+def test_symlink_for():
+    router = make_router()
+    assert router.symlink_for("/mnt/rclone/movies/A/a.mkv") == ("movies", "/mnt/links/movies/a.mkv")
+    assert router.symlink_for("/mnt/rclone/movies") == (None, None)
+    assert router.symlink_for("/mnt/links/movies/a.mkv") == (None, None)
+
+
+def test_rebuild_picks_up_new_libraries():
+    router = make_router()
+    router.rebuild(FileMonitorSettings(library_paths=["movies2"], rclone_path="/mnt/rclone", symlink_path="/mnt/links"))
+    assert router.library_for("/mnt/rclone/movies2/a.mkv") == "movies2"
+    assert router.library_for("/mnt/rclone/movies/a.mkv") is None
+
+
+def test_mirror_layout_keeps_source_folders():
+    router = make_router(symlink_layout="mirror")
+    assert router.symlink_for("/mnt/rclone/shows/B/Season 1/b.mkv") == ("shows", "/mnt/links/shows/B/Season 1/b.mkv")
+    assert router.symlink_for("/mnt/rclone/movies/a.mkv") == ("movies", "/mnt/links/movies/a.mkv")
+
+    grouped = make_router(symlink_layout="mirror", symlink_layout_depth=1)
+    assert grouped.symlink_for("/mnt/rclone/shows/B/Season 1/b.mkv") == ("shows", "/mnt/links/shows/B/b.mkv")
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from teemo.utils.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(workers=2)
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_first_call_of_a_burst_sets_the_time(scheduler):
+    runs = []
+    started = time.monotonic()
+    for _ in range(5):
+        scheduler.schedule("batch", 0.1, lambda: runs.append(time.monotonic() - started), replace=False)
+        time.sleep(0.01)
+    assert wait_for(lambda: runs)
+    time.sleep(0.1)
+    assert len(runs) == 1
+    assert 0.09 <= runs[0] < 0.18
+
+
+def test_replacing_moves_the_timer(scheduler):
+    runs = []
+    scheduler.schedule("refresh", 5, lambda: runs.append("late"))
+    scheduler.schedule("refresh", 0, lambda: runs.append("now"))
+    assert wait_for(lambda: runs)
+    time.sleep(0.05)
+    assert runs == ["now"]
+
+
+def test_offloaded_runs_of_a_key_do_not_overlap(scheduler):
+    active, overlaps, runs = [], [], []
+
+    def work():
+        active.append(threading.current_thread().name)
+        if len(active) > 1:
+            overlaps.append(True)
+        time.sleep(0.05)
+        active.pop()
+        runs.append(True)
+
+    scheduler.schedule("changes", 0, work, offload=True)
+    time.sleep(0.01)
+    scheduler.schedule("changes", 0, work, offload=True)
+    assert wait_for(lambda: len(runs) == 2)
+    assert not overlaps
+
+
+def test_periodic_job_survives_errors(scheduler):
+    runs = []
+
+    def flaky():
+        runs.append(True)
+        raise RuntimeError("boom")
+
+    scheduler.every(0.01, flaky)
+    assert wait_for(lambda: len(runs) >= 3)
+
+
+def test_stop_runs_pending_timers():
+    scheduler = Scheduler()
+    scheduler.start()
+    runs = []
+    scheduler.schedule("drain", 60, lambda: runs.append("drained"), offload=True)
+    scheduler.stop()
+    assert runs == ["drained"]
+    assert not scheduler.running
+    scheduler.schedule("drain", 0, lambda: runs.append("too late"))
+    assert runs == ["drained"]
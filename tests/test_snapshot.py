@@ -0,0 +1,175 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+from watchdog.events import FileSystemEventHandler
+
+from teemo.utils import snapshot as snapshot_module
+from teemo.utils.index import FileIndex
+from teemo.utils.snapshot import CompactPollingObserver, CompactSnapshot, PollTiers
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w"):
+        pass
+    return str(path)
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "rclone"
+    touch(root / "movies" / "A" / "a.mkv")
+    touch(root / "shows" / "B" / "Season 1" / "b.mkv")
+    return root
+
+
+@pytest.fixture
+def snapshot(root):
+    snapshot = CompactSnapshot(str(root))
+    snapshot.build()
+    return snapshot
+
+
+def test_build_records_all_files(snapshot, root):
+    assert sorted(snapshot.paths()) == [
+        str(root / "movies" / "A" / "a.mkv"),
+        str(root / "shows" / "B" / "Season 1" / "b.mkv"),
+    ]
+    assert len(snapshot) == 2
+
+
+def test_poll_detects_created_and_deleted(snapshot, root):
+    new = touch(root / "movies" / "A" / "new.mkv")
+    os.remove(root / "shows" / "B" / "Season 1" / "b.mkv")
+    diff = snapshot.poll()
+    assert list(diff.created) == [new]
+    assert list(diff.deleted) == [str(root / "shows" / "B" / "Season 1" / "b.mkv")]
+    assert not snapshot.poll()
+
+
+def test_poll_detects_renames_as_moves(snapshot, root):
+    src = root / "movies" / "A" / "a.mkv"
+    dest = root / "movies" / "a.mkv"
+    os.rename(src, dest)
+    diff = snapshot.poll()
+    assert diff.moved == [(str(src), str(dest))]
+    assert not diff.created and not diff.deleted
+
+
+def test_directory_move_moves_its_files(snapshot, root):
+    os.rename(root / "shows" / "B", root / "shows" / "C")
+    diff = snapshot.poll()
+    assert diff.moved == [(str(root / "shows" / "B" / "Season 1" / "b.mkv"),
+                           str(root / "shows" / "C" / "Season 1" / "b.mkv"))]
+    assert (str(root / "shows" / "B"), str(root / "shows" / "C")) in diff.dirs_moved
+
+
+def test_new_directory_tree_is_created(snapshot, root):
+    new = touch(root / "movies" / "D" / "Extras" / "d.mkv")
+    diff = snapshot.poll()
+    assert list(diff.created) == [new]
+    assert set(diff.dirs_created) == {str(root / "movies" / "D"), str(root / "movies" / "D" / "Extras")}
+
+
+def test_unchanged_directories_are_not_listed(snapshot, root):
+    touch(root / "movies" / "A" / "new.mkv")
+    with patch.object(snapshot_module, "_scan", wraps=snapshot_module._scan) as scan:
+        snapshot.poll()
+    scan.assert_called_once_with(str(root / "movies" / "A"))
+
+
+def test_build_is_seeded_from_index(root, tmp_path):
+    file_index = FileIndex(":memory:")
+    list(file_index.walk(str(root / "movies")))
+    snapshot = CompactSnapshot(str(root))
+    with patch.object(snapshot_module, "_scan", wraps=snapshot_module._scan) as scan:
+        snapshot.build(file_index)
+    listed = {call.args[0] for call in scan.call_args_list}
+    assert str(root / "movies") not in listed
+    assert str(root / "movies" / "A") not in listed
+    assert str(root / "shows") in listed
+    assert len(snapshot) == 2
+    file_index.close()
+
+
+def test_observer_emits_events(root):
+    class Collector(FileSystemEventHandler):
+        def __init__(self):
+            self.events = []
+
+        def on_any_event(self, event):
+            self.events.append((event.event_type, event.src_path))
+
+    collector = Collector()
+    observer = CompactPollingObserver(timeout=0.05)
+    observer.schedule(collector, str(root), recursive=True)
+    observer.start()
+    try:
+        time.sleep(0.2)
+        new = touch(root / "movies" / "A" / "new.mkv")
+        deadline = time.monotonic() + 5
+        while ("created", new) not in collector.events and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        observer.stop()
+        observer.join()
+    assert ("created", new) in collector.events
+
+
+@pytest.fixture
+def tiered(root):
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (1000, 1000))
+    tiers = PollTiers(hot_seconds=2, hot_window_seconds=300, cold_max_seconds=600,
+                      full_sweep_seconds=3600, always_hot_depth=0)
+    snapshot = CompactSnapshot(str(root), tiers=tiers)
+    snapshot.build()
+    return snapshot
+
+
+def test_cold_directories_back_off(tiered):
+    now = time.time()
+    tiered.poll(now)
+    assert tiered.checked == 6
+    tiered.poll(now + 2)
+    assert tiered.checked == 1
+    tiered.poll(now + 4)
+    assert tiered.checked == 6
+    tiered.poll(now + 6)
+    assert tiered.checked == 1
+    intervals = [node.interval for node in tiered.tree.dirs.values()]
+    assert intervals == [8, 8]
+
+
+def test_changed_directory_turns_hot(tiered, root):
+    now = time.time()
+    tiered.poll(now)
+    new = touch(root / "movies" / "A" / "new.mkv")
+    os.utime(root / "movies" / "A", (1000, 1001))
+    assert not tiered.poll(now + 2)
+    assert list(tiered.poll(now + 4).created) == [new]
+    assert tiered.tree.dirs["movies"].dirs["A"].interval == 2
+
+
+def test_full_sweep_lists_unchanged_mtimes(tiered, root):
+    now = time.time()
+    tiered.poll(now)
+    new = touch(root / "movies" / "A" / "new.mkv")
+    os.utime(root / "movies" / "A", (1000, 1000))
+    assert not tiered.poll(now + 4)
+    assert list(tiered.poll(now + 3600).created) == [new]
+    assert tiered.listed == 6
+
+
+def test_pruned_directories_are_never_polled(root):
+    touch(root / "movies" / "A" / "Extras" / "trailer.mkv")
+    snapshot = CompactSnapshot(str(root), prune=lambda path: os.path.basename(path) == "Extras")
+    snapshot.build()
+    assert str(root / "movies" / "A" / "Extras" / "trailer.mkv") not in set(snapshot.paths())
+
+    touch(root / "movies" / "A" / "Extras" / "featurette.mkv")
+    time.sleep(0.01)
+    diff = snapshot.poll()
+    assert not diff.created and not diff.dirs_created
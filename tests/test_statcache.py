@@ -0,0 +1,53 @@
+import os
+from unittest.mock import patch
+
+from teemo.utils.statcache import StatCache
+
+
+def test_positive_results_are_cached(tmp_path):
+    path = tmp_path / "a.mkv"
+    path.touch()
+    cache = StatCache()
+    assert cache.exists(str(path))
+    with patch("os.stat") as stat:
+        assert cache.exists(str(path))
+    stat.assert_not_called()
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_negative_results_are_cached(tmp_path):
+    path = str(tmp_path / "missing.mkv")
+    cache = StatCache()
+    assert not cache.exists(path)
+    open(path, "w").close()
+    assert not cache.exists(path)
+    cache.invalidate(path)
+    assert cache.exists(path)
+
+
+def test_entries_expire(tmp_path):
+    path = str(tmp_path / "a.mkv")
+    cache = StatCache(ttl=0, negative_ttl=0)
+    assert not cache.exists(path)
+    open(path, "w").close()
+    assert cache.exists(path)
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_eviction(tmp_path):
+    cache = StatCache(maxsize=2)
+    for name in "abc":
+        cache.exists(str(tmp_path / name))
+    assert cache.stats()["entries"] == 2
+    assert (str(tmp_path / "a"), True) not in cache.entries
+
+
+def test_link_checks_do_not_follow(tmp_path):
+    symlink_path = str(tmp_path / "link.mkv")
+    os.symlink(str(tmp_path / "gone.mkv"), symlink_path)
+    cache = StatCache()
+    assert cache.lexists(symlink_path)
+    assert cache.islink(symlink_path)
+    assert not cache.exists(symlink_path)
+    assert cache.isdir(str(tmp_path))
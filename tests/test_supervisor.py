@@ -0,0 +1,114 @@
+import json
+import os
+import time
+import urllib.request
+from unittest.mock import MagicMock
+
+import pytest
+
+from teemo.settings.models import FileMonitorSettings
+from teemo.utils.metrics import MetricsRegistry, MetricsServer
+from teemo.utils.supervisor import ShardSupervisor, shard_libraries
+
+
+def test_libraries_are_dealt_over_shards():
+    assert shard_libraries(["movies", "shows", "anime"], 2) == [["movies", "anime"], ["shows"]]
+    assert shard_libraries(["movies"], 4) == [["movies"]]
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return condition()
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    settings = FileMonitorSettings(
+        library_paths=["movies", "shows"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        persistent_index=False,
+        journal_enabled=False,
+        observer_backend="polling",
+        poll_interval_seconds=1,
+        status_interval_seconds=1,
+    )
+    for lib in settings.library_paths:
+        os.makedirs(os.path.join(settings.rclone_path, lib, "A"))
+        open(os.path.join(settings.rclone_path, lib, "A", f"{lib}.mkv"), "w").close()
+    plex = MagicMock(initialized=True)
+    supervisor = ShardSupervisor(settings, plex, shards=2, state_dir=tmp_path / "data", restart_delay_seconds=0)
+    supervisor.start()
+    yield supervisor
+    supervisor.stop(timeout=10)
+
+
+def test_shards_link_and_share_one_refresh_channel(supervisor, tmp_path):
+    assert wait_for(lambda: supervisor.plex.schedule_refresh.call_count >= 2)
+    assert sorted(call.args[0] for call in supervisor.plex.schedule_refresh.call_args_list) == ["movies", "shows"]
+    assert os.path.islink(tmp_path / "links" / "movies" / "movies.mkv")
+    assert os.path.islink(tmp_path / "links" / "shows" / "shows.mkv")
+
+    assert wait_for(lambda: supervisor.status()["ready"])
+    status = supervisor.status()
+    assert status["live"]
+    assert status["shards"]["1"]["libraries"] == ["shows"]
+
+
+def test_crashed_shard_is_restarted(supervisor):
+    crashed = supervisor.processes[0]
+    crashed.kill()
+    crashed.join()
+    supervisor.check()
+    supervisor.check()
+    assert supervisor.processes[0] is not crashed
+    assert supervisor.processes[0].is_alive()
+    assert supervisor.restarts[0] == 1
+
+
+def test_status_is_written_to_a_fresh_state_dir(tmp_path):
+    settings = FileMonitorSettings(library_paths=["movies"], rclone_path=str(tmp_path / "rclone"),
+                                   symlink_path=str(tmp_path / "links"))
+    supervisor = ShardSupervisor(settings, MagicMock(initialized=True), shards=1, state_dir=tmp_path / "data")
+    supervisor.write_status()
+    status = json.loads((tmp_path / "data" / "status.json").read_text())
+    assert not status["live"]
+    assert "0" in status["shards"]
+
+
+def test_shard_metrics_are_served_by_the_supervisor(tmp_path):
+    settings = FileMonitorSettings(
+        library_paths=["movies", "shows"],
+        rclone_path=str(tmp_path / "rclone"),
+        symlink_path=str(tmp_path / "links"),
+        persistent_index=False,
+        journal_enabled=False,
+        observer_backend="polling",
+        status_interval_seconds=1,
+        metrics_enabled=True,
+    )
+    for lib in settings.library_paths:
+        os.makedirs(os.path.join(settings.rclone_path, lib))
+        open(os.path.join(settings.rclone_path, lib, f"{lib}.mkv"), "w").close()
+    metrics = MetricsRegistry()
+    supervisor = ShardSupervisor(settings, MagicMock(initialized=True), shards=2, state_dir=tmp_path / "data",
+                                 metrics=metrics)
+    server = MetricsServer(port=0, metrics=metrics)
+    server.start()
+    supervisor.start()
+
+    def scrape():
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            return response.read().decode()
+
+    try:
+        assert wait_for(lambda: all(
+            f'teemo_symlinks_created_total{{shard="{number}",library="{lib}"}} 1' in scrape()
+            for number, lib in enumerate(settings.library_paths)
+        ))
+        assert 'teemo_queue_depth{shard="0"}' in scrape()
+    finally:
+        supervisor.stop(timeout=10)
+        server.stop()
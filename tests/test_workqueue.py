@@ -0,0 +1,67 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from teemo.utils.workqueue import KeyedWorkQueue
+
+
+def test_items_for_one_key_stay_in_order():
+    handled = []
+    work_queue = KeyedWorkQueue(handled.append, workers=4, maxsize=100)
+    work_queue.start()
+    for number in range(50):
+        work_queue.put("a.mkv", ("a.mkv", number))
+        work_queue.put("b.mkv", ("b.mkv", number))
+    work_queue.join()
+    work_queue.stop()
+    assert [number for key, number in handled if key == "a.mkv"] == list(range(50))
+    assert [number for key, number in handled if key == "b.mkv"] == list(range(50))
+    assert work_queue.stats()["processed"] == 100
+
+
+def test_different_keys_are_handled_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    work_queue = KeyedWorkQueue(lambda item: barrier.wait(), workers=8, maxsize=100)
+    work_queue.start()
+    keys = ["a.mkv"]
+    keys.append(next(key for key in (f"{n}.mkv" for n in range(100))
+                     if work_queue._shard(key) is not work_queue._shard("a.mkv")))
+    for key in keys:
+        work_queue.put(key, key)
+    work_queue.join()
+    work_queue.stop()
+    assert work_queue.stats()["failed"] == 0
+
+
+def test_full_queue_applies_backpressure():
+    release = threading.Event()
+    work_queue = KeyedWorkQueue(lambda item: release.wait(5), workers=1, maxsize=2)
+    work_queue.start()
+    work_queue.put("a", 1)
+    time.sleep(0.05)
+    work_queue.put("a", 2)
+    work_queue.put("a", 3)
+    with pytest.raises(queue.Full):
+        work_queue.put("a", 4, timeout=0.05)
+    assert work_queue.stats()["depth"] == 2
+    assert work_queue.oldest_age() > 0
+    release.set()
+    work_queue.join()
+    work_queue.stop()
+
+
+def test_handler_errors_do_not_stop_workers():
+    def handler(item):
+        if item == "bad":
+            raise ValueError(item)
+
+    work_queue = KeyedWorkQueue(handler, workers=1, maxsize=10)
+    work_queue.start()
+    work_queue.put("a", "bad")
+    work_queue.put("a", "good")
+    work_queue.join()
+    work_queue.stop()
+    assert work_queue.stats()["failed"] == 1
+    assert work_queue.stats()["processed"] == 1